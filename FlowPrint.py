@@ -11,6 +11,8 @@ Repository: https://github.com/NotDonaldTrump/FlowPrint
 
 import imaplib
 import email
+import base64
+import quopri
 import time
 import traceback
 import os
@@ -22,13 +24,31 @@ import threading
 import re
 import shutil
 import json
+import select
+import ssl
+import queue
+import zlib
+import atexit
 import webbrowser
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from email.header import decode_header
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, session, redirect, url_for, stream_with_context
 from functools import wraps
+from contextlib import contextmanager
 from flask_socketio import SocketIO, emit
 from webhook_handler import ShopifyWebhookHandler
+from dedup_store import SqliteUidStore, TextUidStore
+from chrome_devtools import ChromeBrowser, DevToolsError
+from webhook_queue import WebhookQueue
+from job_store import JobStore, PdfCache
+from job_history import JobHistory
+from latency import LatencyStats, timed_stage
+from metrics import MetricsRegistry
+from status_bus import StatusBus
+from scheduler import Scheduler
+from log_writer import LogWriter, read_log_tail, read_log_from, open_log_files, iter_log_chunks
 
 # ==========================
 # DEFAULT CONFIGURATION
@@ -41,16 +61,54 @@ DEFAULT_CONFIG = {
     "imap_username": "",
     "imap_password": "",
     "mailbox": "Inbox",
-    "poll_interval_seconds": 30,
+    "poll_interval_seconds": 30,  # Longest wait between checks while the inbox is quiet
+    "poll_interval_min_seconds": 5,  # Checks speed up to this interval while mail is arriving (= poll_interval_seconds to disable)
+    "imap_persistent_session": True,  # Keep one IMAP session open instead of reconnecting every poll
+    "imap_idle_enabled": True,  # Use IMAP IDLE push when the server supports it (falls back to NOOP polling)
+    "imap_idle_timeout_seconds": 600,  # Re-issue IDLE at least this often (RFC 2177 servers drop it after 30 min)
+    "imap_fetch_batch_size": 50,  # Messages downloaded per UID FETCH command
+    "imap_partial_fetch": True,  # Check BODYSTRUCTURE + Subject first, then download only the printable part
     "subject_prefix": "[PRINT PACK]",
     "auto_print_enabled": True,
     "delete_email_after_print": False,
     "chrome_path": "",
-    "chrome_print_wait_seconds": 8,
+    "chrome_print_wait_seconds": 8,  # Upper bound only: a job finishes as soon as Chrome reports it printed
+    "print_workers": 2,  # cups engine only: threads printing queued jobs, one CUPS queue each (the Chrome engines always print with one)
+    "print_queue_max_depth": 100,  # Ingestion pauses while this many jobs are waiting
+    "print_coalesce_seconds": 0,  # Collect jobs for this long and print them as one document (0 = print each job on its own)
+    "print_coalesce_max_jobs": 10,  # Most jobs merged into one document
+    "chrome_profile_pool_size": 2,  # Chrome profiles for the subprocess engine, one per concurrent print (the queued job, reprints, test prints)
+    "chrome_profile_recycle_jobs": 50,  # Wipe and re-warm a profile after this many jobs (0 = never)
+    "print_engine": "subprocess",  # Options: subprocess (new Chrome per job), devtools (one persistent Chrome, tab per job), cups (headless PDF sent to lp/lpr)
+    "cups_printer": "",  # CUPS queue name for the cups engine (empty = system default destination)
+    "cups_command": "lp",  # lp or lpr (or a full path to either)
+    "cups_options": [],  # Extra -o options, e.g. ["media=A4", "fit-to-page"]
+    "pdf_render_timeout_seconds": 60,  # Longest headless Chrome may take to write a job's PDF
+    "pdf_cache_enabled": True,  # Keep the PDFs the cups engine renders, so reprints skip Chrome
+    "pdf_cache_dir": "flowprint_pdf_cache",
+    "pdf_cache_max_mb": 200,  # Least recently used PDFs are evicted above this size
     "temp_file_cleanup_enabled": True,
-    "temp_file_cleanup_hours": 6,
-    "printed_uids_file": "printed_uids.txt",
+    "temp_file_cleanup_hours": 6,  # Stored jobs older than this can no longer be reprinted
+    "job_store_dir": "flowprint_jobs",  # Job files kept for reprinting (content-addressed, with index.db)
+    "job_store_max_mb": 500,  # Least recently used job files are evicted above this size
+    "job_store_max_jobs": 1000,  # Oldest jobs are forgotten above this count
+    "job_history_db": "flowprint_history.db",  # Searchable record of every print job (see /api/jobs)
+    "job_history_retention_days": 365,  # Forget job history after this many days (0 = keep forever)
+    "latency_window_jobs": 1000,  # Recent jobs per source behind the p50/p95/p99 stage timings
+    "metrics_public": False,  # Serve /metrics without login (for a Prometheus scraper)
+    "status_max_emits_per_second": 4,  # Dashboard status updates are merged into at most this many broadcasts
+    "printed_uids_file": "printed_uids.txt",  # Legacy text store; imported into the SQLite store on first connect
+    "dedup_store": "sqlite",  # Options: sqlite, text
+    "dedup_db_file": "flowprint_dedup.db",
+    "dedup_sqlite_journal_mode": "WAL",
+    "dedup_commit_batch_size": 50,  # Printed UIDs buffered per SQLite commit
+    "dedup_retention_days": 365,  # Forget printed UIDs after this many days (0 = keep forever)
+    "uid_state_file": "uid_state.json",  # Per-mailbox UIDVALIDITY / last-seen UID watermarks
     "log_file": "flowprint.log",
+    "log_max_mb": 10,  # Rotate the log once it reaches this size (0 = no size limit)
+    "log_rotate_hours": 24,  # Rotate the log once it is this old (0 = no age limit)
+    "log_backup_count": 5,  # Rotated logs kept (flowprint.log.1.gz is the newest)
+    "log_compress_backups": True,  # gzip rotated logs
     "theme": "dark",
     # Webhook Configuration
     "webhook_enabled": False,
@@ -58,6 +116,10 @@ DEFAULT_CONFIG = {
     "webhook_template": "default_packing_slip.html",
     "webhook_auto_print": True,  # If False, opens print dialog like email manual mode
     "webhook_print_wait_seconds": 8,  # How long to wait for print before closing Chrome
+    "webhook_queue_db": "flowprint_webhooks.db",  # Durable queue of verified webhooks awaiting print
+    "webhook_workers": 1,  # Threads rendering and printing queued webhooks
+    "webhook_job_retention_hours": 168,  # Finished webhook jobs stay queryable for this long
+    "webhook_idempotency_ttl_hours": 72,  # Repeat deliveries of a webhook id or order id within this window are dropped
     # Mode Selection
     "operation_mode": "email_only",  # Options: email_only, webhook_only, email_primary, webhook_primary
     # Authentication
@@ -72,9 +134,34 @@ CONFIG_FILE = "flowprint_config.json"
 # Configuration Manager
 # ==========================
 
+class ConfigSnapshot(dict):
+    """
+    One saved version of the configuration.
+
+    Snapshots are never changed once created, so every caller shares the
+    current one instead of copying it; saving swaps in a new snapshot.
+    .copy() returns an ordinary, editable dict.
+    """
+
+    def __init__(self, values, version):
+        super().__init__({key: tuple(value) if isinstance(value, list) else value for key, value in values.items()})
+        self.version = version
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("configuration snapshots are read-only; use ConfigManager.save_config()")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def changed_keys(self, other):
+        """Keys whose values differ between this snapshot and another."""
+        return {key for key in self.keys() | other.keys() if self.get(key) != other.get(key)}
+
 class ConfigManager:
     def __init__(self):
-        self.config = self.load_config()
+        self.config = ConfigSnapshot(self.load_config(), 1)
+        self.lock = threading.Lock()
+        self.subscribers = []
     
     def load_config(self):
         """Load configuration from file or create default."""
@@ -91,31 +178,70 @@ class ConfigManager:
         return DEFAULT_CONFIG.copy()
     
     def save_config(self, new_config):
-        """Save configuration to file."""
-        self.config.update(new_config)
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(self.config, f, indent=2)
+        """Save configuration to file and swap in the new snapshot."""
+        with self.lock:
+            old = self.config
+            values = old.copy()
+            values.update(new_config)
+            # Written to a temporary file first so a failed save leaves the old file and snapshot in place
+            with open(CONFIG_FILE + ".tmp", 'w') as f:
+                json.dump(values, f, indent=2)
+            os.replace(CONFIG_FILE + ".tmp", CONFIG_FILE)
+            self.config = ConfigSnapshot(values, old.version + 1)
+            new = self.config
+            subscribers = list(self.subscribers)
+
+        changed = new.changed_keys(old)
+        for callback, keys in subscribers:
+            if changed and (keys is None or changed & keys):
+                try:
+                    callback(old, new, changed)
+                except Exception as e:
+                    log_to_file(f"Config change handler failed: {str(e)}", "ERROR")
         return True
     
     def get_config(self):
-        """Get current configuration."""
-        return self.config.copy()
+        """Get the current configuration snapshot (shared and read-only, not a copy)."""
+        return self.config
+
+    def subscribe(self, callback, keys=None):
+        """
+        Call callback(old, new, changed_keys) after a save changes settings.
+
+        Args:
+            callback: Receives the old and new snapshots and the set of changed keys
+            keys: Only call it when one of these keys changed (None = any key)
+        """
+        with self.lock:
+            self.subscribers.append((callback, set(keys) if keys is not None else None))
 
 # ==========================
 # Logging Helper
 # ==========================
 
+log_writer = None  # Background log writer, started by get_log_writer()
+log_writer_lock = threading.Lock()
+
+def get_log_writer():
+    """Get the log writer, starting it on first use."""
+    global log_writer
+    if log_writer is None:
+        with log_writer_lock:
+            if log_writer is None:
+                config = config_manager.get_config()
+                log_writer = LogWriter(
+                    config.get('log_file', 'flowprint.log'),
+                    max_bytes=int(config.get('log_max_mb', 10) * 1024 * 1024),
+                    rotate_hours=config.get('log_rotate_hours', 24),
+                    backups=config.get('log_backup_count', 5),
+                    compress=config.get('log_compress_backups', True)
+                )
+                atexit.register(log_writer.close)
+    return log_writer
+
 def log_to_file(message, level="INFO"):
-    """Write log entry to file with timestamp."""
-    try:
-        config = config_manager.get_config()
-        log_file = config.get('log_file', 'flowprint.log')
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}\n"
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except:
-        pass
+    """Queue a log entry; the timestamp is taken now, the write happens in the background."""
+    (log_writer or get_log_writer()).write(message, level)
 
 # ==========================
 # Global State
@@ -124,6 +250,13 @@ def log_to_file(message, level="INFO"):
 config_manager = ConfigManager()
 daemon = None
 daemon_thread = None
+chrome_engine = None  # Shared DevToolsChromePrinter when print_engine is "devtools"
+chrome_profile_pool = None  # Leased Chrome profiles for the subprocess engine
+job_store = None  # Stored job files for reprinting, opened by get_job_store()
+pdf_cache = None  # Rendered PDFs kept by the cups engine, opened by get_pdf_cache()
+job_history = None  # Persistent job history, opened by get_job_history()
+latency_stats = None  # Rolling per-stage timings, created by get_latency_stats()
+webhook_worker = None  # Started on first webhook (or at startup) by get_webhook_worker()
 
 # Webhook Handler
 webhook_handler = ShopifyWebhookHandler()
@@ -136,6 +269,32 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'flowprint-secret-key-' + uuid.uuid4().hex
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+def current_status():
+    """The status shown on the dashboard (running, status line and stats)."""
+    if daemon:
+        status = {"running": daemon.running, "status": daemon.status, "stats": dict(daemon.stats)}
+    else:
+        status = {
+            "running": False,
+            "status": "Stopped",
+            "stats": {"latency": latency_stats.summary()} if latency_stats else {}
+        }
+    # Read from the cache itself, so the numbers are there whichever print path used it
+    if pdf_cache is not None:
+        status["stats"]["pdf_cache"] = pdf_cache.stats()
+    return status
+
+# Dashboards receive versioned status deltas instead of the whole stats dict
+status_bus = StatusBus(
+    current_status,
+    lambda event, data: socketio.emit(event, data),
+    max_per_second=config_manager.get_config().get('status_max_emits_per_second', 4)
+)
+config_manager.subscribe(
+    lambda old, new, changed: status_bus.set_rate(new.get('status_max_emits_per_second', 4)),
+    ["status_max_emits_per_second"]
+)
+
 @app.before_request
 def check_auth():
     """Check authentication before every request."""
@@ -145,18 +304,68 @@ def check_auth():
     # Webhooks use HMAC signature verification instead of session auth
     if request.endpoint in ["login", "static", "shopify_webhook", "test_webhook"]:
         return None
+    if request.endpoint == "metrics_endpoint" and config.get("metrics_public", False):
+        return None
     
     # If auth is enabled and password is set
     if config.get("auth_enabled") and config.get("auth_password"):
         if not session.get("authenticated"):
             # Redirect to login for regular requests
-            if request.endpoint and "api" not in request.endpoint:
+            if request.endpoint and "api" not in request.endpoint and request.endpoint != "metrics_endpoint":
                 return redirect(url_for("login"))
             # Return 401 for API requests (except webhooks)
             return jsonify({"error": "Authentication required"}), 401
     
     return None
 
+# ==========================
+# Metrics
+# ==========================
+
+# Updated from print workers and request threads without locking (see
+# metrics.py); gauges of state that is already tracked are read at scrape time.
+metrics = MetricsRegistry()
+
+def _print_queue_depth():
+    depths = {}
+    if daemon:
+        depths[("email",)] = daemon.print_queue.depth
+    if webhook_worker:
+        depths[("webhook",)] = webhook_worker.print_queue.depth
+    return depths
+
+def _temp_store_bytes():
+    sizes = {("jobs",): get_job_store().usage()["bytes"]}
+    if pdf_cache is not None:
+        sizes[("pdf_cache",)] = pdf_cache.stats()["bytes"]
+    return sizes
+
+messages_scanned = metrics.counter(
+    "flowprint_messages_scanned_total", "Emails fetched from IMAP and checked for printing")
+jobs_printed = metrics.counter(
+    "flowprint_jobs_printed_total", "Jobs printed (or opened in the print dialog)", ["source"])
+job_failures = metrics.counter(
+    "flowprint_job_failures_total", "Jobs that failed, by pipeline stage", ["source", "stage"])
+dedup_hits = metrics.counter(
+    "flowprint_dedup_hits_total", "Emails and webhooks skipped as already printed or queued", ["source"])
+webhook_verifications = metrics.counter(
+    "flowprint_webhook_verifications_total", "Webhook HMAC signature checks", ["result"])
+stage_seconds = metrics.histogram(
+    "flowprint_stage_duration_seconds", "Time spent in each pipeline stage", ["source", "stage"])
+chrome_processes = metrics.gauge(
+    "flowprint_chrome_processes", "Chrome processes started by FlowPrint and still running")
+metrics.gauge(
+    "flowprint_print_queue_depth", "Jobs waiting for or being printed", ["source"], callback=_print_queue_depth)
+metrics.gauge(
+    "flowprint_webhook_queue_depth", "Webhooks queued or being rendered",
+    callback=lambda: webhook_worker.job_queue.depth() if webhook_worker else 0)
+metrics.gauge(
+    "flowprint_temp_store_bytes", "Bytes used by stored job files and cached PDFs", ["store"],
+    callback=_temp_store_bytes)
+metrics.gauge(
+    "flowprint_imap_connected", "1 while the IMAP session is open",
+    callback=lambda: 1 if daemon and daemon.conn is not None else 0)
+
 # ==========================
 # Authentication System
 # ==========================
@@ -199,6 +408,17 @@ def get_subject(msg):
 def subject_matches_prefix(subject, prefix):
     return subject.strip().upper().startswith(prefix.strip().upper())
 
+def format_uid_set(uids):
+    """Compress UIDs into an IMAP UID set, e.g. [1001, 1002, 1003, 1007] -> "1001:1003,1007"."""
+    numbers = sorted({int(u) for u in uids})
+    ranges = []
+    for n in numbers:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
 def get_best_body(msg):
     html_part = None
     text_part = None
@@ -234,6 +454,9 @@ def get_best_body(msg):
             elif ctype == "text/plain":
                 text_part = body
 
+    return body_to_html(html_part, text_part)
+
+def body_to_html(html_part, text_part):
     if html_part:
         return html_part
     if text_part:
@@ -241,11 +464,168 @@ def get_best_body(msg):
         return f"<html><body><pre>{safe}</pre></body></html>"
     return "<html><body>(No body content)</body></html>"
 
+# ==========================
+# IMAP Response Parsing
+# ==========================
+
+def _imap_tokens(data):
+    """Tokenize imaplib FETCH data into parens, atoms and strings, inlining literals."""
+    for item in data:
+        if item is None:
+            continue
+        text, literal = (item[0], item[1]) if isinstance(item, tuple) else (item, None)
+        if literal is not None:
+            text = re.sub(rb"\{\d+\}$", b"", text)
+
+        i, n = 0, len(text)
+        while i < n:
+            c = text[i:i + 1]
+            if c in b" \r\n":
+                i += 1
+            elif c in b"()":
+                yield c, None
+                i += 1
+            elif c == b'"':
+                j, buf = i + 1, bytearray()
+                while j < n and text[j:j + 1] != b'"':
+                    if text[j:j + 1] == b"\\":
+                        j += 1
+                    buf += text[j:j + 1]
+                    j += 1
+                yield b"str", bytes(buf)
+                i = j + 1
+            else:
+                # Atoms may carry bracketed sections: BODY[HEADER.FIELDS (SUBJECT)]
+                j, depth = i, 0
+                while j < n:
+                    c = text[j:j + 1]
+                    if c == b"[":
+                        depth += 1
+                    elif c == b"]":
+                        depth -= 1
+                    elif depth == 0 and c in b" ()":
+                        break
+                    j += 1
+                yield b"atom", text[i:j]
+                i = j
+
+        if literal is not None:
+            yield b"str", literal
+
+def parse_fetch_items(data):
+    """
+    Parse a UID FETCH response.
+
+    Returns:
+        dict: {uid: {ITEM_NAME: value}} where lists stay nested and NIL is None
+    """
+    stack = [[]]
+    for kind, value in _imap_tokens(data):
+        if kind == b"(":
+            stack.append([])
+        elif kind == b")":
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif kind == b"atom":
+            stack[-1].append(None if value.upper() == b"NIL" else value)
+        else:
+            stack[-1].append(value)
+
+    messages = {}
+    for entry in stack[0]:
+        if not isinstance(entry, list):
+            continue
+        items = {}
+        for i in range(0, len(entry) - 1, 2):
+            if isinstance(entry[i], bytes):
+                items[entry[i].upper()] = entry[i + 1]
+        if items.get(b"UID"):
+            messages[items[b"UID"]] = items
+    return messages
+
+def _walk_bodystructure(structure, section=""):
+    if structure and isinstance(structure[0], list):
+        for number, child in enumerate(c for c in structure if isinstance(c, list)):
+            child_section = f"{section}.{number + 1}" if section else str(number + 1)
+            yield from _walk_bodystructure(child, child_section)
+    elif structure:
+        yield section or "1", structure
+
+def find_body_section(structure):
+    """
+    Find the part get_best_body would print in a parsed BODYSTRUCTURE.
+
+    Returns:
+        dict: section, subtype, encoding and charset of the part, or None
+    """
+    html_part = None
+    text_part = None
+
+    for section, part in _walk_bodystructure(structure or []):
+        if len(part) < 7 or not isinstance(part[0], bytes) or not isinstance(part[1], bytes):
+            continue
+        if part[0].upper() != b"TEXT" or part[1].upper() not in (b"HTML", b"PLAIN"):
+            continue
+        disposition = part[9] if len(part) > 9 else None
+        if isinstance(disposition, list) and disposition and b"attachment" in (disposition[0] or b"").lower():
+            continue
+
+        params = part[2] if isinstance(part[2], list) else []
+        charset = "utf-8"
+        for i in range(0, len(params) - 1, 2):
+            if (params[i] or b"").upper() == b"CHARSET" and params[i + 1]:
+                charset = params[i + 1].decode("ascii", errors="ignore")
+        info = {
+            "section": section,
+            "subtype": part[1].upper(),
+            "encoding": (part[5] or b"7BIT").upper(),
+            "charset": charset,
+        }
+        if info["subtype"] == b"HTML" and html_part is None:
+            html_part = info
+        elif info["subtype"] == b"PLAIN" and text_part is None:
+            text_part = info
+
+    return html_part or text_part
+
+def decode_section(payload, encoding, charset):
+    """Undo the transfer encoding of a fetched body section and decode it."""
+    try:
+        if encoding == b"BASE64":
+            payload = base64.b64decode(payload)
+        elif encoding == b"QUOTED-PRINTABLE":
+            payload = quopri.decodestring(payload)
+    except Exception:
+        pass
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
 # ==========================
 # Chrome Printer
 # ==========================
 
+# How much of the end of a document is searched first for </body>
+PRINT_SCRIPT_TAIL_BYTES = 8192
+
+def strip_print_script(html_content):
+    """Remove a print script injected by an earlier write_print_file()."""
+    start = html_content.rfind('<script id="flowprint-print-script">')
+    if start == -1:
+        return html_content
+    end = html_content.find("</script>", start)
+    if end == -1:
+        return html_content
+    if html_content[start - 1:start] == "\n":
+        start -= 1
+    return html_content[:start] + html_content[end + len("</script>"):]
+
 class ChromePrinter:
+    # Job files can be written with the print script already injected (prepared=True)
+    injects_print_script = True
+
     def __init__(self):
         self.chrome_path = None
     
@@ -266,167 +646,1057 @@ class ChromePrinter:
         
         raise FileNotFoundError("Could not find Chrome. Please specify path in settings.")
 
-    def inject_print_script(self, html_content, auto_close=True):
+    def _print_script(self, auto_close=True):
         if auto_close:
             script = """
-<script>
+<script id="flowprint-print-script">
 window.onload = function() {
     setTimeout(function() {
         window.print();
+        // Reports completion to the DevTools print engine (undefined otherwise)
+        if (window.flowprintPrinted) { window.flowprintPrinted("printed"); }
         window.close();
     }, 500);
 };
 </script>"""
         else:
             script = """
-<script>
+<script id="flowprint-print-script">
 window.onload = function() {
     setTimeout(function() {
         window.print();
     }, 500);
 };
 </script>"""
-        
-        if re.search(r'</body>', html_content, re.IGNORECASE):
-            html_content = re.sub(r'</body>', script + '</body>', html_content, flags=re.IGNORECASE)
-        elif re.search(r'</html>', html_content, re.IGNORECASE):
-            html_content = re.sub(r'</html>', script + '</html>', html_content, flags=re.IGNORECASE)
-        else:
-            html_content += script
-        
-        return html_content
-
-    def print_html_file(self, html_path, auto_print=True, chrome_path="", wait_seconds=8):
+        return script.encode("utf-8")
+
+    def _split_for_script(self, data):
+        """
+        Find where the print script goes in an encoded HTML document.
+
+        The closing </body> (or </html>) tag is looked for in the last few KB
+        first, so large documents are not scanned end to end.
+
+        Returns:
+            int: Byte offset to insert the script at
+        """
+        tail_start = max(0, len(data) - PRINT_SCRIPT_TAIL_BYTES)
+        for region_start in (tail_start, 0):
+            region = data[region_start:].lower()
+            for tag in (b"</body>", b"</html>"):
+                index = region.rfind(tag)
+                if index != -1:
+                    return region_start + index
+            if region_start == 0:
+                break
+        return len(data)
+
+    def write_print_file(self, path, html_content, auto_close=True):
+        """
+        Write html_content to path with the print script injected, in one pass.
+
+        A print script left in the document by an earlier injection (e.g.
+        when reprinting a job file) is replaced rather than duplicated.
+        """
+        html_content = strip_print_script(html_content)
+        data = html_content.encode("utf-8", errors="ignore")
+        index = self._split_for_script(data)
+        view = memoryview(data)
+        with open(path, "wb") as f:
+            f.write(view[:index])
+            f.write(self._print_script(auto_close))
+            f.write(view[index:])
+
+    def print_html_file(self, html_path, auto_print=True, chrome_path="", wait_seconds=8, prepared=False, title=""):
+        """
+        Print an HTML file with Chrome.
+
+        Args:
+            prepared: html_path was written by write_print_file() and already
+                      carries the print script, so Chrome opens it directly
+                      instead of a script-injected copy
+            title: Job name shown in the print queue (used by the CUPS
+                   engine; Chrome names the job after the document)
+        """
         self.chrome_path = self._resolve_chrome_path(chrome_path)
-        
-        with open(html_path, "r", encoding="utf-8", errors="ignore") as f:
-            html_content = f.read()
-        
-        modified_html = self.inject_print_script(html_content, auto_close=auto_print)
-        
         temp_dir = tempfile.gettempdir()
-        modified_name = f"flowprint_{uuid.uuid4().hex}.html"
-        modified_path = os.path.join(temp_dir, modified_name)
-        
-        with open(modified_path, "w", encoding="utf-8", errors="ignore") as f:
-            f.write(modified_html)
-        
-        user_data_dir = os.path.join(temp_dir, "flowprint_chrome_profile")
-        os.makedirs(user_data_dir, exist_ok=True)
 
+        if prepared:
+            modified_path = html_path
+        else:
+            with open(html_path, "r", encoding="utf-8", errors="ignore") as f:
+                html_content = f.read()
+            modified_path = os.path.join(temp_dir, f"flowprint_{uuid.uuid4().hex}.html")
+            self.write_print_file(modified_path, html_content, auto_close=auto_print)
+        
         if auto_print:
-            cmd = [self.chrome_path, "--kiosk-printing", f"--user-data-dir={user_data_dir}", modified_path]
+            exited = False
+            try:
+                # Each job gets a profile of its own, so concurrent prints never
+                # share a Chrome instance and start from a warm profile; a clean
+                # exit is this job's own Chrome closing after print()
+                with get_profile_pool().lease(self.chrome_path) as user_data_dir:
+                    cmd = [self.chrome_path, "--kiosk-printing", f"--user-data-dir={user_data_dir}", modified_path]
+                    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    # Timed from launch: waiting for a free profile is not print time
+                    started = time.monotonic()
+                    chrome_processes.inc()
+                    # The injected script calls window.close() once print() returns,
+                    # which ends Chrome; wait_seconds is only the upper bound.
+                    try:
+                        proc.wait(timeout=wait_seconds)
+                        exited = True
+                        if proc.returncode:
+                            raise RuntimeError(f"Chrome exited with code {proc.returncode}")
+                    except subprocess.TimeoutExpired:
+                        try:
+                            proc.terminate()
+                            proc.wait(timeout=5)
+                        except subprocess.TimeoutExpired:
+                            proc.kill()
+                        except:
+                            pass
+                    finally:
+                        chrome_processes.dec()
+            finally:
+                if not prepared:
+                    try:
+                        os.remove(modified_path)
+                    except:
+                        pass
+
+            elapsed = time.monotonic() - started
+            if not exited:
+                log_to_file(f"Chrome did not confirm the print within {wait_seconds}s - closed it", "WARNING")
+                return {"printed": False, "print_seconds": elapsed,
+                        "error": f"Chrome did not confirm the print within {wait_seconds}s"}
+            return {"printed": True, "print_seconds": elapsed}
         else:
+            # The print dialog stays open for the user, so it uses the shared profile
+            user_data_dir = os.path.join(temp_dir, "flowprint_chrome_profile")
+            os.makedirs(user_data_dir, exist_ok=True)
             cmd = [self.chrome_path, f"--user-data-dir={user_data_dir}", modified_path]
+            try:
+                subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except Exception:
+                if not prepared:
+                    try:
+                        os.remove(modified_path)
+                    except:
+                        pass
+                raise
 
-        if auto_print:
+class ChromeProfilePool:
+    """
+    Pool of Chrome profile directories for the subprocess print engine.
+
+    A job leases a profile for as long as its Chrome runs, so two jobs never
+    share a profile (and never hand off to each other's Chrome). Profiles are
+    warmed with a quick headless launch so the first real print does not pay
+    for profile creation, and wiped and re-warmed after recycle_after jobs.
+    """
+
+    def __init__(self, size=2, recycle_after=50, base_dir=None):
+        self.base_dir = base_dir or os.path.join(tempfile.gettempdir(), "flowprint_chrome_profiles")
+        self.recycle_after = recycle_after
+        self.chrome_path = None
+        self.idle = queue.Queue()
+        self.size = 0
+        self.next_index = 0
+        self.surplus = 0  # Profiles to delete as they come back from a lease (pool shrunk)
+        self.lock = threading.Lock()
+        self.resize(size)
+
+    def resize(self, size, recycle_after=None):
+        """
+        Change the number of profiles in place.
+
+        Profiles leased by running jobs are kept until they come back, and new
+        profiles get directories never used before, so no two Chrome runs share
+        a profile while the pool changes. New profiles are warmed by warm().
+        """
+        size = max(1, int(size))
+        if recycle_after is not None:
+            self.recycle_after = recycle_after
+        with self.lock:
+            while self.size < size:
+                if self.surplus:
+                    self.surplus -= 1
+                else:
+                    path = os.path.join(self.base_dir, f"profile_{self.next_index}")
+                    self.next_index += 1
+                    self.idle.put({"path": path, "uses": 0, "warm": False})
+                self.size += 1
+            if self.size > size:
+                self.surplus += self.size - size
+                self.size = size
+        # Idle profiles over the new size go now; leased ones as they return
+        for _ in range(self.idle.qsize()):
             try:
-                proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                time.sleep(wait_seconds)
-                try:
-                    proc.terminate()
-                except:
-                    pass
+                profile = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._release(profile)
+
+    def _release(self, profile):
+        with self.lock:
+            drop = self.surplus > 0
+            if drop:
+                self.surplus -= 1
+        if drop:
+            shutil.rmtree(profile["path"], ignore_errors=True)
+        else:
+            self.idle.put(profile)
+
+    @contextmanager
+    def lease(self, chrome_path=None):
+        """Borrow a profile directory for one Chrome run (blocks while all are in use)."""
+        if chrome_path:
+            self.chrome_path = chrome_path
+        profile = self.idle.get()
+        os.makedirs(profile["path"], exist_ok=True)
+        try:
+            yield profile["path"]
+        finally:
+            profile["uses"] += 1
+            if self.recycle_after and profile["uses"] >= self.recycle_after:
+                threading.Thread(target=self._recycle, args=(profile,), daemon=True).start()
+            else:
+                self._release(profile)
+
+    def warm(self, chrome_path):
+        """Initialise every profile that has not been warmed yet."""
+        self.chrome_path = chrome_path
+        for _ in range(self.idle.qsize()):
+            try:
+                profile = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._warm_profile(profile)
             finally:
+                self._release(profile)
+
+    def _warm_profile(self, profile):
+        if profile["warm"] or not self.chrome_path:
+            return
+        os.makedirs(profile["path"], exist_ok=True)
+        cmd = [
+            self.chrome_path,
+            "--headless",
+            "--no-first-run",
+            "--no-default-browser-check",
+            f"--user-data-dir={profile['path']}",
+            "--dump-dom",
+            "about:blank",
+        ]
+        chrome_processes.inc()
+        try:
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+            profile["warm"] = True
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log_to_file(f"Could not warm Chrome profile {profile['path']}: {str(e)}", "WARNING")
+        finally:
+            chrome_processes.dec()
+
+    def _recycle(self, profile):
+        try:
+            shutil.rmtree(profile["path"], ignore_errors=True)
+            profile["uses"] = 0
+            profile["warm"] = False
+            self._warm_profile(profile)
+        finally:
+            self._release(profile)
+
+def get_profile_pool():
+    """Get the shared Chrome profile pool, creating it from config on first use."""
+    global chrome_profile_pool
+    if chrome_profile_pool is None:
+        config = config_manager.get_config()
+        chrome_profile_pool = ChromeProfilePool(
+            size=config.get('chrome_profile_pool_size', 2),
+            recycle_after=config.get('chrome_profile_recycle_jobs', 50)
+        )
+    return chrome_profile_pool
+
+class DevToolsChromePrinter(ChromePrinter):
+    """
+    Print engine that keeps one Chrome running and prints each job in a new tab.
+
+    Jobs are driven over the DevTools protocol: the engine waits for the page
+    to load and for the injected script to report that window.print() has
+    returned, instead of sleeping for a fixed time. wait_seconds becomes an
+    upper bound. Chrome runs with --kiosk-printing (not headless, since
+    headless Chrome cannot print to a physical printer).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.browser = None
+        self.lock = threading.Lock()
+
+    def _ensure_browser(self, chrome_path):
+        with self.lock:
+            if self.browser is None or not self.browser.is_alive():
+                if self.browser is not None:
+                    log_to_file("Persistent Chrome stopped responding - restarting", "WARNING")
+                    self._close_browser()
+                self.chrome_path = self._resolve_chrome_path(chrome_path)
+                user_data_dir = os.path.join(tempfile.gettempdir(), "flowprint_chrome_devtools_profile")
+                self.browser = ChromeBrowser(self.chrome_path, user_data_dir, extra_args=["--kiosk-printing"])
+                chrome_processes.inc()
+                log_to_file("Persistent Chrome print engine started")
+            return self.browser
+
+    def print_html_file(self, html_path, auto_print=True, chrome_path="", wait_seconds=8, prepared=False, title=""):
+        if not auto_print:
+            # The interactive print dialog needs its own visible window
+            return super().print_html_file(html_path, auto_print=False, chrome_path=chrome_path,
+                                           wait_seconds=wait_seconds, prepared=prepared)
+
+        browser = self._ensure_browser(chrome_path)
+
+        if prepared:
+            modified_path = html_path
+        else:
+            with open(html_path, "r", encoding="utf-8", errors="ignore") as f:
+                html_content = f.read()
+            modified_path = os.path.join(tempfile.gettempdir(), f"flowprint_{uuid.uuid4().hex}.html")
+            self.write_print_file(modified_path, html_content, auto_close=True)
+
+        try:
+            result = browser.print_page(Path(modified_path).as_uri(), timeout=wait_seconds)
+        except DevToolsError:
+            # Connection dropped mid-job; the next job restarts Chrome
+            with self.lock:
+                if self.browser is browser:
+                    self._close_browser()
+            raise
+        finally:
+            if not prepared:
                 try:
                     os.remove(modified_path)
                 except:
                     pass
+
+        if not result["printed"]:
+            log_to_file(f"Print not confirmed within {wait_seconds}s (page loaded: {result['loaded']})", "WARNING")
+            result["error"] = f"Print not confirmed within {wait_seconds}s"
+        return result
+
+    def _close_browser(self):
+        """Close the persistent Chrome (caller holds self.lock)."""
+        self.browser.close()
+        self.browser = None
+        chrome_processes.dec()
+
+    def close(self):
+        with self.lock:
+            if self.browser is not None:
+                self._close_browser()
+
+class CupsPrinter(ChromePrinter):
+    """
+    Print engine for print servers: headless Chrome renders each job to PDF
+    and the PDF is submitted to CUPS with lp or lpr for a named printer.
+
+    Chrome exits as soon as the PDF is written, so there is no fixed wait
+    and no desktop session is needed; the spooler does the queuing.
+    """
+
+    # Job files are rendered as-is (a print script would close the headless page)
+    injects_print_script = False
+
+    def render_pdf(self, html_path, pdf_path, chrome_path="", timeout=60):
+        """Render an HTML file to PDF with headless Chrome."""
+        self.chrome_path = self._resolve_chrome_path(chrome_path)
+        user_data_dir = os.path.join(tempfile.gettempdir(), "flowprint_chrome_headless_profile")
+        os.makedirs(user_data_dir, exist_ok=True)
+
+        cmd = [
+            self.chrome_path,
+            "--headless",
+            "--disable-gpu",
+            "--no-pdf-header-footer",
+            "--print-to-pdf-no-header",
+            f"--user-data-dir={user_data_dir}",
+            f"--print-to-pdf={pdf_path}",
+            Path(html_path).as_uri(),
+        ]
+        chrome_processes.inc()
+        try:
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+        finally:
+            chrome_processes.dec()
+
+        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+            raise RuntimeError("Chrome did not produce a PDF")
+
+    def submit_pdf(self, pdf_path, printer="", command="lp", options=(), title="FlowPrint"):
+        """
+        Hand a PDF to the CUPS spooler.
+
+        Returns:
+            str: The spooler's response (e.g. "request id is Office-42 (1 file(s))")
+        """
+        if os.path.basename(command).startswith("lpr"):
+            cmd = [command, "-T", title]
+            if printer:
+                cmd += ["-P", printer]
+        else:
+            cmd = [command, "-t", title]
+            if printer:
+                cmd += ["-d", printer]
+        for option in options:
+            cmd += ["-o", option]
+        cmd.append(pdf_path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            raise RuntimeError(f"{os.path.basename(command)} failed (exit {result.returncode}): {(result.stderr or result.stdout).strip()}")
+        return result.stdout.strip()
+
+    def print_html_file(self, html_path, auto_print=True, chrome_path="", wait_seconds=8, prepared=False, title=""):
+        if not auto_print:
+            # The interactive print dialog needs a visible window
+            return super().print_html_file(html_path, auto_print=False, chrome_path=chrome_path, wait_seconds=wait_seconds)
+
+        config = config_manager.get_config()
+        started = time.monotonic()
+        cache = get_pdf_cache() if config.get('pdf_cache_enabled', True) else None
+        cache_key = cache.key_for(html_path) if cache else None
+        cached_pdf = cache.get(cache_key) if cache else None
+        submit_args = {
+            "printer": config.get('cups_printer', ''),
+            "command": config.get('cups_command', 'lp') or 'lp',
+            "options": config.get('cups_options', []),
+            "title": title or os.path.basename(html_path),
+        }
+
+        if cached_pdf:
+            # Same HTML was rendered before (e.g. a reprint): skip Chrome entirely
+            spooled = self.submit_pdf(cached_pdf, **submit_args)
         else:
+            pdf_path = os.path.join(tempfile.gettempdir(), f"flowprint_{uuid.uuid4().hex}.pdf")
             try:
-                subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            except Exception as e:
+                self.render_pdf(
+                    html_path,
+                    pdf_path,
+                    chrome_path=chrome_path,
+                    timeout=config.get('pdf_render_timeout_seconds', 60)
+                )
+                spooled = self.submit_pdf(pdf_path, **submit_args)
+                if cache:
+                    cache.put(cache_key, pdf_path)
+            finally:
                 try:
-                    os.remove(modified_path)
+                    os.remove(pdf_path)
                 except:
                     pass
-                raise
+
+        log_to_file(f"Spooled to {config.get('cups_printer') or 'default printer'}: {spooled}")
+        return {
+            "printed": True,
+            "spooled": spooled,
+            "cached": bool(cached_pdf),
+            "print_seconds": time.monotonic() - started
+        }
+
+def print_duration(result):
+    """Seconds a print engine reported for a confirmed print, or None."""
+    if isinstance(result, dict) and result.get("printed"):
+        return result.get("print_seconds")
+    return None
+
+def unconfirmed_print_error(result):
+    """Error for an auto-print the engine could not confirm (timed out), or None."""
+    if isinstance(result, dict) and result.get("printed") is False:
+        return RuntimeError(result.get("error") or "Print not confirmed")
+    return None
+
+def get_printer_key(config):
+    """
+    Queue lane key: the CUPS queue for the cups engine.
+
+    The Chrome engines can only print to the system default printer, so all
+    their jobs share one lane and _new_print_queue() gives them one worker.
+    """
+    if config.get('print_engine', 'subprocess') == 'cups':
+        return config.get('cups_printer', '') or "default"
+    return "default"
+
+def get_chrome_printer():
+    """Get the print engine selected by the print_engine setting."""
+    global chrome_engine
+    config = config_manager.get_config()
+    engine = config.get('print_engine', 'subprocess')
+    if engine == 'devtools':
+        if chrome_engine is None:
+            chrome_engine = DevToolsChromePrinter()
+        return chrome_engine
+    if engine == 'cups':
+        return CupsPrinter()
+    return ChromePrinter()
 
 # ==========================
-# Temp File Manager
+# Print Queue
 # ==========================
 
-class TempFileManager:
-    def __init__(self):
-        self.temp_dir = os.path.join(tempfile.gettempdir(), "flowprint_jobs")
-        os.makedirs(self.temp_dir, exist_ok=True)
-        self.tracked_files = {}
-        self.last_cleanup = datetime.now()
-        
-    def create_temp_file(self, subject, html_content):
-        safe_label = "".join(c for c in subject if c.isalnum() or c in ("-", "_", " "))[:40]
-        filename = (safe_label or "FlowPrint") + f"_{uuid.uuid4().hex[:8]}.html"
-        temp_path = os.path.join(self.temp_dir, filename)
-        
-        with open(temp_path, "w", encoding="utf-8", errors="ignore") as f:
-            f.write(html_content)
-        
-        self.tracked_files[temp_path] = datetime.now()
-        return temp_path
-    
-    def should_cleanup(self, cleanup_hours, cleanup_enabled):
-        if not cleanup_enabled:
-            return False
-        elapsed = datetime.now() - self.last_cleanup
-        return elapsed.total_seconds() >= (cleanup_hours * 3600)
-    
-    def cleanup_old_files(self, cleanup_hours):
-        now = datetime.now()
-        cutoff = now - timedelta(hours=cleanup_hours)
-        
-        files_to_remove = []
-        for filepath, creation_time in list(self.tracked_files.items()):
-            if creation_time < cutoff:
-                files_to_remove.append(filepath)
-        
-        temp_dir = tempfile.gettempdir()
+class PrintJob:
+    """
+    One queued print: an HTML file, the engine to print it with and the
+    print_html_file arguments. on_done(result, error) is called on the
+    print worker once the job has printed or failed. title names the job in
+    the printer queue (the email subject or webhook order).
+
+    The time spent waiting in the print queue and printing is added to
+    timings as "print_queue" and "print".
+    """
+
+    def __init__(self, html_path, printer, print_args, on_done, timings=None, title=""):
+        self.html_path = html_path
+        self.printer = printer
+        self.print_args = print_args
+        self.title = title
+        self.on_done = on_done
+        self.timings = {} if timings is None else timings
+        self.queued_at = time.monotonic()
+
+    def start(self):
+        """Note the end of the queue wait (called as the job starts printing)."""
+        self.timings["print_queue"] = time.monotonic() - self.queued_at
+
+    def can_merge(self, other):
+        """Auto-print jobs for the same engine and settings can share a document."""
+        return (
+            self.print_args.get('auto_print', True)
+            and type(self.printer) is type(other.printer)
+            and self.print_args == other.print_args
+        )
+
+    def __call__(self):
+        self.start()
         try:
-            for filename in os.listdir(temp_dir):
-                if filename.startswith("flowprint_") and filename.endswith(".html"):
-                    filepath = os.path.join(temp_dir, filename)
-                    try:
-                        file_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-                        if file_time < cutoff:
-                            files_to_remove.append(filepath)
-                    except:
-                        pass
+            with timed_stage(self.timings, "print"):
+                result = self.printer.print_html_file(self.html_path, title=self.title, **self.print_args)
+        except Exception as e:
+            self.on_done(None, e)
+            return
+        self.on_done(result, None)
+
+BATCH_PAGE_STYLE = """
+<style>
+.flowprint-batch-page { break-after: page; page-break-after: always; }
+.flowprint-batch-page:last-of-type { break-after: auto; page-break-after: auto; }
+</style>"""
+
+def merge_html_documents(documents):
+    """
+    Combine HTML documents into one, each starting on a new page.
+
+    Each distinct <head> (minus its title) is kept once so every document's
+    styles still apply; bodies are wrapped in page-break containers.
+    """
+    heads = []
+    pages = []
+    for html in documents:
+        html = strip_print_script(html)
+        head = re.search(r"<head[^>]*>(.*?)</head>", html, re.IGNORECASE | re.DOTALL)
+        if head:
+            head_html = re.sub(r"<title[^>]*>.*?</title>", "", head.group(1), flags=re.IGNORECASE | re.DOTALL)
+            if head_html not in heads:
+                heads.append(head_html)
+        body = re.search(r"<body[^>]*>(.*)</body>", html, re.IGNORECASE | re.DOTALL)
+        pages.append(body.group(1) if body else html)
+
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        + "".join(heads)
+        + BATCH_PAGE_STYLE
+        + "</head><body>"
+        + "".join(f'<div class="flowprint-batch-page">{page}</div>' for page in pages)
+        + "</body></html>"
+    )
+
+def print_batch(jobs):
+    """Print several mergeable PrintJobs as one document, then report to each job."""
+    first = jobs[0]
+    merged_path = os.path.join(tempfile.gettempdir(), f"flowprint_batch_{uuid.uuid4().hex}.html")
+    print_args = dict(first.print_args)
+    # The timeout is a safety net per job, so it grows with the batch
+    print_args['wait_seconds'] = print_args.get('wait_seconds', 8) * len(jobs)
+
+    for job in jobs:
+        job.start()
+    started = time.monotonic()
+
+    result, error = None, None
+    try:
+        documents = []
+        for job in jobs:
+            with open(job.html_path, "r", encoding="utf-8", errors="ignore") as f:
+                documents.append(f.read())
+        merged = merge_html_documents(documents)
+        if print_args.get('prepared'):
+            first.printer.write_print_file(merged_path, merged, auto_close=print_args.get('auto_print', True))
+        else:
+            with open(merged_path, "w", encoding="utf-8", errors="ignore") as f:
+                f.write(merged)
+        title = first.title if len(jobs) == 1 else f"{first.title} (+{len(jobs) - 1} more)"
+        result = first.printer.print_html_file(merged_path, title=title, **print_args)
+        log_to_file(f"Printed {len(jobs)} jobs as one document")
+    except Exception as e:
+        error = e
+    finally:
+        try:
+            os.remove(merged_path)
         except:
             pass
-        
-        for filepath in files_to_remove:
+
+    # Every job in the batch waited for the whole merged print
+    elapsed = time.monotonic() - started
+    for job in jobs:
+        job.timings["print"] = elapsed
+        job.on_done(dict(result or {}, batch_size=len(jobs)) if error is None else None, error)
+
+class PrintQueue:
+    """
+    Bounded queue of print jobs served by a pool of worker threads.
+
+    Each printer is pinned to one worker lane, so jobs for the same printer
+    print in submission order while different printers print in parallel.
+    submit() blocks while max_depth jobs are waiting (backpressure).
+
+    With a coalescing window, a lane that picks up a PrintJob keeps
+    collecting mergeable jobs for coalesce_seconds (or until
+    coalesce_max_jobs) and prints them as one document.
+    """
+
+    def __init__(self, workers=2, max_depth=100, on_change=None, coalesce_seconds=0, coalesce_max_jobs=10):
+        self.coalesce_seconds = coalesce_seconds or 0
+        self.coalesce_max_jobs = max(1, int(coalesce_max_jobs))
+        self.lanes = [queue.Queue() for _ in range(max(1, int(workers)))]
+        self.slots = threading.Semaphore(max(1, int(max_depth)))
+        self.on_change = on_change
+        self.depth = 0
+        self.depth_lock = threading.Lock()
+        self.running = True
+        self.draining = False
+        self.threads = []
+        for lane in self.lanes:
+            thread = threading.Thread(target=self._worker, args=(lane,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _changed(self, delta):
+        with self.depth_lock:
+            self.depth += delta
+            depth = self.depth
+        if self.on_change:
+            self.on_change(depth)
+
+    def submit(self, printer_key, job):
+        """
+        Queue a callable for the lane serving printer_key.
+
+        Returns:
+            bool: False if the queue was stopped while waiting for space
+        """
+        while not self.slots.acquire(timeout=0.5):
+            if not self.running:
+                return False
+        if not self.running or self.draining:
+            self.slots.release()
+            return False
+        lane = self.lanes[zlib.crc32(printer_key.encode("utf-8")) % len(self.lanes)]
+        self._changed(1)
+        lane.put(job)
+        return True
+
+    def _collect_batch(self, lane, job, held):
+        """Gather jobs mergeable with job until the window closes or the batch is full."""
+        batch = [job]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while len(batch) < self.coalesce_max_jobs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                if filepath in self.tracked_files:
-                    del self.tracked_files[filepath]
-            except:
-                pass
-        
-        if files_to_remove:
-            self.last_cleanup = now
-            log_to_file(f"Cleaned up {len(files_to_remove)} old file(s)")
-    
-    def cleanup_all_files(self):
-        for filepath in list(self.tracked_files.keys()):
+                next_job = lane.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if isinstance(next_job, PrintJob) and job.can_merge(next_job):
+                batch.append(next_job)
+            else:
+                # Different settings (or stop): runs after this batch
+                held.append(next_job)
+                break
+        return batch
+
+    def _worker(self, lane):
+        held = []
+        while True:
+            job = held.pop() if held else lane.get()
+            if job is None:
+                if self.running and not lane.empty():
+                    # Draining: jobs that raced in behind the stop marker still print
+                    continue
+                return
+            batch = [job]
+            if isinstance(job, PrintJob) and self.coalesce_seconds > 0 and self.coalesce_max_jobs > 1 and job.can_merge(job):
+                batch = self._collect_batch(lane, job, held)
             try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except:
-                pass
-        
-        temp_dir = tempfile.gettempdir()
-        try:
-            for filename in os.listdir(temp_dir):
-                if filename.startswith("flowprint_") and filename.endswith(".html"):
-                    filepath = os.path.join(temp_dir, filename)
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass
-        except:
-            pass
-        
-        self.tracked_files.clear()
+                if self.running:
+                    if len(batch) > 1:
+                        print_batch(batch)
+                    else:
+                        job()
+            except Exception as e:
+                log_to_file(f"Print worker error: {str(e)}", "ERROR")
+            finally:
+                for _ in batch:
+                    self._changed(-1)
+                    self.slots.release()
+
+    def stop(self):
+        """Stop the workers after their current job; queued jobs are dropped."""
+        self.running = False
+        for lane in self.lanes:
+            lane.put(None)
+
+    def drain(self, timeout=None):
+        """
+        Refuse new jobs, print the queued ones, then stop the workers.
+
+        Returns:
+            bool: True if every worker finished within timeout
+        """
+        self.draining = True
+        for lane in self.lanes:
+            lane.put(None)
+        return self.join(timeout)
+
+    def join(self, timeout=None):
+        """
+        Wait for the workers to exit after stop() or drain().
+
+        Returns:
+            bool: True if every worker finished within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self.threads)
+
+# ==========================
+# Webhook Worker
+# ==========================
+
+class WebhookWorker:
+    """
+    Background threads that render and print webhooks from the durable queue.
+
+    The webhook route only verifies and enqueues, so Shopify gets its
+    response straight away; jobs left over from a previous run are picked
+    up as soon as the workers start.
+    """
+
+    def __init__(self, job_queue, workers=1, retention_hours=168, coalesce_seconds=0, coalesce_max_jobs=10):
+        self.job_queue = job_queue
+        self.workers = workers
+        self.retention_hours = retention_hours
+        self.print_queue = PrintQueue(
+            workers=workers,
+            coalesce_seconds=coalesce_seconds,
+            coalesce_max_jobs=coalesce_max_jobs
+        )
+        self.last_purge = 0
+        self.running = True
+        self.threads = []
+        for _ in range(max(1, int(workers))):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _worker(self):
+        while self.running:
+            try:
+                job = self.job_queue.claim(timeout=1.0)
+                if job is None:
+                    self._purge_old_jobs()
+                    continue
+                process_webhook_job(self.job_queue, self.print_queue, job)
+            except Exception as e:
+                log_to_file(f"Webhook worker error: {str(e)}", "ERROR")
+                time.sleep(1)
+
+    def _purge_old_jobs(self):
+        if time.time() - self.last_purge < 3600:
+            return
+        self.last_purge = time.time()
+        removed = self.job_queue.purge(self.retention_hours)
+        if removed:
+            log_to_file(f"Removed {removed} finished webhook jobs", "INFO")
+
+    def stop(self):
+        """Stop after the current job; queued jobs stay in the database."""
+        self.running = False
+        self.print_queue.stop()
+
+    def drain(self, timeout=60):
+        """Stop claiming webhooks, then let the ones already claimed finish printing."""
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout)
+        self.print_queue.drain(timeout)
+
+    def replace_print_queue(self):
+        """
+        Switch to a print queue built from the current settings.
+
+        Returns:
+            PrintQueue: The previous queue, still holding its jobs (drain it)
+        """
+        config = config_manager.get_config()
+        old = self.print_queue
+        self.print_queue = PrintQueue(
+            workers=self.workers,
+            coalesce_seconds=config.get('print_coalesce_seconds', 0),
+            coalesce_max_jobs=config.get('print_coalesce_max_jobs', 10)
+        )
+        return old
+
+def get_webhook_worker():
+    """Get the webhook worker pool, opening the queue and starting it if needed."""
+    global webhook_worker
+    if webhook_worker is None:
+        config = config_manager.get_config()
+        webhook_worker = WebhookWorker(
+            WebhookQueue(
+                config.get('webhook_queue_db', 'flowprint_webhooks.db'),
+                key_ttl_hours=config.get('webhook_idempotency_ttl_hours', 72)
+            ),
+            workers=config.get('webhook_workers', 1),
+            retention_hours=config.get('webhook_job_retention_hours', 168),
+            coalesce_seconds=config.get('print_coalesce_seconds', 0),
+            coalesce_max_jobs=config.get('print_coalesce_max_jobs', 10)
+        )
+    return webhook_worker
+
+def process_webhook_job(job_queue, print_queue, job):
+    """Render one queued webhook and hand it to the print queue."""
+    config = config_manager.get_config()
+    job_id = job['id']
+    order_number = job['order_name'] or 'Unknown'
+
+    socketio.emit("webhook_processing", {"order": order_number, "status": "processing", "job_id": job_id})
+
+    # Time in the webhook queue is measured with wall-clock time, since a job can outlive a restart
+    timings = dict(job.get('timings') or {})
+    timings["queue"] = max(0.0, time.time() - job['received_at'])
+
+    stage = "render"
+    try:
+        with timed_stage(timings, "render"):
+            order_data = json.loads(job['payload'])
+
+            # Render template with order data
+            template_name = config.get('webhook_template', 'default_packing_slip.html')
+            try:
+                html_content = webhook_handler.render_template(template_name, order_data)
+            except Exception as e:
+                raise RuntimeError(f"Template error: {str(e)}")
+
+        # Job file is written once, with the print script already in place
+        printer = get_chrome_printer()
+        prepared = getattr(printer, 'injects_print_script', False)
+        auto_print = config.get("webhook_auto_print", True)
+        stage = "store"
+        with timed_stage(timings, "store"):
+            print_job_id, job_file = store_job_file(
+                f"Webhook: Order {order_number}",
+                html_content,
+                "webhook",
+                printer=printer if prepared else None,
+                auto_close=auto_print
+            )
+    except Exception as e:
+        finish_webhook_job(job_queue, job_id, order_number, None, None, None, e, timings, stage)
+        return
+
+    print_job = PrintJob(
+        job_file,
+        printer,
+        {
+            "auto_print": auto_print,
+            "chrome_path": config['chrome_path'],
+            "wait_seconds": config.get("webhook_print_wait_seconds", 8),
+            "prepared": prepared,
+        },
+        lambda result, error: finish_webhook_job(job_queue, job_id, order_number, print_job_id, job_file, result, error, timings),
+        timings,
+        title=f"Webhook: Order {order_number}"
+    )
+    if not print_queue.submit(get_printer_key(config), print_job):
+        # Print queue stopped or being replaced: the job waits for the next worker
+        release_job_file(print_job_id)
+        job_queue.requeue(job_id)
+        log_to_file(f"Webhook order {order_number} put back in the queue (print queue not accepting jobs)", "WARNING")
+        socketio.emit("webhook_processing", {"order": order_number, "status": "queued", "job_id": job_id})
+
+def finish_webhook_job(job_queue, job_id, order_number, print_job_id, job_file, result, error, timings=None,
+                       failed_stage="print"):
+    """Record the outcome of a webhook print on its job, stats and dashboard."""
+    release_job_file(print_job_id)
+    if error is None:
+        error = unconfirmed_print_error(result)
+    if error is not None:
+        job_queue.fail(job_id, str(error))
+        record_job("webhook", "failed", f"Webhook: Order {order_number}", order_number,
+                   error=error, artifact_id=print_job_id, timings=timings, failed_stage=failed_stage)
+        if daemon:
+            daemon.add_error(f"Webhook order {order_number} failed: {str(error)}")
+        else:
+            log_to_file(f"Webhook order {order_number} failed: {str(error)}", "ERROR")
+        socketio.emit("webhook_processing", {
+            "order": order_number, "status": "failed", "job_id": job_id, "error": str(error)
+        })
+        return
+
+    job_queue.complete(job_id, job_file)
+    record_job("webhook", "printed", f"Webhook: Order {order_number}", order_number, "Auto-printed ✓",
+               print_seconds=print_duration(result), artifact_id=print_job_id, timings=timings)
+
+    # Update stats
+    if daemon:
+        daemon.stats['total_printed'] = daemon.stats.get('total_printed', 0) + 1
+
+        # Add to recent jobs
+        daemon.add_job(
+            f"Webhook: Order {order_number}",
+            "Auto-printed ✓",
+            print_job_id,
+            "webhook",
+            print_seconds=print_duration(result)
+        )
+
+    log_to_file(f"Successfully printed order {order_number} via webhook", "SUCCESS")
+    socketio.emit("webhook_processing", {"order": order_number, "status": "complete", "job_id": job_id})
+
+# ==========================
+# Job History
+# ==========================
+
+ORDER_NAME_PATTERN = re.compile(r"#\s?([A-Za-z0-9][\w-]*)")
+
+def get_job_history():
+    """Get the job history, opening it from config on first use."""
+    global job_history
+    if job_history is None:
+        config = config_manager.get_config()
+        job_history = JobHistory(config.get('job_history_db', 'flowprint_history.db'))
+    return job_history
+
+def get_latency_stats():
+    """Get the rolling stage timings, created from config on first use."""
+    global latency_stats
+    if latency_stats is None:
+        latency_stats = LatencyStats(config_manager.get_config().get('latency_window_jobs', 1000))
+    return latency_stats
+
+def record_job(source, status, subject, order_name=None, action=None, error=None,
+               print_seconds=None, artifact_id=None, timings=None, failed_stage="print"):
+    """
+    Add a job to the history, metrics and rolling stage percentiles.
+
+    An order number in the subject (e.g. "#1234") is used if none is given.
+    "total" is the sum of the stages. failed_stage labels the failure
+    counter when status is "failed".
+    """
+    if status == "failed":
+        job_failures.inc(source=source, stage=failed_stage)
+    else:
+        jobs_printed.inc(source=source)
+
+    if timings:
+        timings = {stage: round(seconds, 4) for stage, seconds in timings.items() if stage != "total"}
+        timings["total"] = round(sum(timings.values()), 4)
+        for stage, seconds in timings.items():
+            stage_seconds.observe(seconds, source=source, stage=stage)
+        stats = get_latency_stats()
+        stats.record(source, timings)
+        if daemon:
+            daemon.stats['latency'] = stats.summary()
+
+    if order_name is None and subject:
+        match = ORDER_NAME_PATTERN.search(subject)
+        if match:
+            order_name = f"#{match.group(1)}"
+    try:
+        get_job_history().add(
+            source, status, subject,
+            order_name=order_name,
+            action=action,
+            error=str(error) if error is not None else None,
+            print_seconds=print_seconds,
+            artifact_id=artifact_id,
+            timings=timings
+        )
+    except Exception as e:
+        log_to_file(f"Could not record job history: {str(e)}", "WARNING")
+
+# ==========================
+# Job Store
+# ==========================
+
+def get_job_store():
+    """Get the job file store, opening it from config on first use."""
+    global job_store
+    if job_store is None:
+        config = config_manager.get_config()
+        job_store = JobStore(
+            config.get('job_store_dir', 'flowprint_jobs'),
+            max_bytes=config.get('job_store_max_mb', 500) * 1024 * 1024,
+            max_jobs=config.get('job_store_max_jobs', 1000)
+        )
+    return job_store
+
+def get_pdf_cache():
+    """Get the rendered-PDF cache, opening it from config on first use."""
+    global pdf_cache
+    if pdf_cache is None:
+        config = config_manager.get_config()
+        pdf_cache = PdfCache(
+            config.get('pdf_cache_dir', 'flowprint_pdf_cache'),
+            max_bytes=config.get('pdf_cache_max_mb', 200) * 1024 * 1024
+        )
+    return pdf_cache
+
+def store_job_file(subject, html_content, source="email", printer=None, auto_close=True):
+    """
+    Save a job's HTML in the job store, pinned until release_job_file().
+
+    With a printer, the file is written through printer.write_print_file()
+    so it carries the print script and can be printed with prepared=True.
+
+    Returns:
+        tuple: (job_id, path)
+    """
+    if printer is None:
+        return get_job_store().put(html_content, subject, source, pin=True)
+    return get_job_store().put(
+        html_content,
+        subject,
+        source,
+        variant=f"print-script:{'auto' if auto_close else 'dialog'}",
+        writer=lambda path, content: printer.write_print_file(path, content, auto_close=auto_close),
+        pin=True
+    )
+
+def release_job_file(job_id):
+    """Unpin a stored job file once its print has finished, so it can be evicted again."""
+    if job_id and job_store is not None:
+        job_store.unpin(job_id)
 
 # ==========================
 # IMAP Daemon
@@ -435,9 +1705,17 @@ class TempFileManager:
 class ImapPrintDaemon:
     def __init__(self):
         self.conn = None
-        self.chrome_printer = ChromePrinter()
-        self.temp_manager = TempFileManager()
-        self.printed_uids = set()
+        self.idle_supported = False
+        self.idling = False
+        self.uidvalidity = None
+        self.uid_state = {}
+        self.pending_seen = []
+        self.pending_deletes = []
+        self.flag_lock = threading.Lock()
+        self.inflight_uids = set()
+        self.chrome_printer = get_chrome_printer()
+        self.last_cleanup = datetime.now()
+        self.uid_store = None
         self.running = False
         self.status = "Stopped"
         self.stats = {
@@ -450,26 +1728,222 @@ class ImapPrintDaemon:
             "next_cleanup": "Calculating...",
             "recent_jobs": [],
             "errors": [],
-            "total_printed": 0
+            "total_printed": 0,
+            "webhook_duplicates_dropped": webhook_worker.job_queue.duplicate_hits if webhook_worker else 0,
+            "webhook_unique_received": webhook_worker.job_queue.duplicate_misses if webhook_worker else 0
         }
-        self._load_printed_uids()
-        
-    def _load_printed_uids(self):
+        self.reconnect_pending = False
+        self.scheduler = Scheduler()
+        self.check_requested = False
+        self.check_after_prints = False
+        self.listening = False  # Waiting in IMAP IDLE between checks
+        self.poll_interval = config_manager.get_config()['poll_interval_seconds']
+        self.mailbox_config = config_manager.get_config()
+        self._open_uid_store()
+        self._load_uid_state()
+        self.print_queue = self._new_print_queue()
+
+    def _new_print_queue(self):
         config = config_manager.get_config()
-        uids_file = config.get('printed_uids_file', 'printed_uids.txt')
-        if os.path.exists(uids_file):
-            with open(uids_file, "r", encoding="utf-8", errors="ignore") as f:
-                for line in f:
-                    uid = line.strip()
-                    if uid:
-                        self.printed_uids.add(uid)
+        # Only the cups engine has more than one lane to spread over workers
+        cups = config.get('print_engine', 'subprocess') == 'cups'
+        return PrintQueue(
+            workers=config.get('print_workers', 2) if cups else 1,
+            max_depth=config.get('print_queue_max_depth', 100),
+            on_change=self._on_queue_change,
+            coalesce_seconds=config.get('print_coalesce_seconds', 0),
+            coalesce_max_jobs=config.get('print_coalesce_max_jobs', 10)
+        )
 
-    def _save_printed_uid(self, uid):
+    def replace_print_queue(self):
+        """
+        Switch to a print engine and queue built from the current settings.
+
+        Returns:
+            PrintQueue: The previous queue, still holding its jobs (drain it)
+        """
+        old = self.print_queue
+        old.on_change = None
+        self.chrome_printer = get_chrome_printer()
+        self.print_queue = self._new_print_queue()
+        return old
+
+    def request_reconnect(self):
+        """Reopen the IMAP session and UID stores with new settings (done by the daemon thread)."""
+        self.reconnect_pending = True
+        self.check_now()
+
+    def check_now(self):
+        """Check the inbox right away (wakes the daemon from IDLE or its wait)."""
+        self.check_requested = True
+        self.scheduler.schedule("check", 0, self.check_mailbox)
+
+    def _reload_mailbox(self, config):
+        """Finish in-flight jobs on the old mailbox, then drop the session and reopen the stores."""
+        self.reconnect_pending = False
+        self.check_after_prints = False
+        self.update_status("Applying new mailbox settings...")
+        # Jobs from the old mailbox print on their own queue; new ones wait for the switch
+        retired = self.replace_print_queue()
+        retired.drain(0)
+        while not retired.join(1):
+            if not self.running and retired.running:
+                # Stopping: drop what is still queued, but let running jobs record their UIDs
+                retired.stop()
+        # Flags and printed UIDs of finished jobs belong to the old mailbox
+        self.flush_flag_updates(config)
+        self.uid_store.flush()
+        self.disconnect()
+        self.uid_store.close()
+        self.mailbox_config = config
+        self.uidvalidity = None
+        self.uid_state = {}
+        self._open_uid_store()
+        self._load_uid_state()
+        log_to_file("Mailbox settings changed - reconnected with the new settings")
+        
+    def _open_uid_store(self):
         config = config_manager.get_config()
+        if config.get('dedup_store', 'sqlite') == 'text':
+            self.uid_store = TextUidStore(config.get('printed_uids_file', 'printed_uids.txt'))
+        else:
+            self.uid_store = SqliteUidStore(
+                config.get('dedup_db_file', 'flowprint_dedup.db'),
+                journal_mode=config.get('dedup_sqlite_journal_mode', 'WAL'),
+                batch_size=config.get('dedup_commit_batch_size', 50)
+            )
+
+    def _uid_scope(self, config):
+        """(account, mailbox, uidvalidity) that printed UIDs are recorded under."""
+        return f"{config['imap_username']}@{config['imap_host']}", config['mailbox'], self.uidvalidity
+
+    # Print workers use the settings the mailbox was opened with, so jobs
+    # finishing while new mailbox settings are applied stay with their mailbox
+    def _is_printed(self, uid):
+        return self.uid_store.contains(*self._uid_scope(self.mailbox_config), uid)
+
+    def _save_printed_uid(self, uid):
+        self.uid_store.add(*self._uid_scope(self.mailbox_config), uid)
+
+    def _migrate_legacy_uids(self, config):
+        """One-time import of printed_uids.txt, once the mailbox's UIDVALIDITY is known."""
         uids_file = config.get('printed_uids_file', 'printed_uids.txt')
-        self.printed_uids.add(uid)
-        with open(uids_file, "a", encoding="utf-8", errors="ignore") as f:
-            f.write(uid + "\n")
+        if config.get('dedup_store', 'sqlite') == 'text' or not os.path.exists(uids_file):
+            return
+        try:
+            count = self.uid_store.migrate_text_file(uids_file, *self._uid_scope(config))
+            log_to_file(f"Imported {count} printed UID(s) from {uids_file} into the dedup store", "SUCCESS")
+        except Exception as e:
+            log_to_file(f"Printed UID migration failed: {str(e)}", "ERROR")
+
+    def _load_uid_state(self):
+        config = config_manager.get_config()
+        state_file = config.get('uid_state_file', 'uid_state.json')
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, "r", encoding="utf-8") as f:
+                    self.uid_state = json.load(f)
+            except Exception:
+                log_to_file("UID state file unreadable - starting with a full scan", "WARNING")
+                self.uid_state = {}
+
+    def _save_uid_state(self):
+        config = config_manager.get_config()
+        state_file = config.get('uid_state_file', 'uid_state.json')
+        tmp_file = state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.uid_state, f, indent=2)
+        os.replace(tmp_file, state_file)
+
+    def _mailbox_key(self, config):
+        return f"{config['imap_username']}@{config['imap_host']}/{config['mailbox']}"
+
+    def _read_uidvalidity(self, mailbox):
+        """Get UIDVALIDITY from the SELECT response, falling back to STATUS."""
+        try:
+            _, data = self.conn.response("UIDVALIDITY")
+            if data and data[0]:
+                return int(data[0])
+            status, data = self.conn.status(mailbox, "(UIDVALIDITY)")
+            if status == "OK" and data and data[0]:
+                match = re.search(rb"UIDVALIDITY (\d+)", data[0])
+                if match:
+                    return int(match.group(1))
+        except Exception:
+            pass
+        return None
+
+    def _search_start_uid(self, config):
+        """
+        First UID worth searching from, 0 for a full mailbox scan, or None
+        when UIDVALIDITY changed.
+
+        A changed UIDVALIDITY means every UID in the mailbox was renumbered,
+        so the watermark is dropped and the caller rescans under the new epoch.
+        """
+        if self.uidvalidity is None:
+            return 0
+
+        key = self._mailbox_key(config)
+        state = self.uid_state.get(key)
+        if state is None:
+            return 0
+
+        if state.get("uidvalidity") != self.uidvalidity:
+            log_to_file(
+                f"UIDVALIDITY for {config['mailbox']} changed "
+                f"({state.get('uidvalidity')} -> {self.uidvalidity}) - rescanning unread messages only",
+                "WARNING"
+            )
+            del self.uid_state[key]
+            self._save_uid_state()
+            return None
+
+        return state.get("last_uid", 0) + 1
+
+    def _advance_watermark(self, config, uids):
+        """
+        Move the watermark past every UID that has been handled.
+
+        Stops at the first UID that is not yet recorded (e.g. a failed fetch)
+        so it is picked up again on the next check.
+        """
+        if self.uidvalidity is None or not uids:
+            return
+
+        key = self._mailbox_key(config)
+        last_uid = self.uid_state.get(key, {}).get("last_uid", 0)
+        unhandled = {int(u) for u in self.uid_store.filter_new(*self._uid_scope(config), uids)}
+        for uid in sorted(int(u) for u in uids):
+            if uid <= last_uid:
+                continue
+            if uid in unhandled:
+                break
+            last_uid = uid
+
+        if self.uid_state.get(key) != {"uidvalidity": self.uidvalidity, "last_uid": last_uid}:
+            self.uid_state[key] = {"uidvalidity": self.uidvalidity, "last_uid": last_uid}
+            self._save_uid_state()
+
+    def _on_queue_change(self, depth):
+        self.stats['jobs_pending'] = depth
+        self.emit_status_update()
+        if depth == 0:
+            self.uid_store.flush()
+            if self.check_after_prints:
+                # Check again now so the finished jobs' flags go out
+                self.check_after_prints = False
+                self.check_now()
+
+    def _warm_chrome_profiles(self, config):
+        """Pre-create the subprocess engine's Chrome profiles (runs in the background)."""
+        try:
+            chrome_path = self.chrome_printer._resolve_chrome_path(config['chrome_path'])
+        except FileNotFoundError:
+            return
+        started = time.monotonic()
+        get_profile_pool().warm(chrome_path)
+        log_to_file(f"Chrome profiles warmed in {time.monotonic() - started:.1f}s")
 
     def update_status(self, status):
         self.status = status
@@ -477,11 +1951,8 @@ class ImapPrintDaemon:
         log_to_file(f"Status: {status}")
 
     def emit_status_update(self):
-        """Emit status update to all connected clients."""
-        socketio.emit('status_update', {
-            'status': self.status,
-            'stats': self.stats
-        })
+        """Queue a status broadcast to connected clients (bursts are merged by the status bus)."""
+        status_bus.mark_dirty()
 
     def connect(self):
         config = config_manager.get_config()
@@ -495,6 +1966,9 @@ class ImapPrintDaemon:
             
             self.conn.login(config['imap_username'], config['imap_password'])
             self.conn.select(config['mailbox'])
+            self.uidvalidity = self._read_uidvalidity(config['mailbox'])
+            self._migrate_legacy_uids(config)
+            self.idle_supported = self._server_supports_idle()
             self.update_status("Connected ✓")
             log_to_file("Connected to mailbox successfully")
             return True
@@ -504,8 +1978,147 @@ class ImapPrintDaemon:
             log_to_file(f"Connection failed: {str(e)}", "ERROR")
             return False
 
+    def _server_supports_idle(self):
+        """Check the post-login capability list for IDLE (RFC 2177)."""
+        try:
+            status, data = self.conn.capability()
+            if status == "OK" and data and data[-1]:
+                return b"IDLE" in data[-1].upper().split()
+        except Exception:
+            pass
+        return "IDLE" in getattr(self.conn, "capabilities", ())
+
+    def ensure_connected(self, persistent=True):
+        """Reuse the open session when possible, otherwise (re)connect."""
+        if not persistent:
+            self.disconnect()
+        elif self.conn is not None:
+            try:
+                status, _ = self.conn.noop()
+                if status == "OK":
+                    return True
+            except Exception:
+                pass
+            log_to_file("IMAP session lost - reconnecting", "WARNING")
+            self.disconnect()
+        return self.connect()
+
+    def idle_wait(self, timeout_seconds):
+        """
+        Block in IMAP IDLE until the server reports new mail or the timeout expires.
+
+        Returns:
+            bool: True if the server pushed an EXISTS/RECENT notification
+        """
+        conn = self.conn
+        tag = conn._new_tag()
+        self.idling = True
+        try:
+            conn.send(tag + b" IDLE\r\n")
+            line = conn.readline()
+        except:
+            self.idling = False
+            raise
+        if not line.startswith(b"+"):
+            self.idling = False
+            conn.tagged_commands.pop(tag, None)
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+
+        new_mail = False
+        deadline = time.monotonic() + timeout_seconds
+        try:
+            while self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not self._imap_data_buffered(conn):
+                    readable, _, _ = select.select([conn.sock, self.scheduler.wake_socket], [], [], remaining)
+                    if self.scheduler.wake_socket in readable:
+                        # A task became due (manual check, new settings) or stop() was called
+                        break
+                    if not readable:
+                        continue
+                line = conn.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                upper = line.upper()
+                if upper.startswith(b"* BYE"):
+                    raise imaplib.IMAP4.abort(f"Server ended IDLE: {line.strip()!r}")
+                if upper.startswith(b"* ") and (upper.rstrip().endswith(b"EXISTS") or upper.rstrip().endswith(b"RECENT")):
+                    new_mail = True
+                    break
+        finally:
+            conn.tagged_commands.pop(tag, None)
+            try:
+                if self.conn is conn:
+                    conn.send(b"DONE\r\n")
+                    while True:
+                        line = conn.readline()
+                        if not line:
+                            raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+                        if line.startswith(tag):
+                            if not line[len(tag):].strip().upper().startswith(b"OK"):
+                                raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+                            break
+            finally:
+                self.idling = False
+
+        if new_mail:
+            log_to_file("New mail notification received (IDLE)")
+        return new_mail
+
+    @staticmethod
+    def _imap_data_buffered(conn):
+        """
+        Check for response bytes select() can't see: lines imaplib already
+        read into conn.file along with an earlier line, or decrypted bytes
+        held by the SSL layer.
+        """
+        timeout = conn.sock.gettimeout()
+        conn.sock.settimeout(0.0)
+        try:
+            # Non-blocking: returns buffered bytes, or reads what the socket has
+            return bool(conn.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            conn.sock.settimeout(timeout)
+
+    def wait_for_next_task(self):
+        """Wait until the next scheduled task is due: in IMAP IDLE while listening for mail, otherwise on the scheduler."""
+        # Wake-ups sent while tasks ran are stale; a task made due by one is caught by due_in().
+        # stop() clears running before it wakes, so a wake-up drained here is seen below
+        self.scheduler.clear_wakeups()
+        if not self.running:
+            return
+        timeout = self.scheduler.due_in()
+        if timeout == 0:
+            return
+
+        if self.listening and self.conn is not None:
+            try:
+                if self.idle_wait(timeout if timeout is not None else 600):
+                    self.check_now()
+            except (imaplib.IMAP4.error, OSError, ValueError) as e:
+                if self.running:
+                    log_to_file(f"IDLE interrupted: {str(e)}", "WARNING")
+                self.disconnect()
+                self.listening = False
+                self.check_now()
+            return
+
+        self.scheduler.wait()
+
     def disconnect(self):
-        if self.conn is not None:
+        if self.conn is not None and self.idling:
+            # Another thread is blocked in IDLE; commands sent now would be
+            # read as the end of IDLE, so just drop the socket to wake it
+            try:
+                self.conn.shutdown()
+            except:
+                pass
+            self.conn = None
+        elif self.conn is not None:
             try:
                 self.conn.close()
             except:
@@ -532,27 +2145,75 @@ class ImapPrintDaemon:
         config = config_manager.get_config()
         self.update_status("Searching for messages...")
         
-        criteria = f'(SUBJECT "{config["subject_prefix"]}")'
+        start_uid = self._search_start_uid(config)
+        if start_uid is None:
+            return self._seed_new_epoch(config)
+        if start_uid:
+            criteria = f'(UID {start_uid}:* SUBJECT "{config["subject_prefix"]}")'
+        else:
+            criteria = f'(SUBJECT "{config["subject_prefix"]}")'
         status, data = self.conn.uid("search", None, criteria)
 
         if status != "OK" or not data or not data[0]:
             return []
         
-        return data[0].split()
+        uids = data[0].split()
+        if start_uid:
+            # "n:*" always matches the highest UID, even when it is below n
+            uids = [uid for uid in uids if int(uid) >= start_uid]
+        return uids
+
+    def _seed_new_epoch(self, config):
+        """
+        Candidate UIDs after a UIDVALIDITY change.
+
+        Under the new epoch every message looks unprinted. Printed messages
+        are always flagged \\Seen, so read matches are recorded as printed
+        without printing them and only unread ones are left to print.
+
+        Returns:
+            list: Every matching UID; the read ones are already in the dedup store
+        """
+        prefix = config["subject_prefix"]
+        status, data = self.conn.uid("search", None, f'(SUBJECT "{prefix}")')
+        if status != "OK" or not data or not data[0]:
+            return []
+        uids = data[0].split()
+
+        status, data = self.conn.uid("search", None, f'(UNSEEN SUBJECT "{prefix}")')
+        if status != "OK":
+            raise imaplib.IMAP4.error("UNSEEN search failed after UIDVALIDITY change")
+        unseen = set(data[0].split()) if data and data[0] else set()
+
+        scope = self._uid_scope(config)
+        skipped = [uid for uid in uids if uid not in unseen]
+        for uid in skipped:
+            self.uid_store.add(*scope, uid)
+        self.uid_store.flush()
+        log_to_file(
+            f"New UIDVALIDITY epoch for {config['mailbox']}: {len(skipped)} read message(s) "
+            f"skipped as already printed, {len(uids) - len(skipped)} unread left to print",
+            "WARNING"
+        )
+        return uids
 
-    def add_job(self, subject, action, temp_file_path=None, source="email"):
+    def add_job(self, subject, action, job_id=None, source="email", print_seconds=None):
         timestamp = datetime.now().strftime("%H:%M:%S")
         job_entry = {
             "time": timestamp,
             "subject": subject[:50],
             "action": action,
-            "temp_file": temp_file_path,
-            "can_reprint": temp_file_path and os.path.exists(temp_file_path) if temp_file_path else False,
-            "source": source
+            "job_id": job_id,
+            "can_reprint": job_id is not None,
+            "source": source,
+            "print_seconds": round(print_seconds, 2) if print_seconds is not None else None
         }
         self.stats['recent_jobs'].insert(0, job_entry)
         self.stats['recent_jobs'] = self.stats['recent_jobs'][:10]  # Keep last 10
-        log_to_file(f"Job processed: {subject} - {action}", "SUCCESS")
+        if print_seconds is not None:
+            log_to_file(f"Job processed: {subject} - {action} ({print_seconds:.1f}s)", "SUCCESS")
+        else:
+            log_to_file(f"Job processed: {subject} - {action}", "SUCCESS")
         self.emit_status_update()
 
     def add_error(self, error_msg):
@@ -566,73 +2227,264 @@ class ImapPrintDaemon:
         log_to_file(error_msg, "ERROR")
         self.emit_status_update()
 
-    def process_message(self, uid_bytes):
+    def fetch_messages(self, uids, timings=None):
+        """
+        Download a batch of messages.
+
+        With partial fetch enabled, only BODYSTRUCTURE and the Subject header
+        are fetched first; the printable part is then downloaded for messages
+        whose subject matches, one UID FETCH per distinct section number.
+
+        Args:
+            uids: UIDs to fetch
+            timings: If given, time spent waiting on the server is added to timings["fetch"]
+
+        Returns:
+            dict: {uid: (subject, html_body)}, html_body is None when the
+            subject doesn't match
+        """
+        config = config_manager.get_config()
+        prefix = config['subject_prefix']
+        timings = {} if timings is None else timings
+        if not config.get('imap_partial_fetch', True):
+            return self._fetch_full_messages(uids, prefix, timings)
+
+        with timed_stage(timings, "fetch"):
+            status, data = self.conn.uid(
+                "fetch", format_uid_set(uids), "(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT)])"
+            )
+        if status != "OK" or not data:
+            return {}
+
+        results = {}
+        by_section = {}
+        full_fetch = []
+        for uid, items in parse_fetch_items(data).items():
+            header = next((v for k, v in items.items() if k.startswith(b"BODY[HEADER")), None) or b""
+            subject = get_subject(email.message_from_bytes(header))
+            if not subject_matches_prefix(subject, prefix):
+                results[uid] = (subject, None)
+                continue
+            part = find_body_section(items.get(b"BODYSTRUCTURE"))
+            if part is None:
+                full_fetch.append(uid)
+                continue
+            by_section.setdefault(part["section"], []).append((uid, subject, part))
+
+        for section, entries in by_section.items():
+            with timed_stage(timings, "fetch"):
+                status, data = self.conn.uid(
+                    "fetch", format_uid_set(uid for uid, _, _ in entries), f"(UID BODY.PEEK[{section}])"
+                )
+            fetched = parse_fetch_items(data) if status == "OK" and data else {}
+            key = f"BODY[{section}]".encode("ascii")
+            for uid, subject, part in entries:
+                payload = fetched.get(uid, {}).get(key)
+                if not isinstance(payload, bytes):
+                    full_fetch.append(uid)
+                    continue
+                body = decode_section(payload, part["encoding"], part["charset"])
+                if part["subtype"] == b"HTML":
+                    results[uid] = (subject, body_to_html(body, None))
+                else:
+                    results[uid] = (subject, body_to_html(None, body))
+
+        if full_fetch:
+            results.update(self._fetch_full_messages(full_fetch, prefix, timings))
+        return results
+
+    def _fetch_full_messages(self, uids, prefix, timings):
+        with timed_stage(timings, "fetch"):
+            status, data = self.conn.uid("fetch", format_uid_set(uids), "(UID RFC822)")
+        if status != "OK" or not data:
+            return {}
+
+        results = {}
+        for uid, items in parse_fetch_items(data).items():
+            raw = items.get(b"RFC822")
+            if not isinstance(raw, bytes):
+                continue
+            msg = email.message_from_bytes(raw)
+            subject = get_subject(msg)
+            if subject_matches_prefix(subject, prefix):
+                results[uid] = (subject, get_best_body(msg))
+            else:
+                results[uid] = (subject, None)
+        return results
+
+    def _timed_fetch(self, uids):
+        """
+        fetch_messages plus how long the batch took: waiting on the server
+        ("fetch") and decoding/MIME parsing ("parse").
+
+        Returns:
+            tuple: (messages, timings)
+        """
+        timings = {}
+        started = time.monotonic()
+        messages = self.fetch_messages(uids, timings)
+        timings["parse"] = max(0.0, time.monotonic() - started - timings.get("fetch", 0.0))
+        return messages, timings
+
+    def process_new_messages(self, config, uids):
+        """
+        Fetch new messages in UID-set batches and process them.
+
+        The next batch downloads on a helper thread while the current batch is
+        handed to the print queue. Flag updates queued by print workers are
+        sent between batches, while the connection is not busy with a fetch.
+        """
+        batch_size = max(1, int(config.get('imap_fetch_batch_size', 50)))
+        batches = [uids[i:i + batch_size] for i in range(0, len(uids), batch_size)]
+        self.flush_flag_updates(config)
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as fetcher:
+            future = fetcher.submit(self._timed_fetch, batches[0])
+            for index, batch in enumerate(batches):
+                messages, batch_timings = future.result()
+                messages_scanned.inc(len(messages))
+                self.flush_flag_updates(config)
+                if not self.running:
+                    break
+                if index + 1 < len(batches):
+                    future = fetcher.submit(self._timed_fetch, batches[index + 1])
+
+                # Each message is charged an equal share of its batch's fetch and parse time
+                share = {stage: seconds / max(1, len(messages)) for stage, seconds in batch_timings.items()}
+
+                for uid_bytes in batch:
+                    if not self.running:
+                        break
+                    fetched = messages.get(uid_bytes)
+                    if fetched is None:
+                        job_failures.inc(source="email", stage="fetch")
+                        self.add_error(f"Failed to fetch UID {uid_bytes.decode('ascii', errors='ignore')}")
+                        continue
+                    try:
+                        self.process_message(uid_bytes, fetched, dict(share))
+                    except Exception as e:
+                        job_failures.inc(source="email", stage="store")
+                        self.add_error(f"Error processing UID")
+
+        self.flush_flag_updates(config)
+
+    def flush_flag_updates(self, config):
+        """Send queued \\Seen / \\Deleted flags as one STORE per flag."""
+        if self.conn is None:
+            return
+        with self.flag_lock:
+            seen, self.pending_seen = self.pending_seen, []
+            deletes, self.pending_deletes = self.pending_deletes, []
+
+        if deletes:
+            if self.delete_email(format_uid_set(deletes).encode("ascii")):
+                log_to_file(f"{len(deletes)} printed email(s) deleted", "SUCCESS")
+            else:
+                self.add_error(f"Print succeeded but failed to delete email")
+        seen = [uid for uid in seen if uid not in deletes]
+        if seen:
+            self.mark_seen(format_uid_set(seen).encode("ascii"))
+
+    def process_message(self, uid_bytes, fetched=None, timings=None):
+        """
+        Parse a fetched message and hand it to the print queue.
+
+        timings (stage -> seconds) travels with the job and is recorded in
+        the job history once it has printed.
+        """
         config = config_manager.get_config()
         uid = uid_bytes.decode("ascii", errors="ignore")
         
-        if uid in self.printed_uids:
+        if uid_bytes in self.inflight_uids or self._is_printed(uid):
+            dedup_hits.inc(source="email")
             return
 
         self.update_status(f"Processing message UID {uid}...")
         
-        status, data = self.conn.uid("fetch", uid_bytes, "(RFC822)")
-        if status != "OK" or not data or not data[0]:
-            self.add_error(f"Failed to fetch UID {uid}")
-            return
+        if fetched is None:
+            messages, timings = self._timed_fetch([uid_bytes])
+            messages_scanned.inc(len(messages))
+            fetched = messages.get(uid_bytes)
+            if fetched is None:
+                job_failures.inc(source="email", stage="fetch")
+                self.add_error(f"Failed to fetch UID {uid}")
+                return
 
-        raw = data[0][1]
-        msg = email.message_from_bytes(raw)
-        subject = get_subject(msg)
+        subject, html_body = fetched
 
-        if not subject_matches_prefix(subject, config['subject_prefix']):
+        if html_body is None or not subject_matches_prefix(subject, config['subject_prefix']):
             self._save_printed_uid(uid)
             return
 
-        html_body = get_best_body(msg)
-        temp_path = self.temp_manager.create_temp_file(subject, html_body)
+        timings = {} if timings is None else timings
+        auto_print = config['auto_print_enabled']
+        prepared = getattr(self.chrome_printer, 'injects_print_script', False)
+        with timed_stage(timings, "store"):
+            job_id, job_path = store_job_file(
+                subject,
+                html_body,
+                "email",
+                printer=self.chrome_printer if prepared else None,
+                auto_close=auto_print
+            )
 
-        print_successful = False
+        job = PrintJob(
+            job_path,
+            self.chrome_printer,
+            {
+                "auto_print": auto_print,
+                "chrome_path": config['chrome_path'],
+                "wait_seconds": config['chrome_print_wait_seconds'],
+                "prepared": prepared,
+            },
+            lambda result, error: self.finish_print(uid_bytes, subject, job_id, auto_print, result, error, timings),
+            timings,
+            title=subject
+        )
 
-        if config['auto_print_enabled']:
-            try:
-                self.chrome_printer.print_html_file(
-                    temp_path, 
-                    auto_print=True,
-                    chrome_path=config['chrome_path'],
-                    wait_seconds=config['chrome_print_wait_seconds']
-                )
-                self.add_job(subject, "Auto-printed ✓", temp_path)
-                self.stats['jobs_processed'] += 1
-                self.stats['total_printed'] = self.stats.get('total_printed', 0) + 1
-                print_successful = True
-            except Exception as e:
-                error_msg = f"Print failed: {str(e)[:50]}"
-                self.add_error(error_msg)
-                print_successful = False
-        else:
-            try:
-                self.chrome_printer.print_html_file(
-                    temp_path, 
-                    auto_print=False,
-                    chrome_path=config['chrome_path'],
-                    wait_seconds=config['chrome_print_wait_seconds']
-                )
-                self.add_job(subject, "Print dialog opened 🖨️", temp_path)
-                self.stats['jobs_processed'] += 1
-                print_successful = True
-            except Exception as e:
-                error_msg = f"Failed to open dialog: {str(e)[:50]}"
-                self.add_error(error_msg)
-                print_successful = False
+        self.inflight_uids.add(uid_bytes)
+        queued = self.print_queue.submit(get_printer_key(config), job)
+        if not queued:
+            release_job_file(job_id)
+            self.inflight_uids.discard(uid_bytes)
 
-        if print_successful and config['delete_email_after_print']:
-            if self.delete_email(uid_bytes):
-                log_to_file(f"Email '{subject}' printed and deleted", "SUCCESS")
+    def finish_print(self, uid_bytes, subject, job_id, auto_print, result, error, timings=None):
+        """Record the outcome of one email's print (runs on a print worker)."""
+        release_job_file(job_id)
+        config = config_manager.get_config()
+        uid = uid_bytes.decode("ascii", errors="ignore")
+        if error is None:
+            # A timed-out print may or may not have come out; it is reported, not deleted
+            error = unconfirmed_print_error(result)
+        print_successful = error is None
+
+        if error is not None:
+            record_job("email", "failed", subject, error=error, artifact_id=job_id, timings=timings)
+            if auto_print:
+                self.add_error(f"Print failed: {str(error)[:50]}")
             else:
-                self.add_error(f"Print succeeded but failed to delete email")
-
-        self.mark_seen(uid_bytes)
+                self.add_error(f"Failed to open dialog: {str(error)[:50]}")
+        elif auto_print:
+            record_job("email", "printed", subject, action="Auto-printed ✓",
+                       print_seconds=print_duration(result), artifact_id=job_id, timings=timings)
+            self.add_job(subject, "Auto-printed ✓", job_id, print_seconds=print_duration(result))
+            self.stats['jobs_processed'] += 1
+            self.stats['total_printed'] = self.stats.get('total_printed', 0) + 1
+        else:
+            record_job("email", "dialog", subject, action="Print dialog opened 🖨️", artifact_id=job_id,
+                       timings=timings)
+            self.add_job(subject, "Print dialog opened 🖨️", job_id)
+            self.stats['jobs_processed'] += 1
+
+        # Flags are sent in bulk by flush_flag_updates on the daemon thread
+        with self.flag_lock:
+            if print_successful and config['delete_email_after_print']:
+                self.pending_deletes.append(uid_bytes)
+            self.pending_seen.append(uid_bytes)
         self._save_printed_uid(uid)
+        self.inflight_uids.discard(uid_bytes)
 
     def mark_seen(self, uid_bytes):
         try:
@@ -652,91 +2504,176 @@ class ImapPrintDaemon:
         log_to_file(f"Operation Mode: {config.get('operation_mode', 'email_only')}")
         
         self.update_status("Starting...")
-        
-        while self.running:
-            try:
-                config = config_manager.get_config()
-                operation_mode = config.get('operation_mode', 'email_only')
-                
-                # Skip email checking if in webhook-only mode
-                if operation_mode == 'webhook_only':
-                    self.update_status("Waiting for webhooks...")
-                    # Just sleep and check if mode changed
-                    for _ in range(10):  # Check every 10 seconds if mode changed
-                        if not self.running:
-                            break
-                        time.sleep(1)
-                    continue
-                
-                # Cleanup check
-                if self.temp_manager.should_cleanup(config['temp_file_cleanup_hours'], config.get('temp_file_cleanup_enabled', True)):
-                    self.update_status("Cleaning up old temp files...")
-                    self.temp_manager.cleanup_old_files(config['temp_file_cleanup_hours'])
-                    self.stats['last_cleanup'] = datetime.now().strftime("%H:%M:%S")
-                    next_cleanup = datetime.now() + timedelta(hours=config['temp_file_cleanup_hours'])
-                    self.stats['next_cleanup'] = next_cleanup.strftime("%H:%M:%S")
-                
-                # Reconnect
-                self.disconnect()
-                if not self.connect():
-                    time.sleep(10)
-                    continue
 
-                # Search for emails - set scanning status
-                self.update_status("Scanning inbox...")
-                uids = self.search_candidate_uids()
-                self.stats['messages_found'] = len(uids)
-                
-                new_uids = [uid for uid in uids if uid.decode("ascii", errors="ignore") not in self.printed_uids]
-                self.stats['jobs_pending'] = len(new_uids)
-                
-                if new_uids:
-                    log_to_file(f"Found {len(new_uids)} new message(s) to process")
-                
-                self.update_status("Processing messages...")
-
-                for uid_bytes in new_uids:
-                    if not self.running:
-                        break
-                    try:
-                        self.process_message(uid_bytes)
-                    except Exception as e:
-                        self.add_error(f"Error processing UID")
+        if config.get('print_engine', 'subprocess') == 'subprocess':
+            threading.Thread(target=self._warm_chrome_profiles, args=(config,), daemon=True).start()
 
-                self.stats['jobs_pending'] = 0
-                self.stats['last_check'] = datetime.now().strftime("%H:%M:%S")
-                next_time = datetime.now() + timedelta(seconds=config['poll_interval_seconds'])
-                self.stats['next_check'] = next_time.strftime("%H:%M:%S")
-                
-                self.update_status("Idle - Waiting for next check")
+        self.scheduler.schedule("check", 0, self.check_mailbox)
+        self.schedule_cleanup()
 
-            except imaplib.IMAP4.error as e:
-                self.add_error(f"IMAP error")
-                self.update_status("IMAP error - Reconnecting...")
-                self.disconnect()
-                time.sleep(10)
-                continue
-            except Exception as e:
-                self.add_error(f"Unexpected error")
-                self.update_status("Error - Retrying...")
-                time.sleep(10)
-                continue
+        while self.running:
+            self.scheduler.run_pending()
+            if self.running:
+                self.wait_for_next_task()
 
-            # Wait for next poll interval
-            for _ in range(config['poll_interval_seconds']):
-                if not self.running:
-                    break
-                time.sleep(1)
-        
+        # Jobs already printing still record their UID and flags; queued ones were dropped
+        if not self.print_queue.join(timeout=60):
+            log_to_file("Print jobs still running at shutdown", "WARNING")
+        self.flush_flag_updates(config_manager.get_config())
+
+        # The IMAP session and stores are only touched by this thread, so they are closed here
+        self.disconnect()
+        self.uid_store.close()
+        self.scheduler.close()
         log_to_file("Service stopped")
         self.update_status("Stopped")
 
+    def schedule_cleanup(self):
+        """Schedule the next cleanup temp_file_cleanup_hours after the last one."""
+        hours = config_manager.get_config()['temp_file_cleanup_hours']
+        due = self.last_cleanup + timedelta(hours=hours)
+        self.stats['next_cleanup'] = due.strftime("%H:%M:%S")
+        self.scheduler.schedule("cleanup", (due - datetime.now()).total_seconds(), self.run_cleanup)
+
+    def run_cleanup(self):
+        """Scheduled task: expire old job files, printed UIDs and job history."""
+        config = config_manager.get_config()
+        try:
+            if config.get('temp_file_cleanup_enabled', True):
+                status = self.status
+                self.update_status("Cleaning up old job files...")
+                removed = get_job_store().expire(config['temp_file_cleanup_hours'])
+                if removed:
+                    log_to_file(f"Cleaned up {removed} old job file(s)")
+                self.stats['last_cleanup'] = datetime.now().strftime("%H:%M:%S")
+                removed = self.uid_store.compact(config.get('dedup_retention_days', 365))
+                if removed:
+                    log_to_file(f"Compacted dedup store: {removed} expired record(s) removed")
+                removed = get_job_history().purge(config.get('job_history_retention_days', 365))
+                if removed:
+                    log_to_file(f"Removed {removed} expired job history entr{'y' if removed == 1 else 'ies'}")
+                # Back to what the daemon was doing (e.g. listening for new mail)
+                self.update_status(status)
+        except Exception as e:
+            self.add_error(f"Cleanup failed: {str(e)[:50]}")
+        self.last_cleanup = datetime.now()
+        self.schedule_cleanup()
+
+    def _schedule_check(self, delay):
+        if self.check_requested:
+            # A manual check arrived while this one was running
+            delay = 0
+        self.scheduler.schedule("check", delay, self.check_mailbox)
+
+    def check_mailbox(self):
+        """Scheduled task: check the inbox for print jobs, then schedule the next check."""
+        config = config_manager.get_config()
+        self.check_requested = False
+        self.listening = False
+
+        # Nothing to check in webhook-only mode; saving another mode runs a check
+        if config.get('operation_mode', 'email_only') == 'webhook_only':
+            self.update_status("Waiting for webhooks...")
+            self.stats['next_check'] = "Webhook mode"
+            return
+
+        try:
+            if self.reconnect_pending:
+                self._reload_mailbox(config)
+                if not self.running:
+                    return
+
+            # Reuse the open session, or reconnect when it has dropped
+            if not self.ensure_connected(config.get('imap_persistent_session', True)):
+                self._schedule_check(10)
+                return
+
+            # Search for emails - set scanning status
+            self.update_status("Scanning inbox...")
+            uids = self.search_candidate_uids()
+            self.stats['messages_found'] = len(uids)
+            
+            new_uids = [
+                uid for uid in self.uid_store.filter_new(*self._uid_scope(config), uids)
+                if uid not in self.inflight_uids
+            ]
+            if len(new_uids) < len(uids):
+                dedup_hits.inc(len(uids) - len(new_uids), source="email")
+            
+            if new_uids:
+                log_to_file(f"Found {len(new_uids)} new message(s) to process")
+            
+            self.update_status("Processing messages...")
+            self.process_new_messages(config, new_uids)
+
+            # Commit printed UIDs before the watermark moves past them
+            self.uid_store.flush()
+            self._advance_watermark(config, uids)
+            self.stats['last_check'] = datetime.now().strftime("%H:%M:%S")
+
+        except imaplib.IMAP4.error as e:
+            if not self.running:
+                return
+            self.add_error(f"IMAP error")
+            self.update_status("IMAP error - Reconnecting...")
+            self.disconnect()
+            self._schedule_check(10)
+            return
+        except Exception as e:
+            if not self.running:
+                return
+            self.add_error(f"Unexpected error")
+            self.update_status("Error - Retrying...")
+            self.disconnect()
+            self._schedule_check(10)
+            return
+
+        self._adapt_poll_interval(config, bool(new_uids))
+        self._schedule_next_check(config)
+
+    def _adapt_poll_interval(self, config, found_mail):
+        """Check more often while mail is arriving; double the wait back up to poll_interval_seconds when quiet."""
+        longest = config['poll_interval_seconds']
+        shortest = min(longest, config.get('poll_interval_min_seconds', 5))
+        if found_mail:
+            self.poll_interval = shortest
+        else:
+            self.poll_interval = min(longest, max(shortest, self.poll_interval * 2))
+
+    def _schedule_next_check(self, config):
+        """Wait for queued prints, for new mail via IDLE, or for the poll interval."""
+        if self.print_queue.depth:
+            # Queued jobs' flags go out on the check that follows them (see _on_queue_change)
+            self.update_status("Waiting for print jobs to finish...")
+            self.check_after_prints = True
+            self._schedule_check(config['poll_interval_seconds'])
+            return
+
+        persistent = config.get('imap_persistent_session', True)
+        if persistent and self.conn is not None and self.idle_supported and config.get('imap_idle_enabled', True):
+            self.listening = True
+            self.stats['next_check'] = "On new mail"
+            self.update_status("Idle - Listening for new mail")
+            self._schedule_check(config.get('imap_idle_timeout_seconds', 600))
+            return
+
+        next_time = datetime.now() + timedelta(seconds=self.poll_interval)
+        self.stats['next_check'] = next_time.strftime("%H:%M:%S")
+        self.update_status("Idle - Waiting for next check")
+        self._schedule_check(self.poll_interval)
+
     def stop(self):
-        """Stop the daemon."""
+        """
+        Stop the daemon.
+
+        The daemon thread is woken (from IDLE too) and ends IDLE, logs out
+        and closes the stores itself; imaplib connections must not be used
+        from two threads.
+        """
         self.running = False
-        self.disconnect()
-        self.temp_manager.cleanup_all_files()
-        log_to_file("Service stopped cleanly")
+        self.emit_status_update()
+        self.print_queue.stop()
+        self.scheduler.wake()
 
 # ==========================
 # Flask Routes
@@ -822,16 +2759,14 @@ def update_config():
             current_config = config_manager.get_config()
             new_config['webhook_secret'] = current_config.get('webhook_secret', '')
         
+        previous = config_manager.get_config()
         config_manager.save_config(new_config)
         
-        # Restart daemon if running
-        global daemon
-        if daemon and daemon.running:
-            daemon.stop()
-            time.sleep(1)
-            start_daemon()
+        # Changes apply in place; only components whose build-time settings
+        # changed are drained and rebuilt (see RESTART_SETTINGS)
+        restarted = restarted_components(config_manager.get_config().changed_keys(previous))
         
-        return jsonify({"success": True, "message": "Configuration saved successfully"})
+        return jsonify({"success": True, "message": "Configuration saved successfully", "restarted": restarted})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
@@ -849,69 +2784,72 @@ def reset_config():
 @app.route("/api/logs/download", methods=["GET"])
 @login_required
 def download_logs():
-    """Download system logs."""
+    """Download system logs, streamed across the rotated log files."""
     try:
-        import io
         from datetime import datetime
         
-        log_content = io.StringIO()
-        log_content.write(f"FlowPrint System Logs\n")
-        log_content.write(f"Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n")
-        log_content.write("=" * 80 + "\n\n")
+        header = []
+        header.append(f"FlowPrint System Logs\n")
+        header.append(f"Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n")
+        header.append("=" * 80 + "\n\n")
         
         # Get current config (sanitized)
         config = config_manager.get_config()
-        log_content.write("CONFIGURATION:\n")
-        log_content.write("-" * 80 + "\n")
+        header.append("CONFIGURATION:\n")
+        header.append("-" * 80 + "\n")
         for key, value in config.items():
             if "password" in key.lower() or "secret" in key.lower():
-                log_content.write(f"{key}: ***\n")
+                header.append(f"{key}: ***\n")
             else:
-                log_content.write(f"{key}: {value}\n")
-        log_content.write("\n")
+                header.append(f"{key}: {value}\n")
+        header.append("\n")
         
         # Get activity log if available
         if daemon and hasattr(daemon, "recent_jobs"):
-            log_content.write("RECENT JOBS:\n")
-            log_content.write("-" * 80 + "\n")
+            header.append("RECENT JOBS:\n")
+            header.append("-" * 80 + "\n")
             for job in daemon.recent_jobs:
                 timestamp = job.get('timestamp', 'Unknown')
                 subject = job.get('subject', 'Unknown')
                 status = job.get('status', 'Unknown')
-                log_content.write(f"{timestamp} - {subject} - {status}\n")
-            log_content.write("\n")
-        
-        # Read log file if exists
-        log_file = config.get("log_file", "flowprint.log")
-        if os.path.exists(log_file):
-            log_content.write("SYSTEM LOG FILE:\n")
-            log_content.write("-" * 80 + "\n")
-            with open(log_file, "r", encoding="utf-8", errors="ignore") as f:
-                log_content.write(f.read())
-        
-        output = log_content.getvalue()
-        log_content.close()
-        
-        return output, 200, {
+                header.append(f"{timestamp} - {subject} - {status}\n")
+            header.append("\n")
+        
+        # Open every generation now so a rotation mid-download can't skip or repeat one
+        writer = get_log_writer()
+        writer.flush()
+        files = open_log_files(writer.rotated_files() + [writer.path])
+        if files:
+            header.append("SYSTEM LOG FILE:\n")
+            header.append("-" * 80 + "\n")
+        
+        def generate():
+            yield "".join(header).encode("utf-8")
+            yield from iter_log_chunks(files)
+        
+        return Response(stream_with_context(generate()), 200, {
             "Content-Type": "text/plain; charset=utf-8",
             "Content-Disposition": f"attachment; filename=flowprint_logs_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt"
-        }
+        })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """Get current daemon status."""
-    if daemon:
-        return jsonify({
-            "running": daemon.running,
-            "status": daemon.status,
-            "stats": daemon.stats
-        })
-    return jsonify({
-        "running": False,
-        "status": "Stopped",
-        "stats": {}
-    })
+    """
+    Get current daemon status.
+
+    The ETag is the status version: a poll with If-None-Match gets 304 when
+    nothing has changed since.
+    """
+    epoch, version, status = status_bus.snapshot()
+    etag = status_bus.etag(epoch, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({**status, "epoch": epoch, "version": version})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/start', methods=['POST'])
 def start_service():
@@ -955,35 +2893,86 @@ def test_connection():
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    """Get recent log entries."""
+    """
+    Get log entries, newest last.
+
+    Query parameters:
+        limit: Most lines returned (default 100, at most 1000)
+        before: Byte offset - page back through lines ending before it
+        after: Byte offset - lines written since (the "end" of a previous response)
+    """
     try:
-        config = config_manager.get_config()
-        log_file = config.get('log_file', 'flowprint.log')
+        log_file = get_log_writer().path
         
         if not os.path.exists(log_file):
-            return jsonify({"logs": []})
+            return jsonify({"logs": [], "start": 0, "end": 0, "size": 0})
         
-        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            # Return last 100 lines
-            recent_lines = lines[-100:] if len(lines) > 100 else lines
-            return jsonify({"logs": [line.strip() for line in recent_lines]})
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        before = request.args.get('before', type=int)
+        after = request.args.get('after', type=int)
+        if after is not None:
+            page = read_log_from(log_file, after, limit)
+        else:
+            page = read_log_tail(log_file, limit, before)
+        page["logs"] = [line.strip() for line in page.pop("lines")]
+        page["has_older"] = page["start"] > 0
+        return jsonify(page)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """
+    Search the job history, newest first.
+
+    Query parameters:
+        limit: Jobs per page (default 50, at most 500)
+        cursor: "next_cursor" from the previous page
+        source: email or webhook
+        status: printed, dialog or failed
+        order: Exact order name, e.g. #1234
+        q: Words matched against subject and order name
+        since / until: Unix timestamps bounding when the job was recorded
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        page = get_job_history().query(
+            limit=limit,
+            cursor=request.args.get('cursor', type=int),
+            source=request.args.get('source'),
+            status=request.args.get('status'),
+            order_name=request.args.get('order'),
+            search=request.args.get('q'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float)
+        )
+        return jsonify(page)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/api/latency', methods=['GET'])
+def get_latency():
+    """Rolling p50/p95/p99 seconds per pipeline stage, by source (email, webhook)."""
+    return jsonify(get_latency_stats().summary())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Counters, gauges and stage histograms in the Prometheus text format."""
+    return Response(metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
 @app.route('/api/reprint', methods=['POST'])
 def reprint_job():
     """Reprint a previous job."""
     try:
         data = request.json
-        temp_file = data.get('temp_file')
-        job_source = data.get('source', 'email')  # Get the source of the job (email or webhook)
+        job = get_job_store().get(data.get('job_id', ''), pin=True)
         
-        if not temp_file or not os.path.exists(temp_file):
+        if job is None:
             return jsonify({"success": False, "error": "Print file not found or has been cleaned up"}), 404
         
+        job_source = job['source'] or 'email'
         config = config_manager.get_config()
-        printer = ChromePrinter()
+        printer = get_chrome_printer()
         
         # Determine which auto-print setting to use based on job source
         if job_source == 'webhook':
@@ -993,14 +2982,23 @@ def reprint_job():
             auto_print = config['auto_print_enabled']
             wait_seconds = config['chrome_print_wait_seconds']
         
-        printer.print_html_file(
-            temp_file,
-            auto_print=auto_print,
-            chrome_path=config['chrome_path'],
-            wait_seconds=wait_seconds
-        )
-        
-        log_to_file(f"Reprinted {job_source} job from {temp_file}", "SUCCESS")
+        try:
+            result = printer.print_html_file(
+                job['path'],
+                auto_print=auto_print,
+                chrome_path=config['chrome_path'],
+                wait_seconds=wait_seconds,
+                title=job['subject']
+            )
+        finally:
+            release_job_file(job['id'])
+        error = unconfirmed_print_error(result)
+        if error is not None:
+            raise error
+        
+        record_job(job_source, "printed" if auto_print else "dialog", job['subject'], action="Reprinted",
+                   print_seconds=print_duration(result), artifact_id=job['id'])
+        log_to_file(f"Reprinted {job_source} job {job['id']} ({job['subject']})", "SUCCESS")
         return jsonify({"success": True, "message": "Job reprinted successfully"})
     except Exception as e:
         log_to_file(f"Reprint failed: {str(e)}", "ERROR")
@@ -1014,9 +3012,7 @@ def manual_check():
         if not daemon or not daemon.running:
             return jsonify({"success": False, "error": "Service is not running"}), 400
         
-        # Trigger an immediate check by setting next check to now
-        daemon.stats['last_check'] = datetime.now().strftime("%H:%M:%S")
-        daemon.stats['next_check'] = datetime.now().strftime("%H:%M:%S")
+        daemon.check_now()
         
         log_to_file("Manual inbox check triggered", "INFO")
         return jsonify({"success": True, "message": "Inbox check triggered"})
@@ -1027,9 +3023,11 @@ def manual_check():
 def clear_cache():
     """Manually clear temp file cache."""
     try:
-        global daemon
+        get_job_store().clear()
+        if pdf_cache:
+            pdf_cache.clear()
+
         if daemon:
-            daemon.temp_manager.cleanup_all_files()
             daemon.stats['last_cleanup'] = datetime.now().strftime("%H:%M:%S")
             
             # Update all jobs to mark them as non-reprintable
@@ -1037,12 +3035,6 @@ def clear_cache():
                 job['can_reprint'] = False
             
             daemon.emit_status_update()
-        else:
-            # If daemon doesn't exist, clean up manually
-            temp_dir = os.path.join(tempfile.gettempdir(), "flowprint_jobs")
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                os.makedirs(temp_dir, exist_ok=True)
         
         log_to_file("Temp file cache cleared manually", "SUCCESS")
         return jsonify({"success": True, "message": "Cache cleared successfully"})
@@ -1057,7 +3049,7 @@ def clear_cache():
 @app.route('/api/webhook/shopify', methods=['POST'])
 def shopify_webhook():
     """
-    Receive and process Shopify order webhooks.
+    Receive Shopify order webhooks and queue them for printing.
     
     Shopify Setup:
     1. Go to Settings > Notifications > Webhooks
@@ -1081,75 +3073,61 @@ def shopify_webhook():
             return jsonify({"error": "Webhook secret not configured"}), 500
         
         # Verify webhook signature
+        timings = {}
         hmac_header = request.headers.get('X-Shopify-Hmac-Sha256')
         request_body = request.get_data()
         
-        if not webhook_handler.verify_webhook(request_body, hmac_header, webhook_secret):
+        with timed_stage(timings, "verify"):
+            verified = webhook_handler.verify_webhook(request_body, hmac_header, webhook_secret)
+        webhook_verifications.inc(result="valid" if verified else "invalid")
+        if not verified:
             log_to_file("Invalid webhook signature", "ERROR")
             return jsonify({"error": "Invalid signature"}), 401
         
-        # Parse order data
-        order_data = request.get_json()
-        order_number = order_data.get('name', 'Unknown')
-        
-        log_to_file(f"Webhook received for order {order_number}", "INFO")
-        
-        # Emit webhook processing status
-        socketio.emit("webhook_processing", {"order": order_number, "status": "processing"})
-        
-        # Get template to use
-        template_name = config.get('webhook_template', 'default_packing_slip.html')
-        
-        # Render template with order data
+        # Parse order data (only the order name is needed before queueing)
         try:
-            html_content = webhook_handler.render_template(template_name, order_data)
-        except Exception as e:
-            log_to_file(f"Template rendering failed for order {order_number}: {str(e)}", "ERROR")
-            return jsonify({"error": f"Template error: {str(e)}"}), 500
-        
-        # Create temp file
-        temp_dir = os.path.join(tempfile.gettempdir(), "flowprint_jobs")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_file = os.path.join(
-            temp_dir,
-            f"webhook_{order_number.replace('#', '')}_{uuid.uuid4().hex[:8]}.html"
-        )
-        
-        # Write HTML to temp file
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # Print the file
-        printer = ChromePrinter()
-        printer.print_html_file(
-            temp_file,
-            auto_print=config.get("webhook_auto_print", True),
-            chrome_path=config['chrome_path'],
-            wait_seconds=config.get("webhook_print_wait_seconds", 8)
-        )
-        
-        # Update stats
+            with timed_stage(timings, "parse"):
+                order_data = json.loads(request_body)
+        except ValueError:
+            job_failures.inc(source="webhook", stage="parse")
+            log_to_file("Webhook body is not valid JSON", "ERROR")
+            return jsonify({"error": "Invalid JSON"}), 400
+        order_number = str(order_data.get('name', 'Unknown'))
+
+        # Store the verified payload, then answer Shopify right away.
+        # Retries of a delivery (same webhook id) or a second webhook for the
+        # same order are dropped here, before anything is rendered.
+        keys = []
+        if request.headers.get('X-Shopify-Webhook-Id'):
+            keys.append(f"webhook:{request.headers['X-Shopify-Webhook-Id']}")
+        if order_data.get('id') is not None:
+            keys.append(f"order:{order_data['id']}")
+
+        job_queue = get_webhook_worker().job_queue
+        job_id, duplicate = job_queue.enqueue(request_body, order_number, keys, timings)
+
         if daemon:
-            daemon.stats['total_printed'] = daemon.stats.get('total_printed', 0) + 1
-            
-            # Add to recent jobs
-            daemon.add_job(
-                f"Webhook: Order {order_number}",
-                "Auto-printed ✓",
-                temp_file,
-                "webhook"
-            )
-        
-        log_to_file(f"Successfully printed order {order_number} via webhook", "SUCCESS")
-        
-        
-        # Emit webhook completion
-        socketio.emit("webhook_processing", {"order": order_number, "status": "complete"})
+            daemon.stats['webhook_duplicates_dropped'] = job_queue.duplicate_hits
+            daemon.stats['webhook_unique_received'] = job_queue.duplicate_misses
+
+        if duplicate:
+            dedup_hits.inc(source="webhook")
+            log_to_file(f"Duplicate webhook for order {order_number} ignored (job {job_id})", "INFO")
+            return jsonify({
+                "success": True,
+                "order": order_number,
+                "job_id": job_id,
+                "status": "duplicate"
+            }), 200
+
+        log_to_file(f"Webhook received for order {order_number} (job {job_id})", "INFO")
+        socketio.emit("webhook_processing", {"order": order_number, "status": "queued", "job_id": job_id})
+
         return jsonify({
             "success": True,
             "order": order_number,
-            "message": "Order printed successfully"
+            "job_id": job_id,
+            "status": "queued"
         }), 200
         
     except Exception as e:
@@ -1157,6 +3135,14 @@ def shopify_webhook():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/webhook/jobs/<job_id>', methods=['GET'])
+def get_webhook_job(job_id):
+    """Get the status of a queued webhook (queued, processing, printed or failed)."""
+    job = get_webhook_worker().job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
 @app.route('/api/webhook/test', methods=['POST'])
 def test_webhook():
     """Test webhook with sample order data."""
@@ -1214,30 +3200,28 @@ def test_webhook():
         # Render template
         html_content = webhook_handler.render_template(template_name, sample_order)
         
-        # Create temp file
-        temp_dir = os.path.join(tempfile.gettempdir(), "flowprint_jobs")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_file = os.path.join(temp_dir, f"test_webhook_{uuid.uuid4().hex[:8]}.html")
-        
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        # Store the job file
+        job_id, job_file = store_job_file("Webhook: Test order", html_content, "webhook")
         
         # Print
-        printer = ChromePrinter()
-        printer.print_html_file(
-            temp_file,
-            auto_print=config.get("webhook_auto_print", True),
-            chrome_path=config['chrome_path'],
-            wait_seconds=config.get("webhook_print_wait_seconds", 8)
-        )
+        printer = get_chrome_printer()
+        try:
+            printer.print_html_file(
+                job_file,
+                auto_print=config.get("webhook_auto_print", True),
+                chrome_path=config['chrome_path'],
+                wait_seconds=config.get("webhook_print_wait_seconds", 8),
+                title="Webhook: Test order"
+            )
+        finally:
+            release_job_file(job_id)
         
         log_to_file("Test webhook printed successfully", "SUCCESS")
         
         return jsonify({
             "success": True,
             "message": "Test print completed",
-            "temp_file": temp_file
+            "job_id": job_id
         })
         
     except Exception as e:
@@ -1317,12 +3301,18 @@ def create_template():
 def handle_connect():
     """Handle client connection."""
     print('Client connected')
-    # Send current status
-    if daemon:
-        emit('status_update', {
-            'status': daemon.status,
-            'stats': daemon.stats
-        })
+
+@socketio.on('status_resume')
+def handle_status_resume(data):
+    """Bring a (re)connected client up to date from the status version it has."""
+    data = data or {}
+    status_bus.publish()
+    delta = status_bus.changes_since(data.get('epoch'), data.get('version'))
+    if delta is None:
+        epoch, version, status = status_bus.snapshot()
+        emit('status_full', {**status, "epoch": epoch, "version": version})
+    elif delta['changes'] or delta['removed']:
+        emit('status_delta', delta)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -1346,6 +3336,10 @@ def start_daemon():
     if daemon and daemon.running:
         return
     
+    if daemon_thread is not None and daemon_thread.is_alive():
+        # A stopped daemon logs out on its own thread; let it finish first
+        daemon_thread.join(5)
+    
     daemon = ImapPrintDaemon()
     daemon_thread = threading.Thread(target=daemon.run, daemon=True)
     daemon_thread.start()
@@ -1360,6 +3354,146 @@ def auto_start_daemon():
         except Exception as e:
             print(f"⚠ Could not auto-start service: {e}")
 
+# ==========================
+# Config Reload
+# ==========================
+
+# Settings only read when a component is built, by component. Saving one of
+# these drains and rebuilds that component alone; every other setting is
+# read where it is used (poll interval, print waits, templates, subject
+# prefix, theme...) or pushed into the running component below, so it
+# applies in place.
+RESTART_SETTINGS = {
+    "mailbox": {
+        "imap_host", "imap_port", "imap_use_ssl", "imap_username", "imap_password", "mailbox",
+        "dedup_store", "dedup_db_file", "dedup_sqlite_journal_mode", "dedup_commit_batch_size",
+        "printed_uids_file", "uid_state_file",
+    },
+    "print": {
+        "print_engine", "print_workers", "print_queue_max_depth",
+        "chrome_profile_pool_size", "chrome_profile_recycle_jobs",
+    },
+    "webhooks": {"webhook_queue_db", "webhook_workers"},
+    "storage": {"job_store_dir", "pdf_cache_dir", "job_history_db"},
+    "log": {"log_file"},
+}
+
+def restarted_components(changed):
+    """Names of the components a set of changed settings rebuilds."""
+    return [name for name, keys in RESTART_SETTINGS.items() if keys & changed]
+
+def _reload_mailbox(old, new, changed):
+    if daemon and daemon.running:
+        daemon.request_reconnect()
+
+def _reload_print(old, new, changed):
+    """Start new print queues (and engine); the old queues print what they hold, then stop."""
+    if chrome_profile_pool is not None:
+        # Resized in place: jobs on the old queues keep their leased profiles
+        chrome_profile_pool.resize(new.get('chrome_profile_pool_size', 2), new.get('chrome_profile_recycle_jobs', 50))
+    retired = []
+    if daemon and daemon.running:
+        retired.append(daemon.replace_print_queue())
+        if new.get('print_engine', 'subprocess') == 'subprocess':
+            threading.Thread(target=daemon._warm_chrome_profiles, args=(new,), daemon=True).start()
+    if webhook_worker:
+        retired.append(webhook_worker.replace_print_queue())
+    old_engine = chrome_engine if old.get('print_engine') == 'devtools' else None
+
+    def retire():
+        global chrome_engine
+        for print_queue in retired:
+            print_queue.drain()
+        if old_engine is not None and config_manager.get_config().get('print_engine') != 'devtools':
+            old_engine.close()
+            if chrome_engine is old_engine:
+                chrome_engine = None
+
+    threading.Thread(target=retire, daemon=True).start()
+    log_to_file("Print settings changed - print queues restarted")
+
+def _reload_webhooks(old, new, changed):
+    """Start a new webhook worker pool once the old one has finished its claimed jobs."""
+    global webhook_worker
+    if webhook_worker is None:
+        return
+    retired = webhook_worker
+
+    def restart():
+        global webhook_worker
+        retired.drain()
+        if webhook_worker is retired:
+            webhook_worker = None
+            get_webhook_worker()
+        log_to_file("Webhook settings changed - webhook workers restarted")
+
+    threading.Thread(target=restart, daemon=True).start()
+
+def _reload_storage(old, new, changed):
+    """Reopen the job store, PDF cache and job history at their new locations on next use."""
+    global job_store, pdf_cache, job_history
+    if "job_store_dir" in changed:
+        job_store = None
+    if "pdf_cache_dir" in changed:
+        pdf_cache = None
+    if "job_history_db" in changed:
+        job_history = None
+
+def _reload_log(old, new, changed):
+    """Switch to the new log file; the old writer finishes its queue first."""
+    global log_writer
+    with log_writer_lock:
+        retired, log_writer = log_writer, None
+    if retired is not None:
+        retired.close()
+
+def _apply_hot_settings(old, new, changed):
+    """Push limits that running components keep as attributes."""
+    for print_queue in [daemon.print_queue if daemon else None, webhook_worker.print_queue if webhook_worker else None]:
+        if print_queue is not None:
+            print_queue.coalesce_seconds = new.get('print_coalesce_seconds', 0) or 0
+            print_queue.coalesce_max_jobs = max(1, int(new.get('print_coalesce_max_jobs', 10)))
+    if job_store is not None:
+        job_store.max_bytes = new.get('job_store_max_mb', 500) * 1024 * 1024
+        job_store.max_jobs = new.get('job_store_max_jobs', 1000)
+    if pdf_cache is not None:
+        pdf_cache.max_bytes = new.get('pdf_cache_max_mb', 200) * 1024 * 1024
+    if log_writer is not None:
+        log_writer.max_bytes = int(new.get('log_max_mb', 10) * 1024 * 1024)
+        log_writer.rotate_seconds = new.get('log_rotate_hours', 24) * 3600
+        log_writer.backups = max(0, int(new.get('log_backup_count', 5)))
+        log_writer.compress = new.get('log_compress_backups', True)
+    if latency_stats is not None:
+        latency_stats.resize(new.get('latency_window_jobs', 1000))
+    if webhook_worker is not None:
+        webhook_worker.retention_hours = new.get('webhook_job_retention_hours', 168)
+        webhook_worker.job_queue.key_ttl = new.get('webhook_idempotency_ttl_hours', 72) * 3600
+
+def _reschedule_daemon(old, new, changed):
+    """Re-plan the daemon's checks and cleanup with the new timing settings."""
+    if not daemon or not daemon.running:
+        return
+    if 'temp_file_cleanup_hours' in changed:
+        daemon.schedule_cleanup()
+    if changed - {'temp_file_cleanup_hours'}:
+        daemon.poll_interval = new['poll_interval_seconds']
+        daemon.check_now()
+
+config_manager.subscribe(_reload_mailbox, RESTART_SETTINGS["mailbox"])
+config_manager.subscribe(_reload_print, RESTART_SETTINGS["print"])
+config_manager.subscribe(_reload_webhooks, RESTART_SETTINGS["webhooks"])
+config_manager.subscribe(_reload_storage, RESTART_SETTINGS["storage"])
+config_manager.subscribe(_reload_log, RESTART_SETTINGS["log"])
+config_manager.subscribe(_apply_hot_settings, [
+    "print_coalesce_seconds", "print_coalesce_max_jobs", "job_store_max_mb", "job_store_max_jobs",
+    "pdf_cache_max_mb", "log_max_mb", "log_rotate_hours", "log_backup_count", "log_compress_backups",
+    "latency_window_jobs", "webhook_job_retention_hours", "webhook_idempotency_ttl_hours",
+])
+config_manager.subscribe(_reschedule_daemon, [
+    "operation_mode", "poll_interval_seconds", "poll_interval_min_seconds", "imap_idle_enabled",
+    "imap_persistent_session", "imap_idle_timeout_seconds", "temp_file_cleanup_hours",
+])
+
 # ==========================
 # Main Entry Point
 # ==========================
@@ -1396,6 +3530,10 @@ def main():
     
     # Auto-start daemon if configured
     auto_start_daemon()
+
+    # Resume any webhooks still queued from the last run
+    if config_manager.get_config().get('webhook_enabled', False):
+        get_webhook_worker()
     
     # Open browser
     browser_thread = threading.Thread(target=open_browser, daemon=True)
@@ -1409,6 +3547,12 @@ def main():
         print("🛑 Shutting down...")
         if daemon:
             daemon.stop()
+        if webhook_worker:
+            webhook_worker.stop()
+        if chrome_engine:
+            chrome_engine.close()
+        if log_writer:
+            log_writer.close()
         print("✓ FlowPrint stopped cleanly")
         print()
 
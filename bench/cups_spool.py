@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+cups_spool.py - CUPS Engine Benchmark for FlowPrint
+
+Prints a set of distinct packing slips through CupsPrinter, then prints
+the same slips again as reprints would, and reports the time per job
+for each round. The first round renders every slip with Chrome; the
+second should be served from the PDF cache without starting Chrome.
+
+Submissions go to the fake lp/lpr in fakecups.py, which records each
+one. The script checks that every job reached the printer with its own
+title and that the reprints were cache hits. Chrome is a stand-in that
+takes --render-ms per PDF unless --chrome points at a real one.
+
+    python bench/cups_spool.py [--jobs 20] [--render-ms 300] [--lpr] [--chrome PATH]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import fakecups
+import FlowPrint
+
+SLIP = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Order #{order}</title></head>
+<body><h1>Packing slip - Order #{order}</h1>
+<table>{rows}</table></body></html>"""
+
+def print_round(printer, jobs, chrome_path):
+    samples = []
+    results = []
+    for path, title in jobs:
+        started = time.perf_counter()
+        results.append(printer.print_html_file(path, chrome_path=chrome_path, title=title))
+        samples.append(time.perf_counter() - started)
+    return samples, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--render-ms", type=float, default=300, help="Stand-in Chrome render time per PDF")
+    parser.add_argument("--lpr", action="store_true", help="Submit with lpr instead of lp")
+    parser.add_argument("--chrome", default="", help="Render with this Chrome/Chromium instead of the stand-in")
+    args = parser.parse_args()
+
+    log_path = os.path.abspath("lp_submissions.jsonl")
+    commands = fakecups.install("bin", log_path, render_seconds=args.render_ms / 1000)
+    chrome_path = args.chrome or commands["chrome"]
+    FlowPrint.config_manager.save_config({
+        "print_engine": "cups", "cups_command": commands["lpr" if args.lpr else "lp"],
+        "cups_printer": "Warehouse", "cups_options": ["media=A4"], "pdf_cache_enabled": True,
+    })
+    printer = FlowPrint.CupsPrinter()
+
+    jobs = []
+    for i in range(args.jobs):
+        rows = "".join(f"<tr><td>Item {n}</td><td>SKU-{i:03d}{n:03d}</td><td>{n % 4 + 1}</td></tr>" for n in range(30))
+        path = os.path.abspath(f"job_{i}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(SLIP.format(order=1000 + i, rows=rows))
+        jobs.append((path, f"[PRINT PACK] Order #{1000 + i}"))
+
+    first, first_results = print_round(printer, jobs, chrome_path)
+    again, again_results = print_round(printer, jobs, chrome_path)
+
+    submissions = fakecups.read_log(log_path)
+    expected = [title for _, title in jobs] * 2
+    checks = {
+        "submissions": len(submissions) == len(expected),
+        "titles": [entry["title"] for entry in submissions] == expected,
+        "printer": all(entry["printer"] == "Warehouse" for entry in submissions),
+        "options": all(entry["options"] == ["media=A4"] for entry in submissions),
+        "pdf": all(entry["pdf"] for entry in submissions),
+        "rendered first": not any(result["cached"] for result in first_results),
+        "cached again": all(result["cached"] for result in again_results),
+    }
+
+    print(f"{args.jobs} jobs through {'lpr' if args.lpr else 'lp'}, "
+          f"{'Chrome ' + args.chrome if args.chrome else f'stand-in Chrome at {args.render_ms:g} ms per PDF'}")
+    print(f"  first print: median {statistics.median(first) * 1000:7.1f} ms per job")
+    print(f"      reprint: median {statistics.median(again) * 1000:7.1f} ms per job (PDF cache)")
+    print(f"  pdf cache: {FlowPrint.get_pdf_cache().stats()}")
+    print("  checks: " + ", ".join(f"{name} {'ok' if passed else 'FAILED'}" for name, passed in checks.items()))
+    sys.exit(0 if all(checks.values()) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+dedup_1m.py - Printed-UID Store Benchmark for FlowPrint
+
+Fills the SQLite store and a legacy printed_uids.txt with the same number
+of recorded UIDs (1M by default), then times opening each store, single
+lookups, the per-search filter_new() over a batch of candidates, and
+recording new UIDs.
+
+    python bench/dedup_1m.py [--uids 1000000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_store import SqliteUidStore, TextUidStore
+
+ACCOUNT, MAILBOX, UIDVALIDITY = "orders@example.com@imap.example.com", "Inbox", 1
+
+def timed(fn, repeat):
+    """Median seconds of repeat calls to fn."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uids", type=int, default=1_000_000)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="flowprint_bench_")
+    db_path = os.path.join(workdir, "dedup.db")
+    text_path = os.path.join(workdir, "printed_uids.txt")
+
+    started = time.perf_counter()
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.writelines(f"{uid}\n" for uid in range(1, args.uids + 1))
+    # Fill the SQLite store the way an upgrade does, then put the text file back
+    store = SqliteUidStore(db_path)
+    store.migrate_text_file(text_path, ACCOUNT, MAILBOX, UIDVALIDITY)
+    store.close()
+    os.replace(text_path + ".migrated", text_path)
+    print(f"recorded UIDs: {args.uids:,} (setup {time.perf_counter() - started:.1f}s)")
+
+    stores = {
+        "sqlite": lambda: SqliteUidStore(db_path),
+        "text": lambda: TextUidStore(text_path),
+    }
+    for name, open_store in stores.items():
+        open_seconds = timed(lambda: open_store().close(), 3)
+        store = open_store()
+        probes = [random.randint(1, args.uids * 2) for _ in range(1000)]
+        lookup = timed(lambda: [store.contains(ACCOUNT, MAILBOX, UIDVALIDITY, uid) for uid in probes], 5) / len(probes)
+        # One search result: a few recent messages, mostly printed already
+        candidates = [str(uid).encode() for uid in range(args.uids - 45, args.uids + 5)]
+        filter_seconds = timed(lambda: store.filter_new(ACCOUNT, MAILBOX, UIDVALIDITY, candidates), 50)
+        next_uid = iter(range(args.uids + 10, args.uids * 3))
+        add = timed(lambda: [store.add(ACCOUNT, MAILBOX, UIDVALIDITY, next(next_uid)) for _ in range(100)], 5) / 100
+        store.close()
+        print(f"{name:>6}: open {open_seconds * 1000:9.2f} ms   contains {lookup * 1e6:7.2f} us   "
+              f"filter_new(50) {filter_seconds * 1000:6.3f} ms   add {add * 1e6:7.2f} us")
+
+if __name__ == "__main__":
+    main()
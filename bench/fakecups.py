@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+fakecups.py - Fake CUPS Spooler for FlowPrint Benchmarks
+
+Stand-ins for the commands the CUPS print engine runs, so CupsPrinter can
+be driven end to end without a print server:
+
+- lp / lpr record every submission (printer, title, options and the PDF
+  handed over) as one JSON line in a log and answer like CUPS does.
+- chrome writes a small PDF for --print-to-pdf, after an optional delay
+  that stands in for Chrome's start-up and render time.
+
+install() writes the three commands into a directory; point cups_command
+(and chrome_path, unless a real Chrome is wanted) at them.
+"""
+
+import json
+import os
+import sys
+import time
+
+PDF = (b"%PDF-1.4\n1 0 obj <</Type /Catalog /Pages 2 0 R>> endobj\n"
+       b"2 0 obj <</Type /Pages /Kids [] /Count 0>> endobj\n"
+       b"trailer <</Root 1 0 R>>\n%%EOF\n")
+
+def install(directory, log_path, render_seconds=0.0):
+    """
+    Write lp, lpr and chrome commands into directory.
+
+    Args:
+        log_path: JSON-lines file lp/lpr append their submissions to
+        render_seconds: How long the fake chrome takes per PDF
+
+    Returns:
+        dict: Command name -> absolute path
+    """
+    os.makedirs(directory, exist_ok=True)
+    commands = {}
+    for name in ("lp", "lpr", "chrome"):
+        path = os.path.abspath(os.path.join(directory, name))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"#!{sys.executable}\n"
+                    "import sys\n"
+                    f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+                    "import fakecups\n"
+                    f"sys.exit(fakecups.{'fake_chrome' if name == 'chrome' else 'fake_lp'}"
+                    f"(sys.argv, {os.path.abspath(log_path)!r}, {float(render_seconds)!r}))\n")
+        os.chmod(path, 0o755)
+        commands[name] = path
+    return commands
+
+def read_log(log_path):
+    """Submissions recorded so far, oldest first."""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def fake_lp(argv, log_path, render_seconds=0.0):
+    """lp (-d printer -t title) or lpr (-P printer -T title), both with -o options."""
+    command = os.path.basename(argv[0])
+    flags = {"-P": "printer", "-T": "title"} if command == "lpr" else {"-d": "printer", "-t": "title"}
+    entry = {"command": command, "printer": "", "title": "", "options": [], "file": None}
+    args = argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] in flags and i + 1 < len(args):
+            entry[flags[args[i]]] = args[i + 1]
+            i += 2
+        elif args[i] == "-o" and i + 1 < len(args):
+            entry["options"].append(args[i + 1])
+            i += 2
+        else:
+            entry["file"] = args[i]
+            i += 1
+
+    if not entry["file"] or not os.path.exists(entry["file"]):
+        print(f"{command}: Error - unable to access \"{entry['file']}\"", file=sys.stderr)
+        return 1
+    with open(entry["file"], "rb") as f:
+        entry["pdf"] = f.read(5) == b"%PDF-"
+    entry["bytes"] = os.path.getsize(entry["file"])
+
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"request id is {entry['printer'] or 'default'}-{len(read_log(log_path))} (1 file(s))")
+    return 0
+
+def fake_chrome(argv, log_path, render_seconds=0.0):
+    """Headless Chrome's --print-to-pdf=PATH, nothing else."""
+    for arg in argv[1:]:
+        if arg.startswith("--print-to-pdf="):
+            time.sleep(render_seconds)
+            with open(arg.split("=", 1)[1], "wb") as f:
+                f.write(PDF)
+            return 0
+    return 1
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+fakeimap.py - In-Process IMAP Server for FlowPrint Benchmarks
+
+Speaks just enough IMAP4rev1 (LOGIN, SELECT, STATUS, UID SEARCH/FETCH/STORE,
+NOOP, IDLE) for ImapPrintDaemon to run against it on 127.0.0.1, so the
+benchmarks can measure the daemon without a real mail server. Messages
+appended to a Mailbox are pushed to clients sitting in IDLE.
+"""
+
+import email
+import re
+import socket
+import threading
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+class Mailbox:
+    """Messages by UID, shared by every connection to a Server."""
+
+    def __init__(self):
+        self.msgs = {}  # uid -> raw message bytes
+        self.uidnext = 1
+        self.uidvalidity = 1
+        self.lock = threading.Lock()
+        self.listeners = []  # IDLE sessions, called with the new message count
+        self.commands = []
+
+    def append(self, raw):
+        """Add a message and notify IDLE sessions. Returns its UID."""
+        with self.lock:
+            uid = self.uidnext
+            self.uidnext += 1
+            self.msgs[uid] = raw
+            count = len(self.msgs)
+        for listener in list(self.listeners):
+            listener(count)
+        return uid
+
+
+def make_msg(subject, body="<html><body><p>Order</p></body></html>", attachment=None):
+    """A multipart/mixed order email: text and HTML alternatives, optional PDF attachment."""
+    msg = MIMEMultipart("mixed")
+    msg["Subject"] = subject
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText("plain version", "plain"))
+    alternative.attach(MIMEText(body, "html"))
+    msg.attach(alternative)
+    if attachment:
+        part = MIMEApplication(attachment, "pdf")
+        part.add_header("Content-Disposition", "attachment", filename="order.pdf")
+        msg.attach(part)
+    return msg.as_bytes()
+
+
+def _parse_set(spec, uids):
+    found = set()
+    highest = max(uids) if uids else 0
+    for part in spec.split(","):
+        if ":" in part:
+            low, high = (highest if end == "*" else int(end) for end in part.split(":"))
+            low, high = min(low, high), max(low, high)
+            found |= {uid for uid in uids if low <= uid <= high}
+        else:
+            uid = highest if part == "*" else int(part)
+            if uid in uids:
+                found.add(uid)
+    return sorted(found)
+
+
+def _bodystructure(msg):
+    def single(part):
+        maintype, subtype = part.get_content_maintype().upper(), part.get_content_subtype().upper()
+        charset = part.get_content_charset() or "utf-8"
+        payload = part.get_payload()
+        size = len(payload.encode()) if isinstance(payload, str) else 0
+        encoding = (part.get("Content-Transfer-Encoding") or "7BIT").upper()
+        disposition = part.get_content_disposition()
+        disposition = f'("{disposition.upper()}" NIL)' if disposition else "NIL"
+        text = f'("{maintype}" "{subtype}" ("CHARSET" "{charset}") NIL NIL "{encoding}" {size}'
+        if maintype == "TEXT":
+            text += f" {payload.count(chr(10)) if isinstance(payload, str) else 0}"
+        return text + f" NIL {disposition} NIL NIL)"
+
+    def walk(part):
+        if part.is_multipart():
+            inner = "".join(walk(child) for child in part.get_payload())
+            return f'({inner} "{part.get_content_subtype().upper()}" NIL NIL NIL NIL)'
+        return single(part)
+
+    return walk(msg)
+
+
+def _section(msg, spec):
+    part = msg
+    for number in spec.split("."):
+        number = int(number)
+        if part.is_multipart():
+            part = part.get_payload()[number - 1]
+        elif number != 1:
+            return b""
+    payload = part.get_payload()
+    return payload.encode() if isinstance(payload, str) else b""
+
+
+class Server:
+    """
+    IMAP server on an ephemeral 127.0.0.1 port, one thread per connection.
+
+    Args:
+        latency: Seconds added before every response (simulated round trip)
+        idle: Advertise and serve IDLE
+        flag_update_with_exists: Push new mail during IDLE as an untagged
+            FETCH (FLAGS) line followed by EXISTS in the same TCP segment,
+            as servers do when another client changes flags
+    """
+
+    def __init__(self, mailbox, latency=0.0, idle=True, flag_update_with_exists=False):
+        self.mb = mailbox
+        self.latency = latency
+        self.idle = idle
+        self.flag_update_with_exists = flag_update_with_exists
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            client, _ = self.sock.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        reader = client.makefile("rb")
+        write_lock = threading.Lock()
+
+        def send(data):
+            if isinstance(data, str):
+                data = data.encode()
+            with write_lock:
+                client.sendall(data)
+
+        caps = "IMAP4rev1 UIDPLUS" + (" IDLE" if self.idle else "")
+        send(f"* OK [CAPABILITY {caps}] ready\r\n")
+        try:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                line = line.decode().rstrip("\r\n")
+                if self.latency:
+                    time.sleep(self.latency)
+                tag, _, rest = line.partition(" ")
+                command, _, args = rest.partition(" ")
+                command = command.upper()
+                self.mb.commands.append(rest)
+
+                if command == "CAPABILITY":
+                    send(f"* CAPABILITY {caps}\r\n{tag} OK done\r\n")
+                elif command == "LOGIN":
+                    send(f"{tag} OK logged in\r\n")
+                elif command in ("SELECT", "EXAMINE"):
+                    send(f"* {len(self.mb.msgs)} EXISTS\r\n"
+                         f"* OK [UIDVALIDITY {self.mb.uidvalidity}] ok\r\n"
+                         f"* OK [UIDNEXT {self.mb.uidnext}] ok\r\n"
+                         f"{tag} OK [READ-WRITE] selected\r\n")
+                elif command == "STATUS":
+                    name = args.split(" ")[0]
+                    send(f"* STATUS {name} (UIDNEXT {self.mb.uidnext} UIDVALIDITY {self.mb.uidvalidity})\r\n"
+                         f"{tag} OK done\r\n")
+                elif command in ("NOOP", "CLOSE", "EXPUNGE"):
+                    send(f"{tag} OK done\r\n")
+                elif command == "LOGOUT":
+                    send(f"* BYE\r\n{tag} OK done\r\n")
+                    return
+                elif command == "IDLE":
+                    send("+ idling\r\n")
+
+                    def notify(count):
+                        if self.flag_update_with_exists:
+                            send(f"* 1 FETCH (FLAGS (\\Seen))\r\n* {count} EXISTS\r\n")
+                        else:
+                            send(f"* {count} EXISTS\r\n")
+
+                    self.mb.listeners.append(notify)
+                    try:
+                        reader.readline()  # DONE
+                    finally:
+                        self.mb.listeners.remove(notify)
+                    send(f"{tag} OK IDLE done\r\n")
+                elif command == "UID":
+                    self._uid_command(tag, args, send)
+                else:
+                    send(f"{tag} BAD unknown command\r\n")
+        except OSError:
+            return
+
+    def _uid_command(self, tag, args, send):
+        sub, _, args = args.partition(" ")
+        sub = sub.upper()
+        uids = sorted(self.mb.msgs)
+        if sub == "SEARCH":
+            match = re.search(r"UID (\S+)", args)
+            found = _parse_set(match.group(1), uids) if match else uids
+            subject = re.search(r'SUBJECT "([^"]*)"', args)
+            if subject:
+                needle = subject.group(1).lower()
+                found = [uid for uid in found
+                         if needle in (email.message_from_bytes(self.mb.msgs[uid]).get("Subject") or "").lower()]
+            send(f"* SEARCH {' '.join(map(str, found))}\r\n{tag} OK done\r\n")
+        elif sub == "FETCH":
+            spec, _, items = args.partition(" ")
+            items = items.upper()
+            for seq, uid in enumerate(_parse_set(spec, uids), 1):
+                raw = self.mb.msgs[uid]
+                msg = email.message_from_bytes(raw)
+                head = f"UID {uid}"
+                if "BODYSTRUCTURE" in items:
+                    head += " BODYSTRUCTURE " + _bodystructure(msg)
+                literals = []
+                if "HEADER.FIELDS" in items:
+                    literals.append(("BODY[HEADER.FIELDS (SUBJECT)]", f"Subject: {msg.get('Subject', '')}\r\n\r\n".encode()))
+                for section in re.findall(r"BODY\.PEEK\[([\d.]+)\]", items):
+                    literals.append((f"BODY[{section}]", _section(msg, section)))
+                if "RFC822" in items:
+                    literals.append(("RFC822", raw))
+                out = f"* {seq} FETCH ({head}".encode()
+                for name, data in literals:
+                    out += f" {name} {{{len(data)}}}\r\n".encode() + data
+                send(out + b")\r\n")
+            send(f"{tag} OK done\r\n")
+        elif sub == "STORE":
+            send(f"{tag} OK done\r\n")
+        else:
+            send(f"{tag} BAD unknown command\r\n")
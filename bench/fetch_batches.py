@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+fetch_batches.py - Backlog Fetch Benchmark for FlowPrint
+
+Fills a fake IMAP mailbox with a backlog of order emails, adds a simulated
+round-trip latency to every server response, and times how long
+ImapPrintDaemon takes to fetch and queue the whole backlog for several
+imap_fetch_batch_size values. A batch size of 1 is one UID FETCH round trip
+per message, as before batching.
+
+    python bench/fetch_batches.py [--messages 200] [--latency-ms 20] [--batch-sizes 1,10,50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import fakeimap
+import FlowPrint
+
+class CountingPrinter:
+    def __init__(self):
+        self.printed = 0
+        self.lock = threading.Lock()
+
+    def print_html_file(self, html_path, **kwargs):
+        with self.lock:
+            self.printed += 1
+        return {"printed": True, "print_seconds": 0.0}
+
+def run(server, messages, batch_size):
+    FlowPrint.config_manager.save_config({
+        "imap_host": "127.0.0.1", "imap_port": server.port, "imap_use_ssl": False,
+        "imap_username": f"bench{batch_size}", "imap_password": "bench",
+        "imap_fetch_batch_size": batch_size, "imap_idle_enabled": False,
+        "dedup_db_file": f"dedup_{batch_size}.db", "uid_state_file": f"uid_state_{batch_size}.json",
+        "print_engine": "cups", "print_queue_max_depth": messages,
+    })
+    daemon = FlowPrint.ImapPrintDaemon()
+    printer = CountingPrinter()
+    daemon.chrome_printer = printer
+    started = time.monotonic()
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    while printer.printed < messages and time.monotonic() - started < 600:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    # Stop between checks, not in the middle of an IMAP command
+    while not daemon.status.startswith("Idle") and time.monotonic() - started < 600:
+        time.sleep(0.01)
+    daemon.stop()
+    thread.join(30)
+    return printer.printed, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--batch-sizes", default="1,10,50")
+    args = parser.parse_args()
+
+    mailbox = fakeimap.Mailbox()
+    for i in range(args.messages):
+        mailbox.append(fakeimap.make_msg(f"[PRINT PACK] Order #{1000 + i}"))
+    server = fakeimap.Server(mailbox, latency=args.latency_ms / 1000, idle=False)
+    FlowPrint.socketio.emit = lambda *a, **k: None
+
+    print(f"backlog: {args.messages} messages, {args.latency_ms:g} ms per server response")
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        printed, elapsed = run(server, args.messages, batch_size)
+        print(f"batch size {batch_size:>4}: {printed} messages in {elapsed:6.2f}s  ({printed / elapsed:7.1f} msg/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+idle_latency.py - New-Mail Latency Benchmark for FlowPrint
+
+Appends messages to a fake IMAP mailbox while ImapPrintDaemon waits in
+IDLE and reports the time from APPEND to process_message() for each.
+With --flag-updates every EXISTS arrives behind an untagged FETCH line in
+the same TCP segment.
+
+    python bench/idle_latency.py [--messages 20] [--flag-updates]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import fakeimap
+import FlowPrint
+
+class NullPrinter:
+    def print_html_file(self, html_path, **kwargs):
+        return {"printed": True, "print_seconds": 0.0}
+
+def wait_until_idle(daemon, timeout=10):
+    """Wait until the daemon is back in IDLE (or give up after timeout)."""
+    deadline = time.monotonic() + timeout
+    while not (daemon.listening and daemon.idling) and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--flag-updates", action="store_true", help="Send FETCH FLAGS with each EXISTS")
+    args = parser.parse_args()
+
+    mailbox = fakeimap.Mailbox()
+    server = fakeimap.Server(mailbox, flag_update_with_exists=args.flag_updates)
+    FlowPrint.socketio.emit = lambda *a, **k: None
+    FlowPrint.config_manager.save_config({
+        "imap_host": "127.0.0.1", "imap_port": server.port, "imap_use_ssl": False,
+        "imap_username": "bench", "imap_password": "bench", "imap_idle_enabled": True,
+        "print_engine": "cups", "poll_interval_seconds": 600,
+    })
+
+    daemon = FlowPrint.ImapPrintDaemon()
+    daemon.chrome_printer = NullPrinter()
+    appended = {}
+    latencies = []
+    arrived = threading.Event()
+    process_message = daemon.process_message
+
+    def timed_process_message(uid_bytes, *a, **k):
+        sent = appended.pop(int(uid_bytes), None)
+        if sent is not None:
+            latencies.append(time.monotonic() - sent)
+            arrived.set()
+        return process_message(uid_bytes, *a, **k)
+
+    daemon.process_message = timed_process_message
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+
+    missed = 0
+    for i in range(args.messages):
+        # Each message arrives while the daemon is waiting in IDLE
+        wait_until_idle(daemon)
+        time.sleep(0.05)
+        arrived.clear()
+        appended[mailbox.uidnext] = time.monotonic()
+        mailbox.append(fakeimap.make_msg(f"[PRINT PACK] Order #{1000 + i}"))
+        if not arrived.wait(10):
+            missed += 1
+
+    wait_until_idle(daemon)
+    daemon.stop()
+    thread.join(10)
+
+    if latencies:
+        latencies.sort()
+        print(f"messages: {len(latencies)}  not seen within 10s: {missed}")
+        print(f"APPEND -> process_message  median {statistics.median(latencies) * 1000:.1f} ms  "
+              f"max {latencies[-1] * 1000:.1f} ms")
+    else:
+        print(f"no message reached process_message within 10s ({missed} missed)")
+
+if __name__ == "__main__":
+    main()
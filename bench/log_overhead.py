@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+log_overhead.py - Logging Hot-Path Benchmark for FlowPrint
+
+Times one log_to_file() call as the daemon makes it, against the old
+implementation (copy the config, open the log file, append one line,
+close it), then how long the background writer takes to drain the queued
+lines.
+
+    python bench/log_overhead.py [--calls 50000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import FlowPrint
+
+MESSAGE = "Status: Processing message UID 48213..."
+
+def old_log_to_file(message, level="INFO"):
+    """log_to_file before the background writer."""
+    try:
+        config = dict(FlowPrint.config_manager.get_config())
+        log_file = config.get('log_file', 'flowprint.log') + ".old"
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(f"[{timestamp}] [{level}] {message}\n")
+    except:
+        pass
+
+def per_call(log, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        log(f"{MESSAGE} {i}")
+    return (time.perf_counter() - started) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50000)
+    args = parser.parse_args()
+    FlowPrint.config_manager.save_config({"log_file": os.path.abspath("flowprint.log")})
+
+    old = per_call(old_log_to_file, args.calls)
+    FlowPrint.log_to_file("warm-up")
+    new = per_call(FlowPrint.log_to_file, args.calls)
+    started = time.perf_counter()
+    FlowPrint.get_log_writer().flush(60)
+    drain = time.perf_counter() - started
+
+    print(f"{args.calls} calls")
+    print(f"old open/append/close: {old * 1e6:6.2f} us per call")
+    print(f"   queued log_to_file: {new * 1e6:6.2f} us per call  ({old / new:.1f}x less)")
+    print(f"   writer drained the backlog in {drain * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
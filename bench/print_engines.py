@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+print_engines.py - Print Engine Throughput Benchmark for FlowPrint
+
+Prints the same packing slips one after another through the subprocess
+engine (a new Chrome per job) and the DevTools engine (one Chrome, a tab
+per job) and reports jobs per minute for each.
+
+Every job really prints (Chrome runs with --kiosk-printing), so set the
+default printer to a PDF or other virtual printer first.
+
+    python bench/print_engines.py [--jobs 10] [--chrome PATH] [--wait-seconds 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import FlowPrint
+
+SLIP = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Order #{order}</title></head>
+<body><h1>Packing slip - Order #{order}</h1>
+<table>{rows}</table></body></html>"""
+
+def write_jobs(printer, count):
+    paths = []
+    for i in range(count):
+        rows = "".join(f"<tr><td>Item {n}</td><td>SKU-{n:05d}</td><td>{n % 4 + 1}</td></tr>" for n in range(30))
+        path = os.path.abspath(f"job_{i}.html")
+        printer.write_print_file(path, SLIP.format(order=1000 + i, rows=rows))
+        paths.append(path)
+    return paths
+
+def run(printer, paths, chrome_path, wait_seconds):
+    confirmed = 0
+    started = time.monotonic()
+    for path in paths:
+        result = printer.print_html_file(path, chrome_path=chrome_path, wait_seconds=wait_seconds, prepared=True)
+        confirmed += bool(result and result.get("printed"))
+    return confirmed, time.monotonic() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--chrome", default="", help="Chrome/Chromium executable (found automatically if omitted)")
+    parser.add_argument("--wait-seconds", type=float, default=8, help="Upper bound per job (chrome_print_wait_seconds)")
+    args = parser.parse_args()
+    FlowPrint.socketio.emit = lambda *a, **k: None
+
+    engines = [("subprocess", FlowPrint.ChromePrinter()), ("devtools", FlowPrint.DevToolsChromePrinter())]
+    chrome_path = engines[0][1]._resolve_chrome_path(args.chrome)
+    # Both engines start warm: profiles created, and Chrome running for DevTools
+    FlowPrint.get_profile_pool().warm(chrome_path)
+    engines[1][1]._ensure_browser(chrome_path)
+
+    try:
+        for name, printer in engines:
+            paths = write_jobs(printer, args.jobs)
+            confirmed, elapsed = run(printer, paths, chrome_path, args.wait_seconds)
+            print(f"{name:>10}: {args.jobs} jobs in {elapsed:6.1f}s  {args.jobs * 60 / elapsed:6.1f} jobs/min  "
+                  f"({confirmed} confirmed)")
+    finally:
+        engines[1][1].close()
+
+if __name__ == "__main__":
+    main()
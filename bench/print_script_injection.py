@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+print_script_injection.py - Job File Write Benchmark for FlowPrint
+
+Times producing the printable job file for a large (1 MB by default) HTML
+email two ways: the old path (write the job file, read it back, inject the
+print script with re.search + re.sub, write a second copy) and the single
+ChromePrinter.write_print_file() pass. Both must produce identical files.
+
+    python bench/print_script_injection.py [--size-mb 1] [--runs 50]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="flowprint_bench_"))
+
+import FlowPrint
+
+def make_body(size):
+    """An order table with non-ASCII text, cut to about size bytes."""
+    rows = []
+    length = 0
+    i = 0
+    while length < size:
+        row = f"<tr><td>Item {i} – Größe M</td><td>SKU-{i:06d}</td><td>{i % 7}</td></tr>"
+        rows.append(row)
+        length += len(row.encode("utf-8"))
+        i += 1
+    return "<html><head><style>td{padding:2px}</style></head><body><table>" + "".join(rows) + "</table></body></html>"
+
+def old_inject(script, html_content):
+    if re.search(r"</body>", html_content, re.IGNORECASE):
+        return re.sub(r"</body>", script + "</body>", html_content, flags=re.IGNORECASE)
+    if re.search(r"</html>", html_content, re.IGNORECASE):
+        return re.sub(r"</html>", script + "</html>", html_content, flags=re.IGNORECASE)
+    return html_content + script
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    printer = FlowPrint.ChromePrinter()
+    script = printer._print_script(True).decode("utf-8")
+    body = make_body(int(args.size_mb * 1024 * 1024))
+
+    def old_path():
+        job_path = f"job_{uuid.uuid4().hex}.html"
+        with open(job_path, "w", encoding="utf-8", errors="ignore") as f:
+            f.write(body)
+        with open(job_path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+        print_path = f"flowprint_{uuid.uuid4().hex}.html"
+        with open(print_path, "w", encoding="utf-8", errors="ignore") as f:
+            f.write(old_inject(script, content))
+        return print_path
+
+    def new_path():
+        job_path = f"job_{uuid.uuid4().hex}.html"
+        printer.write_print_file(job_path, body, auto_close=True)
+        return job_path
+
+    with open(old_path(), "rb") as old_file, open(new_path(), "rb") as new_file:
+        identical = old_file.read() == new_file.read()
+    print(f"body: {len(body.encode('utf-8')) / 1024 / 1024:.2f} MB, identical output: {identical}")
+
+    for name, fn in (("old write/read/inject/write", old_path), ("write_print_file", new_path)):
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            os.remove(fn())
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        print(f"{name:>28}: median {statistics.median(samples) * 1000:6.2f} ms  "
+              f"p90 {samples[int(len(samples) * 0.9)] * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+chrome_devtools.py - Chrome DevTools Protocol client for FlowPrint
+
+Keeps a single Chrome process running and drives it over the DevTools
+protocol, so print jobs open a tab in an already-warm browser instead of
+starting a new Chrome each time. Uses only the standard library (a minimal
+WebSocket client is included).
+"""
+
+import base64
+import itertools
+import json
+import os
+import queue
+import socket
+import struct
+import subprocess
+import threading
+import time
+from urllib.parse import urlparse
+
+# Binding the injected print script calls once window.print() has returned
+PRINT_DONE_BINDING = "flowprintPrinted"
+
+class DevToolsError(Exception):
+    """Raised when Chrome reports an error or the connection is lost."""
+
+
+class DevToolsConnection:
+    """One WebSocket connection to Chrome's browser endpoint (flattened sessions)."""
+
+    def __init__(self, ws_url, timeout=10):
+        url = urlparse(ws_url)
+        self.sock = socket.create_connection((url.hostname, url.port), timeout=timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        handshake = (
+            f"GET {url.path} HTTP/1.1\r\n"
+            f"Host: {url.hostname}:{url.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        self.sock.sendall(handshake.encode("ascii"))
+
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise DevToolsError("Connection closed during WebSocket handshake")
+            response += chunk
+        header, self.buffer = response.split(b"\r\n\r\n", 1)
+        if b" 101 " not in header.split(b"\r\n", 1)[0]:
+            raise DevToolsError(f"WebSocket handshake failed: {header.splitlines()[0]!r}")
+        self.sock.settimeout(None)
+
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.subscribers = {}
+        self.send_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.closed = False
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    # ---- WebSocket framing ----
+
+    def _recv_exact(self, n):
+        while len(self.buffer) < n:
+            chunk = self.sock.recv(max(65536, n - len(self.buffer)))
+            if not chunk:
+                raise DevToolsError("Connection closed by Chrome")
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def _read_message(self):
+        message = b""
+        while True:
+            first, second = self._recv_exact(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", self._recv_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", self._recv_exact(8))[0]
+            mask = self._recv_exact(4) if second & 0x80 else None
+            payload = self._recv_exact(length)
+            if mask:
+                payload = self._apply_mask(payload, mask)
+
+            if opcode == 0x8:
+                raise DevToolsError("Chrome closed the DevTools connection")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message
+
+    @staticmethod
+    def _apply_mask(payload, mask):
+        n = len(payload)
+        key = (mask * (n // 4 + 1))[:n]
+        return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        n = len(payload)
+        if n < 126:
+            header += bytes([0x80 | n])
+        elif n < 65536:
+            header += bytes([0x80 | 126]) + struct.pack(">H", n)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack(">Q", n)
+        mask = os.urandom(4)
+        with self.send_lock:
+            self.sock.sendall(header + mask + self._apply_mask(payload, mask))
+
+    # ---- Protocol ----
+
+    def _read_loop(self):
+        try:
+            while True:
+                message = json.loads(self._read_message())
+                if "id" in message:
+                    with self.state_lock:
+                        waiter = self.pending.pop(message["id"], None)
+                    if waiter:
+                        waiter.put(message)
+                    continue
+
+                session_id = message.get("sessionId")
+                if message.get("method") == "Target.detachedFromTarget":
+                    session_id = message.get("params", {}).get("sessionId", session_id)
+                with self.state_lock:
+                    subscriber = self.subscribers.get(session_id)
+                if subscriber:
+                    subscriber.put((message.get("method"), message.get("params", {})))
+        except (DevToolsError, OSError, ValueError):
+            pass
+        finally:
+            self.closed = True
+            with self.state_lock:
+                waiters = list(self.pending.values())
+                self.pending.clear()
+            for waiter in waiters:
+                waiter.put({"error": {"message": "DevTools connection closed"}})
+
+    def send(self, method, params=None, session_id=None, timeout=30):
+        """
+        Send a command and wait for its result.
+
+        Returns:
+            dict: The command's result object
+        """
+        if self.closed:
+            raise DevToolsError("DevTools connection is closed")
+
+        message_id = next(self.ids)
+        waiter = queue.Queue(maxsize=1)
+        with self.state_lock:
+            self.pending[message_id] = waiter
+
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        try:
+            self._send_frame(0x1, json.dumps(message).encode("utf-8"))
+            response = waiter.get(timeout=timeout)
+        except queue.Empty:
+            raise DevToolsError(f"{method} timed out after {timeout}s")
+        except OSError as e:
+            raise DevToolsError(f"{method} failed: {e}")
+        finally:
+            with self.state_lock:
+                self.pending.pop(message_id, None)
+
+        if "error" in response:
+            raise DevToolsError(f"{method}: {response['error'].get('message', 'unknown error')}")
+        return response.get("result", {})
+
+    def subscribe(self, session_id):
+        """Get a queue that receives (method, params) for every event of a session."""
+        events = queue.Queue()
+        with self.state_lock:
+            self.subscribers[session_id] = events
+        return events
+
+    def unsubscribe(self, session_id):
+        with self.state_lock:
+            self.subscribers.pop(session_id, None)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ChromeBrowser:
+    """A long-running Chrome process with a DevTools connection."""
+
+    def __init__(self, chrome_path, user_data_dir, extra_args=(), startup_timeout=20):
+        os.makedirs(user_data_dir, exist_ok=True)
+        port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+        try:
+            os.remove(port_file)
+        except OSError:
+            pass
+
+        cmd = [
+            chrome_path,
+            "--remote-debugging-port=0",
+            f"--user-data-dir={user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *extra_args,
+            "about:blank",
+        ]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        try:
+            self.connection = DevToolsConnection(self._wait_for_endpoint(port_file, startup_timeout))
+        except Exception:
+            self.proc.kill()
+            raise
+
+    def _wait_for_endpoint(self, port_file, timeout):
+        """Chrome writes its port and browser WebSocket path to DevToolsActivePort."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise DevToolsError(f"Chrome exited during startup (code {self.proc.returncode})")
+            try:
+                with open(port_file, "r", encoding="utf-8") as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise DevToolsError(f"Chrome did not expose DevTools within {timeout}s")
+
+    def is_alive(self):
+        return self.proc.poll() is None and not self.connection.closed
+
+    def print_page(self, url, timeout):
+        """
+        Open url in a new tab and wait for its print script to finish.
+
+        The tab is closed afterwards either way.
+
+        Returns:
+            dict: loaded/printed flags and the time each took, in seconds
+        """
+        conn = self.connection
+        started = time.monotonic()
+        result = {"loaded": False, "printed": False, "load_seconds": None, "print_seconds": None}
+
+        target_id = conn.send("Target.createTarget", {"url": "about:blank"})["targetId"]
+        try:
+            session_id = conn.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})["sessionId"]
+            events = conn.subscribe(session_id)
+            try:
+                conn.send("Runtime.addBinding", {"name": PRINT_DONE_BINDING}, session_id)
+                conn.send("Runtime.enable", session_id=session_id)
+                conn.send("Page.enable", session_id=session_id)
+                conn.send("Page.navigate", {"url": url}, session_id)
+
+                deadline = started + timeout
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        method, params = events.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if method == "Page.loadEventFired" and not result["loaded"]:
+                        result["loaded"] = True
+                        result["load_seconds"] = time.monotonic() - started
+                    elif method == "Runtime.bindingCalled" and params.get("name") == PRINT_DONE_BINDING:
+                        result["printed"] = True
+                        break
+                    elif method == "Target.detachedFromTarget":
+                        # The page closed itself with window.close() after printing
+                        result["printed"] = result["loaded"]
+                        break
+                if result["printed"]:
+                    result["print_seconds"] = time.monotonic() - started
+            finally:
+                conn.unsubscribe(session_id)
+        finally:
+            try:
+                conn.send("Target.closeTarget", {"targetId": target_id}, timeout=5)
+            except DevToolsError:
+                pass
+
+        return result
+
+    def close(self):
+        try:
+            self.connection.send("Browser.close", timeout=5)
+        except DevToolsError:
+            pass
+        self.connection.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
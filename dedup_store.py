@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+dedup_store.py - Printed Email Tracking for FlowPrint
+
+Remembers which emails have already been printed so they are never printed
+twice. Entries are keyed on (account, mailbox, uidvalidity, uid), so UIDs
+from different mailboxes or UIDVALIDITY epochs never collide.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+class SqliteUidStore:
+    """Printed-UID store backed by an indexed SQLite table."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS printed_uids (
+            account TEXT NOT NULL,
+            mailbox TEXT NOT NULL,
+            uidvalidity INTEGER NOT NULL,
+            uid INTEGER NOT NULL,
+            printed_at REAL NOT NULL,
+            PRIMARY KEY (account, mailbox, uidvalidity, uid)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_printed_uids_printed_at ON printed_uids (printed_at);
+    """
+
+    INSERT = (
+        "INSERT OR IGNORE INTO printed_uids (account, mailbox, uidvalidity, uid, printed_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, db_path="flowprint_dedup.db", journal_mode="WAL", batch_size=50):
+        """
+        Open (or create) the store.
+
+        Args:
+            db_path: SQLite database file
+            journal_mode: SQLite journal mode (WAL keeps readers and the writer apart)
+            batch_size: Number of added UIDs buffered before an automatic commit
+        """
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def contains(self, account, mailbox, uidvalidity, uid):
+        """Check whether a single UID has been printed."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM printed_uids WHERE account = ? AND mailbox = ? AND uidvalidity = ? AND uid = ?",
+                (account, mailbox, uidvalidity or 0, int(uid))
+            ).fetchone()
+        return row is not None
+
+    def filter_new(self, account, mailbox, uidvalidity, uids):
+        """
+        Drop already-printed UIDs from a list.
+
+        Returns:
+            list: The UIDs (same type and order as given) not yet recorded
+        """
+        numbers = [int(u) for u in uids]
+        seen = set()
+        with self.lock:
+            for i in range(0, len(numbers), 500):
+                chunk = numbers[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT uid FROM printed_uids WHERE account = ? AND mailbox = ? AND uidvalidity = ? "
+                    f"AND uid IN ({placeholders})",
+                    (account, mailbox, uidvalidity or 0, *chunk)
+                )
+                seen.update(row[0] for row in rows)
+        return [u for u, n in zip(uids, numbers) if n not in seen]
+
+    def add(self, account, mailbox, uidvalidity, uid):
+        """
+        Record a printed UID. Commits once batch_size records are pending.
+
+        A print that finishes after close() (service stopping, mailbox
+        switched) is committed straight away on a connection of its own.
+        """
+        row = (account, mailbox, uidvalidity or 0, int(uid), time.time())
+        with self.lock:
+            if self.conn is None:
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    conn.execute(self.INSERT, row)
+                    conn.commit()
+                finally:
+                    conn.close()
+                return
+            self.conn.execute(self.INSERT, row)
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.conn.commit()
+                self.pending = 0
+
+    def flush(self):
+        """Commit any buffered records."""
+        with self.lock:
+            if self.pending and self.conn is not None:
+                self.conn.commit()
+                self.pending = 0
+
+    def compact(self, retention_days):
+        """
+        Delete records older than the retention window.
+
+        Returns:
+            int: Number of records removed (0 when retention_days is 0)
+        """
+        if not retention_days:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM printed_uids WHERE printed_at < ?", (cutoff,))
+            self.conn.commit()
+            self.pending = 0
+        return cursor.rowcount
+
+    def migrate_text_file(self, path, account, mailbox, uidvalidity):
+        """
+        Import a legacy printed_uids.txt into the current mailbox and epoch.
+
+        The file is renamed to <path>.migrated afterwards so the import only
+        ever runs once.
+
+        Returns:
+            int: Number of UIDs imported
+        """
+        if not os.path.exists(path):
+            return 0
+
+        now = time.time()
+        rows = []
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                uid = line.strip()
+                if uid.isdigit():
+                    rows.append((account, mailbox, uidvalidity or 0, int(uid), now))
+
+        with self.lock:
+            self.conn.executemany(self.INSERT, rows)
+            self.conn.commit()
+            self.pending = 0
+
+        os.replace(path, path + ".migrated")
+        return len(rows)
+
+    def close(self):
+        """Flush and close the database."""
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class TextUidStore:
+    """Legacy store: one UID per line in a text file, held in memory as a set."""
+
+    def __init__(self, path="printed_uids.txt"):
+        self.path = path
+        self.uids = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    uid = line.strip()
+                    if uid:
+                        self.uids.add(uid)
+
+    def contains(self, account, mailbox, uidvalidity, uid):
+        return str(uid) in self.uids
+
+    def filter_new(self, account, mailbox, uidvalidity, uids):
+        return [u for u in uids if str(int(u)) not in self.uids]
+
+    def add(self, account, mailbox, uidvalidity, uid):
+        uid = str(uid)
+        self.uids.add(uid)
+        with open(self.path, "a", encoding="utf-8", errors="ignore") as f:
+            f.write(uid + "\n")
+
+    def flush(self):
+        pass
+
+    def compact(self, retention_days):
+        return 0
+
+    def migrate_text_file(self, path, account, mailbox, uidvalidity):
+        return 0
+
+    def close(self):
+        pass
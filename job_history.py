@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+job_history.py - Print Job History for FlowPrint
+
+Records every print job (email or webhook, printed or failed) in an
+indexed SQLite table so "did order #1234 print?" can be answered long
+after the job has left the dashboard. Pages are fetched by id cursor and
+subjects/order names are searched through an FTS5 index, so queries stay
+fast with millions of rows.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+
+class JobHistory:
+    """Persistent, searchable log of print jobs."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS job_history (
+            id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            order_name TEXT,
+            subject TEXT,
+            action TEXT,
+            error TEXT,
+            print_seconds REAL,
+            artifact_id TEXT,
+            timings TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_job_history_created_at ON job_history (created_at);
+        CREATE INDEX IF NOT EXISTS idx_job_history_source_id ON job_history (source, id);
+        CREATE INDEX IF NOT EXISTS idx_job_history_status_id ON job_history (status, id);
+        CREATE INDEX IF NOT EXISTS idx_job_history_order_name ON job_history (order_name);
+    """
+
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS job_history_fts USING fts5 (
+            subject, order_name, content='job_history', content_rowid='id'
+        );
+        CREATE TRIGGER IF NOT EXISTS job_history_ai AFTER INSERT ON job_history BEGIN
+            INSERT INTO job_history_fts (rowid, subject, order_name) VALUES (new.id, new.subject, new.order_name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS job_history_ad AFTER DELETE ON job_history BEGIN
+            INSERT INTO job_history_fts (job_history_fts, rowid, subject, order_name)
+            VALUES ('delete', old.id, old.subject, old.order_name);
+        END;
+    """
+
+    def __init__(self, db_path="flowprint_history.db"):
+        """
+        Open (or create) the history.
+
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(job_history)")}
+        if "timings" not in columns:
+            self.conn.execute("ALTER TABLE job_history ADD COLUMN timings TEXT")
+        try:
+            self.conn.executescript(self.FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.fts = False
+        self.conn.commit()
+
+    def add(self, source, status, subject="", order_name=None, action=None, error=None,
+            print_seconds=None, artifact_id=None, timings=None):
+        """
+        Record one job.
+
+        Args:
+            source: "email" or "webhook"
+            status: "printed", "dialog" or "failed"
+            subject: Email subject or webhook job title
+            order_name: Order number (e.g. "#1234"), if known
+            action: Text shown on the dashboard
+            error: Failure reason
+            print_seconds: Time from print start to Chrome confirming the print
+            artifact_id: Job store id of the printed file (for reprints)
+            timings: Seconds spent in each pipeline stage
+
+        Returns:
+            int: History id of the new entry
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO job_history (created_at, source, status, order_name, subject, action, error, "
+                "print_seconds, artifact_id, timings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), source, status, order_name, subject, action, error, print_seconds, artifact_id,
+                 json.dumps(timings) if timings else None)
+            )
+            self.conn.commit()
+        return cursor.lastrowid
+
+    @staticmethod
+    def _match_query(text):
+        """Turn free text into an FTS5 query: every word must match as a prefix."""
+        words = re.findall(r"\w+", text)
+        return " ".join(f'"{word}"*' for word in words)
+
+    def query(self, limit=50, cursor=None, source=None, status=None, order_name=None,
+              search=None, since=None, until=None):
+        """
+        Get one page of jobs, newest first.
+
+        Args:
+            limit: Jobs per page
+            cursor: "next_cursor" from the previous page
+            source / status / order_name: Exact-match filters
+            search: Words matched (as prefixes) against subject and order name
+            since / until: Unix time bounds on created_at
+
+        Returns:
+            dict: jobs and next_cursor (None on the last page)
+        """
+        where = []
+        params = []
+        sql = "SELECT h.* FROM job_history h"
+        order_by = "h.id"
+        if search:
+            match = self._match_query(search) if self.fts else None
+            if match:
+                # Walk the FTS index newest first and stop at the page limit,
+                # rather than collecting every match and sorting it
+                sql = "SELECT h.* FROM job_history_fts f CROSS JOIN job_history h ON h.id = f.rowid"
+                order_by = "f.rowid"
+                where.append("job_history_fts MATCH ?")
+                params.append(match)
+            elif not self.fts:
+                where.append("(h.subject LIKE ? OR h.order_name LIKE ?)")
+                params.extend([f"%{search}%"] * 2)
+        if cursor is not None:
+            where.append(f"{order_by} < ?")
+            params.append(int(cursor))
+        if source:
+            where.append("h.source = ?")
+            params.append(source)
+        if status:
+            where.append("h.status = ?")
+            params.append(status)
+        if order_name:
+            where.append("h.order_name = ?")
+            params.append(order_name)
+        if since is not None:
+            where.append("h.created_at >= ?")
+            params.append(float(since))
+        if until is not None:
+            where.append("h.created_at < ?")
+            params.append(float(until))
+
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} DESC LIMIT ?"
+        params.append(int(limit) + 1)
+
+        with self.lock:
+            rows = [dict(row) for row in self.conn.execute(sql, params)]
+        for row in rows:
+            row["timings"] = json.loads(row["timings"]) if row["timings"] else None
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+        return {"jobs": rows, "next_cursor": next_cursor}
+
+    def purge(self, retention_days):
+        """
+        Delete entries older than the retention window.
+
+        Returns:
+            int: Number of entries removed (0 when retention_days is 0)
+        """
+        if not retention_days:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM job_history WHERE created_at < ?", (cutoff,))
+            self.conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+job_store.py - Print Job Storage for FlowPrint
+
+Keeps the HTML file of every print job so it can be reprinted later, even
+after a restart. Files are named by the SHA-256 of their content, so
+identical bodies are stored once, and an SQLite index maps job ids to
+files. Byte and job-count limits are enforced by evicting the least
+recently used files. Jobs still waiting to print are pinned, and their
+files are never evicted, expired or cleared until they are unpinned.
+
+PdfCache keeps the PDFs rendered by the CUPS engine, so a reprint can go
+straight to the spooler.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class JobStore:
+    """Content-addressed job file store with an on-disk index and LRU limits."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS artifacts (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_artifacts_last_used ON artifacts (last_used);
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            subject TEXT,
+            source TEXT,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs (hash);
+        CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+    """
+
+    def __init__(self, store_dir="flowprint_jobs", max_bytes=500 * 1024 * 1024, max_jobs=1000):
+        """
+        Open (or create) the store.
+
+        Args:
+            store_dir: Directory holding the job files and index.db
+            max_bytes: Total size of job files before the least recently used are evicted
+            max_jobs: Number of jobs kept before the oldest are forgotten
+        """
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+        self.pins = {}  # pinned job id -> hash
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(store_dir, "index.db"), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def _path(self, digest):
+        return os.path.join(self.store_dir, digest[:2], digest + ".html")
+
+    @staticmethod
+    def _write_plain(path, content):
+        with open(path, "w", encoding="utf-8", errors="ignore") as f:
+            f.write(content)
+
+    def put(self, content, subject="", source="email", variant="", writer=None, pin=False):
+        """
+        Store a job's HTML. Identical content is written to disk only once.
+
+        Args:
+            content: HTML text
+            subject: Shown with the job (email subject or order)
+            source: "email" or "webhook"
+            variant: Tells apart files the writer renders differently from
+                     the same content (e.g. which print script it injects)
+            writer: writer(path, content) writes the file; plain UTF-8 if None
+            pin: Keep the file until unpin(job_id), e.g. while the job waits to print
+
+        Returns:
+            tuple: (job_id, path)
+        """
+        digest = hashlib.sha256(
+            variant.encode("utf-8") + b"\0" + content.encode("utf-8", errors="ignore")
+        ).hexdigest()
+        path = self._path(digest)
+        job_id = uuid.uuid4().hex
+
+        # Pinned from the existence check on, so the file cannot be evicted before it is indexed
+        with self.lock:
+            self.pins[job_id] = digest
+            row = self.conn.execute("SELECT size FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+            size = row[0] if row is not None and os.path.exists(path) else None
+        try:
+            if size is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                (writer or self._write_plain)(temp_path, content)
+                size = os.path.getsize(temp_path)
+                os.replace(temp_path, path)
+
+            now = time.time()
+            with self.lock:
+                self.conn.execute(
+                    "INSERT INTO artifacts (hash, size, created_at, last_used) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(hash) DO UPDATE SET size = excluded.size, last_used = excluded.last_used",
+                    (digest, size, now, now)
+                )
+                self.conn.execute(
+                    "INSERT INTO jobs (id, hash, subject, source, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, digest, subject, source, now)
+                )
+                self._enforce_limits()
+                self.conn.commit()
+        finally:
+            if not pin:
+                self.unpin(job_id)
+        return job_id, path
+
+    def unpin(self, job_id):
+        """Release a job pinned by put() or get() so its file can be evicted again."""
+        with self.lock:
+            self.pins.pop(job_id, None)
+
+    def get(self, job_id, pin=False):
+        """
+        Look up a job and mark its file as recently used.
+
+        Args:
+            pin: Keep the file until unpin(job_id), e.g. while it reprints
+
+        Returns:
+            dict: id, hash, path, subject, source and created_at - or None if
+                  the job is unknown or its file has been evicted
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["path"] = self._path(job["hash"])
+            if not os.path.exists(job["path"]):
+                self.conn.execute("DELETE FROM jobs WHERE hash = ?", (job["hash"],))
+                self.conn.execute("DELETE FROM artifacts WHERE hash = ?", (job["hash"],))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE artifacts SET last_used = ? WHERE hash = ?", (time.time(), job["hash"]))
+            self.conn.commit()
+            if pin:
+                self.pins[job_id] = job["hash"]
+        return job
+
+    def _delete_artifact(self, digest):
+        self.conn.execute("DELETE FROM jobs WHERE hash = ?", (digest,))
+        self.conn.execute("DELETE FROM artifacts WHERE hash = ?", (digest,))
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
+
+    def _remove_orphans(self):
+        pinned = set(self.pins.values())
+        rows = self.conn.execute(
+            "SELECT hash FROM artifacts WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.hash = artifacts.hash)"
+        ).fetchall()
+        removed = 0
+        for row in rows:
+            if row[0] not in pinned:
+                self._delete_artifact(row[0])
+                removed += 1
+        return removed
+
+    def _forget_jobs(self, ids):
+        """Delete job rows, except pinned ones, then their orphaned files (lock held)."""
+        ids = [job_id for job_id in ids if job_id not in self.pins]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            self.conn.execute(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        return self._remove_orphans()
+
+    def _enforce_limits(self):
+        """Forget the oldest jobs over max_jobs, then evict LRU files over max_bytes (lock held)."""
+        if self.max_jobs:
+            excess = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - self.max_jobs
+            if excess > 0:
+                rows = self.conn.execute(
+                    "SELECT id FROM jobs ORDER BY created_at LIMIT ?", (excess + len(self.pins),)
+                ).fetchall()
+                self._forget_jobs([row[0] for row in rows if row[0] not in self.pins][:excess])
+
+        if self.max_bytes:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total > self.max_bytes:
+                pinned = set(self.pins.values())
+                rows = self.conn.execute("SELECT hash, size FROM artifacts ORDER BY last_used").fetchall()
+                for digest, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if digest not in pinned:
+                        self._delete_artifact(digest)
+                        total -= size
+
+    def expire(self, max_age_hours):
+        """
+        Forget jobs older than max_age_hours and delete files no job uses.
+
+        Returns:
+            int: Number of files removed
+        """
+        cutoff = time.time() - max_age_hours * 3600
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM jobs WHERE created_at < ?", (cutoff,)).fetchall()
+            removed = self._forget_jobs([row[0] for row in rows])
+            self.conn.commit()
+        return removed
+
+    def usage(self):
+        """Get the number of stored jobs and total bytes on disk."""
+        with self.lock:
+            jobs = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        return {"jobs": jobs, "bytes": size}
+
+    def clear(self):
+        """Delete every job and file, except pinned jobs and their files."""
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM jobs").fetchall()
+            self._forget_jobs([row[0] for row in rows])
+            self.conn.commit()
+            pinned = set(self.pins.values())
+            for name in os.listdir(self.store_dir):
+                path = os.path.join(self.store_dir, name)
+                if os.path.isdir(path) and len(name) == 2 and not any(d.startswith(name) for d in pinned):
+                    shutil.rmtree(path, ignore_errors=True)
+
+
+class PdfCache:
+    """Size-bounded LRU cache of rendered PDFs, keyed by the SHA-256 of their source HTML."""
+
+    def __init__(self, cache_dir="flowprint_pdf_cache", max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Rebuild the LRU order from the files' modification times
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".pdf"):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        self.entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.bytes = sum(self.entries.values())
+
+    @staticmethod
+    def key_for(html_path):
+        """Cache key for the PDF rendered from an HTML file."""
+        digest = hashlib.sha256()
+        with open(html_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pdf")
+
+    def get(self, key):
+        """
+        Look up a cached PDF (counts a hit or a miss).
+
+        Returns:
+            str: Path of the cached PDF, or None
+        """
+        path = self._path(key)
+        with self.lock:
+            if key in self.entries and os.path.exists(path):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return path
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)
+            self.misses += 1
+        return None
+
+    def put(self, key, pdf_path):
+        """Move a freshly rendered PDF into the cache, evicting the least recently used."""
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.move(pdf_path, temp_path)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)
+            self.entries[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+        return path
+
+    def stats(self):
+        """Hit/miss counts, hit rate and bytes used."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "bytes": self.bytes,
+                "files": len(self.entries),
+            }
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self.entries.clear()
+            self.bytes = 0
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+latency.py - Print Pipeline Stage Timings for FlowPrint
+
+Each job carries a dict of stage name -> seconds, filled in with
+time.monotonic() as it moves through the pipeline (IMAP fetch, MIME parse,
+job file write, queue waits, Chrome). LatencyStats keeps the timings of the
+most recent jobs per source and reports rolling p50/p95/p99 per stage.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stages in pipeline order (used to order the summary)
+STAGE_ORDER = ("verify", "fetch", "parse", "queue", "render", "store", "print_queue", "print", "total")
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Add the time spent in the with-block to timings[stage]."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.monotonic() - started)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class LatencyStats:
+    """Rolling per-stage latency percentiles over the last `window` jobs of each source."""
+
+    def __init__(self, window=1000):
+        self.window = max(1, int(window))
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, source, timings):
+        """Add one job's stage timings (seconds)."""
+        with self.lock:
+            stages = self.samples.setdefault(source, {})
+            for stage, seconds in timings.items():
+                if seconds is None:
+                    continue
+                samples = stages.get(stage)
+                if samples is None:
+                    samples = stages[stage] = deque(maxlen=self.window)
+                samples.append(seconds)
+
+    def resize(self, window):
+        """Change how many recent jobs are kept, keeping the newest samples."""
+        with self.lock:
+            self.window = max(1, int(window))
+            for stages in self.samples.values():
+                for stage, samples in stages.items():
+                    stages[stage] = deque(samples, maxlen=self.window)
+
+    def summary(self):
+        """
+        Get rolling percentiles.
+
+        Returns:
+            dict: {source: [{stage, count, p50, p95, p99, max}, ...]}, in
+                  seconds, stages in pipeline order
+        """
+        with self.lock:
+            snapshot = {
+                source: {stage: list(samples) for stage, samples in stages.items()}
+                for source, stages in self.samples.items()
+            }
+
+        rank = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+        result = {}
+        for source, stages in snapshot.items():
+            result[source] = []
+            for stage in sorted(stages, key=lambda s: (rank.get(s, len(rank)), s)):
+                values = sorted(stages[stage])
+                result[source].append({
+                    "stage": stage,
+                    "count": len(values),
+                    "p50": round(percentile(values, 0.50), 4),
+                    "p95": round(percentile(values, 0.95), 4),
+                    "p99": round(percentile(values, 0.99), 4),
+                    "max": round(values[-1], 4),
+                })
+        return result
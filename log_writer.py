@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+log_writer.py - Buffered Log Writer for FlowPrint
+
+log_to_file only puts the entry on a queue; one background thread formats
+the queued entries, appends them to the log file in batches and rotates it
+by size and age. Rotated generations are gzip-compressed and named
+flowprint.log.1.gz (newest) up to flowprint.log.<backups>.gz (oldest).
+
+The read helpers seek from the end of the log and stream rotated
+generations in chunks, so serving the log never loads the whole file.
+"""
+
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+class LogWriter:
+    """Queue-fed log file writer with size/time rotation."""
+
+    BATCH_LINES = 1000  # Most entries written per batch
+
+    def __init__(self, path="flowprint.log", max_bytes=10 * 1024 * 1024, rotate_hours=24,
+                 backups=5, compress=True, flush_interval=0.5):
+        """
+        Open the log file and start the writer thread.
+
+        Args:
+            path: Log file
+            max_bytes: Rotate once the file reaches this size (0 = never)
+            rotate_hours: Rotate once the file is this old (0 = never)
+            backups: Number of rotated generations kept
+            compress: gzip rotated generations
+            flush_interval: Longest an entry waits in the queue before being written
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_hours * 3600
+        self.backups = max(0, int(backups))
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.entries = queue.SimpleQueue()
+        self.written = 0
+        self.errors = 0
+        self.file = None
+        self.opened_at = 0.0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="flowprint-log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, message, level="INFO"):
+        """Queue one entry. Never blocks on disk."""
+        if self.closed:
+            self._write_direct(message, level)
+            return
+        self.entries.put((time.time(), level, message))
+
+    def flush(self, timeout=5):
+        """Wait until everything queued so far is on disk."""
+        if self.closed:
+            return
+        done = threading.Event()
+        self.entries.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        """Write out the queue, close the file and stop the writer thread."""
+        if self.closed:
+            return
+        self.entries.put(None)
+        self.thread.join(timeout)
+        self.closed = True
+
+    def rotated_files(self):
+        """Existing rotated generations, oldest first."""
+        paths = []
+        for n in range(self.backups, 0, -1):
+            for path in (f"{self.path}.{n}.gz", f"{self.path}.{n}"):
+                if os.path.exists(path):
+                    paths.append(path)
+        return paths
+
+    # ---- Writer thread ----
+
+    @staticmethod
+    def _format(entry):
+        timestamp, level, message = entry
+        return f"[{datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {message}\n"
+
+    def _write_direct(self, message, level):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(self._format((time.time(), level, message)))
+        except OSError:
+            self.errors += 1
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.opened_at = time.time()
+        if self.file.tell():
+            # An existing file keeps the age of its first entry across restarts
+            try:
+                with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+                    first = f.read(21)
+                self.opened_at = datetime.strptime(first[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+            except (OSError, ValueError):
+                pass
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self.entries.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+
+            lines = []
+            waiters = []
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(self._format(item))
+                if stopping or len(lines) >= self.BATCH_LINES:
+                    break
+                try:
+                    item = self.entries.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lines:
+                self._write_batch(lines)
+            self._maybe_rotate()
+            for waiter in waiters:
+                waiter.set()
+
+        # Entries queued after the stop marker (or by a racing writer) still get written
+        lines = []
+        while True:
+            try:
+                item = self.entries.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                lines.append(self._format(item))
+            elif isinstance(item, threading.Event):
+                item.set()
+        if lines:
+            self._write_batch(lines)
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _write_batch(self, lines):
+        try:
+            if self.file is None:
+                self._open()
+            self.file.write("".join(lines))
+            self.file.flush()
+            self.written += len(lines)
+        except OSError:
+            # Leave the file closed so the next batch tries to reopen it
+            self.errors += 1
+            if self.file:
+                try:
+                    self.file.close()
+                except OSError:
+                    pass
+                self.file = None
+
+    def _maybe_rotate(self):
+        if self.file is None:
+            return
+        try:
+            size = self.file.tell()
+        except OSError:
+            return
+        if not size:
+            return
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds
+        if too_big or too_old:
+            self._rotate()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        try:
+            if not self.backups:
+                os.remove(self.path)
+                return
+
+            for n in range(self.backups, 0, -1):
+                for suffix in (".gz", ""):
+                    path = f"{self.path}.{n}{suffix}"
+                    if not os.path.exists(path):
+                        continue
+                    if n == self.backups:
+                        os.remove(path)
+                    else:
+                        os.replace(path, f"{self.path}.{n + 1}{suffix}")
+
+            rotated = f"{self.path}.1"
+            os.replace(self.path, rotated)
+            if self.compress:
+                with open(rotated, "rb") as src, gzip.open(rotated + ".gz.tmp", "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(rotated + ".gz.tmp", rotated + ".gz")
+                os.remove(rotated)
+        except OSError:
+            self.errors += 1
+
+
+# ---- Reading ----
+
+TAIL_BLOCK_BYTES = 64 * 1024
+
+def _decode_lines(lines):
+    return [line.decode("utf-8", errors="ignore").rstrip("\r") for line in lines]
+
+def read_log_tail(path, limit=100, before=None):
+    """
+    Read the last complete lines of a log by seeking backwards from the end.
+
+    Only about limit lines are read, however big the file is.
+
+    Args:
+        path: Log file
+        limit: Most lines returned
+        before: Byte offset to read up to (a "start" from an earlier call
+                pages further back); None reads up to the end of the file
+
+    Returns:
+        dict: lines, start (offset of the first line), end (offset after the
+              last line) and size of the file
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size if before is None else max(0, min(int(before), size))
+        pos = end
+        data = b""
+        while pos > 0 and data.count(b"\n") <= limit:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    # A line still being written is left for the next call
+    cut = data.rfind(b"\n") + 1
+    end -= len(data) - cut
+    data = data[:cut]
+
+    start = pos
+    if pos > 0:
+        # The first line read is incomplete
+        first = data.find(b"\n") + 1
+        start += first
+        data = data[first:]
+    lines = data.split(b"\n")[:-1]
+    if len(lines) > limit:
+        start += sum(len(line) + 1 for line in lines[:-limit])
+        lines = lines[-limit:]
+    return {"lines": _decode_lines(lines), "start": start, "end": end, "size": size}
+
+def read_log_from(path, after, limit=100):
+    """
+    Read complete lines starting at a byte offset (an "end" from an earlier call).
+
+    If the offset is past the end of the file or not at a line boundary,
+    the log has been rotated since and reading restarts from the beginning
+    ("reset" is True).
+
+    Returns:
+        dict: lines, start, end, size and reset
+    """
+    lines = []
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, int(after))
+        reset = start > size
+        if 0 < start <= size:
+            f.seek(start - 1)
+            reset = f.read(1) != b"\n"
+        if reset:
+            start = 0
+        f.seek(start)
+        end = start
+        while len(lines) < limit:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            lines.append(line[:-1])
+            end += len(line)
+    return {"lines": _decode_lines(lines), "start": start, "end": end, "size": size, "reset": reset}
+
+def open_log_files(paths):
+    """Open log files for streaming (gzip generations are decompressed). Missing files are skipped."""
+    files = []
+    for path in paths:
+        try:
+            files.append((path, gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")))
+        except OSError:
+            pass
+    return files
+
+def iter_log_chunks(files, chunk_size=TAIL_BLOCK_BYTES):
+    """Yield the contents of (path, file) pairs in chunks, closing each file when done."""
+    try:
+        for path, f in files:
+            yield f"===== {os.path.basename(path)} =====\n".encode("utf-8")
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+            f.close()
+    finally:
+        for _, f in files:
+            f.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+metrics.py - Prometheus Metrics for FlowPrint
+
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format for /metrics.
+
+Updates never take a lock: every thread adds to a cell of its own (a small
+list only that thread writes), and a scrape sums the cells. Cells of
+threads that have exited are folded into a base value when scraped, so
+per-request threads don't pile up. Gauges can instead be computed at scrape
+time from a callback.
+"""
+
+import bisect
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _ShardedCells:
+    """Per-thread [values...] cells for one label set, summed on read."""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.cells = []  # (thread, cell); list.append is atomic
+        self.base = [0] * size
+        self.fold_lock = threading.Lock()  # Scrapes only; updates never take it
+
+    def cell(self):
+        cell = getattr(self.local, "cell", None)
+        if cell is None:
+            cell = self.local.cell = [0] * self.size
+            self.cells.append((threading.current_thread(), cell))
+        return cell
+
+    def read(self):
+        with self.fold_lock:
+            totals = list(self.base)
+            for entry in list(self.cells):
+                thread, cell = entry
+                values = list(cell)
+                for i, value in enumerate(values):
+                    totals[i] += value
+                if not thread.is_alive():
+                    # The thread can no longer write to its cell
+                    for i, value in enumerate(values):
+                        self.base[i] += value
+                    self.cells.remove(entry)
+        return totals
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames and self.kind in ("counter", "gauge"):
+            # An unlabelled series is reported as 0 before its first update
+            self._child({}, 1)
+
+    def _child(self, labels, size):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            # setdefault is atomic, so two threads racing here share one child
+            child = self.children.setdefault(key, _ShardedCells(size))
+        return child
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._child(labels, 1).cell()[0] += amount
+
+    def value(self, **labels):
+        return self._child(labels, 1).read()[0]
+
+    def render(self):
+        lines = self.header()
+        for key, child in list(self.children.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.read()[0])}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down.
+
+    Either updated with inc()/dec() (a Chrome process starting and exiting),
+    or, with a callback, computed when scraped: callback() returns a number,
+    or a dict of label-value tuple -> number for labelled gauges.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, amount=1, **labels):
+        self._child(labels, 1).cell()[0] += amount
+
+    def dec(self, amount=1, **labels):
+        self._child(labels, 1).cell()[0] -= amount
+
+    def render(self):
+        lines = self.header()
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            for key, value in values.items():
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+            return lines
+        for key, child in list(self.children.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.read()[0])}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observations (seconds) over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        # Cell layout: one count per bucket, then +Inf, then sum
+        cell = self._child(labels, len(self.buckets) + 2).cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def render(self):
+        lines = self.header()
+        for key, child in list(self.children.items()):
+            values = child.read()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                labels = _label_text(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(values[-1]))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics in registration order and renders them for scraping."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
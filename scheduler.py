@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+scheduler.py - Task Scheduler for FlowPrint
+
+The IMAP daemon's recurring work (mailbox checks, cleanup) runs as named
+tasks on one timer queue, driven by the daemon thread. Waiting happens in
+select() on a wake-up socket instead of in sleep loops, so any thread can
+make the daemon act at once: run a task now, reschedule one or stop.
+The same socket can be added to another select() (IMAP IDLE) so that
+wait is interruptible too.
+"""
+
+import select
+import socket
+import threading
+import time
+
+class Scheduler:
+    """Named one-shot tasks, run in due order by a single thread."""
+
+    def __init__(self):
+        self.tasks = {}  # name -> (due, callback), due in time.monotonic()
+        self.lock = threading.Lock()
+        self.wake_socket, self._wake_sender = socket.socketpair()
+        self.wake_socket.setblocking(False)
+        self._wake_sender.setblocking(False)
+
+    def schedule(self, name, delay, callback):
+        """
+        Run callback after delay seconds, replacing any pending task with the same name.
+
+        A task runs once; a recurring task schedules itself again.
+        """
+        with self.lock:
+            self.tasks[name] = (time.monotonic() + max(0.0, delay), callback)
+        self.wake()
+
+    def due_in(self):
+        """Seconds until the earliest task is due, or None if none is pending."""
+        with self.lock:
+            dues = [due for due, _ in self.tasks.values()]
+        if not dues:
+            return None
+        return max(0.0, min(dues) - time.monotonic())
+
+    def run_pending(self):
+        """Run every task that is due, earliest first. Returns the number run."""
+        ran = 0
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = [(task[0], name) for name, task in self.tasks.items() if task[0] <= now]
+                if not due:
+                    return ran
+                _, name = min(due)
+                _, callback = self.tasks.pop(name)
+            callback()
+            ran += 1
+
+    def wait(self, timeout=None):
+        """Block until the next task is due, wake() is called or timeout passes."""
+        next_due = self.due_in()
+        if next_due is not None:
+            timeout = next_due if timeout is None else min(timeout, next_due)
+        if timeout is not None and timeout <= 0:
+            return
+        readable, _, _ = select.select([self.wake_socket], [], [], timeout)
+        if readable:
+            self.clear_wakeups()
+
+    def wake(self):
+        """Interrupt wait() (or any select() on wake_socket), from any thread."""
+        try:
+            self._wake_sender.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Buffer full: a wake-up is already pending
+            pass
+
+    def clear_wakeups(self):
+        try:
+            while self.wake_socket.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        self.wake_socket.close()
+        self._wake_sender.close()
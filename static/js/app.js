@@ -8,6 +8,11 @@ let countdownInterval = null;
 let nextCheckTime = null;
 let pollIntervalSeconds = 30;
 
+// Last status applied, with its version (deltas apply on top of it)
+let statusState = null;
+let statusEpoch = null;
+let statusVersion = null;
+
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
     loadTheme();
@@ -31,7 +36,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    // Load status every 5 seconds as fallback
+    // Check status every 5 seconds as fallback (answered with 304 when unchanged)
     setInterval(loadStatus, 5000);
 });
 
@@ -230,7 +235,8 @@ async function saveConfig() {
         const result = await response.json();
         
         if (result.success) {
-            showToast('✓ Configuration saved', 'success');
+            const restarted = result.restarted || [];
+            showToast('✓ Configuration saved' + (restarted.length ? ` (restarted: ${restarted.join(', ')})` : ''), 'success');
             currentConfig = config;
             pollIntervalSeconds = config.poll_interval_seconds;
         } else {
@@ -337,17 +343,14 @@ async function manualCheck() {
     }
 }
 
-async function reprintJob(tempFile, source) {
+async function reprintJob(jobId) {
     try {
         showToast('Reprinting...', 'warning');
         
         const response = await fetch('/api/reprint', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                temp_file: tempFile,
-                source: source || 'email'
-            })
+            body: JSON.stringify({ job_id: jobId })
         });
         
         const result = await response.json();
@@ -388,14 +391,50 @@ async function clearCache() {
 
 async function loadStatus() {
     try {
-        const response = await fetch('/api/status');
-        const data = await response.json();
-        updateUI(data);
+        const headers = statusEpoch ? { 'If-None-Match': `"${statusEpoch}-${statusVersion}"` } : {};
+        const response = await fetch('/api/status', { headers, cache: 'no-store' });
+        if (response.status === 304) return;
+        applyStatusFull(await response.json());
     } catch (error) {
         console.error('Error loading status:', error);
     }
 }
 
+function applyStatusFull(data) {
+    statusEpoch = data.epoch;
+    statusVersion = data.version;
+    statusState = { running: data.running, status: data.status, stats: data.stats || {} };
+    updateUI(statusState);
+}
+
+function applyStatusDelta(delta) {
+    if (statusState === null || delta.epoch !== statusEpoch || delta.base !== statusVersion) {
+        // Missed a version (or FlowPrint restarted): ask for what changed since ours
+        if (statusState === null || delta.epoch !== statusEpoch || delta.version > statusVersion) {
+            resumeStatus();
+        }
+        return;
+    }
+    
+    const changes = delta.changes;
+    if ('running' in changes) statusState.running = changes.running;
+    if ('status' in changes) statusState.status = changes.status;
+    Object.assign(statusState.stats, changes.stats || {});
+    delta.removed.forEach(name => {
+        if (name.startsWith('stats.')) {
+            delete statusState.stats[name.slice(6)];
+        } else {
+            delete statusState[name];
+        }
+    });
+    statusVersion = delta.version;
+    updateUI(statusState);
+}
+
+function resumeStatus() {
+    socket.emit('status_resume', { epoch: statusEpoch, version: statusVersion });
+}
+
 function updateUI(data) {
     isServiceRunning = data.running;
     
@@ -425,7 +464,7 @@ function updateUI(data) {
     if (data.stats) {
         nextCheckDisplay.textContent = data.stats.next_check || '--:--:--';
         
-        if (data.running && data.stats.next_check && data.stats.next_check !== 'Pending...' && !data.status.includes('Scanning')) {
+        if (data.running && /^\d{2}:\d{2}:\d{2}$/.test(data.stats.next_check || '') && !data.status.includes('Scanning')) {
             startCountdown(data.stats.next_check);
         } else {
             stopCountdown();
@@ -437,6 +476,7 @@ function updateUI(data) {
         
         updateRecentJobs(data.stats.recent_jobs || []);
         updateErrors(data.stats.errors || []);
+        updateLatency(data.stats.latency || {});
     }
 }
 
@@ -453,11 +493,11 @@ function updateRecentJobs(jobs) {
             <div class="job-content">
                 <div class="job-time">${job.time}</div>
                 <div class="job-subject" title="${escapeHtml(job.subject)}">${escapeHtml(job.subject)}</div>
-                <div class="job-action">${escapeHtml(job.action)}</div>
+                <div class="job-action">${escapeHtml(job.action)}${job.print_seconds != null ? ` · ${job.print_seconds.toFixed(1)}s` : ''}</div>
             </div>
             <div class="job-actions">
                 ${job.can_reprint ? 
-                    `<button class="btn-reprint" onclick="reprintJob('${job.temp_file}', '${job.source || 'email'}')">🖨️ Reprint</button>` : 
+                    `<button class="btn-reprint" onclick="reprintJob('${job.job_id}')">🖨️ Reprint</button>` : 
                     `<button class="btn-reprint" disabled title="File has been cleaned up">🖨️</button>`
                 }
             </div>
@@ -465,6 +505,41 @@ function updateRecentJobs(jobs) {
     `).join('');
 }
 
+function formatSeconds(seconds) {
+    return seconds >= 1 ? `${seconds.toFixed(2)}s` : `${Math.round(seconds * 1000)}ms`;
+}
+
+function updateLatency(latency) {
+    const container = document.getElementById('latencyTable');
+    const card = document.getElementById('latencyCard');
+    const sources = Object.keys(latency);
+    
+    if (sources.length === 0) {
+        card.style.display = 'none';
+        return;
+    }
+    
+    card.style.display = 'block';
+    container.innerHTML = sources.map(source => `
+        <table>
+            <thead>
+                <tr><th>${escapeHtml(source)}</th><th>p50</th><th>p95</th><th>p99</th><th>jobs</th></tr>
+            </thead>
+            <tbody>
+                ${latency[source].map(s => `
+                    <tr>
+                        <td>${escapeHtml(s.stage)}</td>
+                        <td>${formatSeconds(s.p50)}</td>
+                        <td>${formatSeconds(s.p95)}</td>
+                        <td>${formatSeconds(s.p99)}</td>
+                        <td>${s.count}</td>
+                    </tr>
+                `).join('')}
+            </tbody>
+        </table>
+    `).join('');
+}
+
 function updateErrors(errors) {
     const container = document.getElementById('recentErrors');
     const card = document.getElementById('errorsCard');
@@ -563,26 +638,65 @@ function updateCountdown() {
 // Activity Log
 // ============================================
 
+let logCursor = null;   // Byte offset after the newest line shown
+let logOldest = 0;      // Byte offset of the oldest line shown
+let loadingOlderLogs = false;
+
+function renderLogLines(lines) {
+    return lines.map(line => 
+        `<div class="log-line">${escapeHtml(line)}</div>`
+    ).join('');
+}
+
 async function loadLogs() {
     try {
-        const response = await fetch('/api/logs');
+        const url = logCursor === null ? '/api/logs' : `/api/logs?after=${logCursor}`;
+        const response = await fetch(url);
         const data = await response.json();
         
         const container = document.getElementById('activityLog');
         
-        if (data.logs && data.logs.length > 0) {
-            container.innerHTML = data.logs.map(line => 
-                `<div class="log-line">${escapeHtml(line)}</div>`
-            ).join('');
-            container.scrollTop = container.scrollHeight;
-        } else {
-            container.innerHTML = '<div class="empty-state">No logs yet</div>';
+        if (logCursor === null || data.reset) {
+            if (data.logs && data.logs.length > 0) {
+                container.innerHTML = renderLogLines(data.logs);
+            } else {
+                container.innerHTML = '<div class="empty-state">No logs yet</div>';
+            }
+            logOldest = data.start || 0;
+            container.onscroll = loadOlderLogs;
+        } else if (data.logs && data.logs.length > 0) {
+            const empty = container.querySelector('.empty-state');
+            if (empty) empty.remove();
+            container.insertAdjacentHTML('beforeend', renderLogLines(data.logs));
         }
+        logCursor = data.end || 0;
+        container.scrollTop = container.scrollHeight;
     } catch (error) {
         console.error('Error loading logs:', error);
     }
 }
 
+async function loadOlderLogs() {
+    const container = document.getElementById('activityLog');
+    if (container.scrollTop > 0 || logOldest <= 0 || loadingOlderLogs) return;
+    
+    loadingOlderLogs = true;
+    try {
+        const response = await fetch(`/api/logs?before=${logOldest}`);
+        const data = await response.json();
+        if (data.logs && data.logs.length > 0) {
+            const previousHeight = container.scrollHeight;
+            container.insertAdjacentHTML('afterbegin', renderLogLines(data.logs));
+            container.scrollTop = container.scrollHeight - previousHeight;
+        }
+        logOldest = data.start || 0;
+    } catch (error) {
+        console.error('Error loading older logs:', error);
+    } finally {
+        loadingOlderLogs = false;
+    }
+}
+
 function refreshLogs() {
     loadLogs();
     showToast('Logs refreshed', 'success');
@@ -593,22 +707,23 @@ function refreshLogs() {
 // ============================================
 
 function setupWebSocket() {
-    socket.on('connect', () => console.log('WebSocket connected'));
+    socket.on('connect', () => {
+        console.log('WebSocket connected');
+        resumeStatus();
+    });
     socket.on('disconnect', () => console.log('WebSocket disconnected'));
     
-    socket.on('status_update', (data) => {
-        updateUI({
-            running: true,
-            status: data.status,
-            stats: data.stats
-        });
-    });
+    socket.on('status_delta', applyStatusDelta);
+    socket.on('status_full', applyStatusFull);
     
     socket.on("webhook_processing", (data) => {
         if (data.status === "processing") {
             setWebhookProcessing(true);
-        } else if (data.status === "complete") {
+        } else if (data.status === "complete" || data.status === "queued") {
             setWebhookProcessing(false);
+        } else if (data.status === "failed") {
+            setWebhookProcessing(false);
+            showToast(`Webhook order ${data.order} failed: ${data.error}`, 'error');
         }
     });
 }
@@ -771,30 +886,16 @@ async function resetToDefaults() {
 // Download Logs
 // ============================================
 
-async function downloadLogs() {
-    try {
-        showToast('Preparing logs...', 'info');
-        
-        const response = await fetch('/api/logs/download');
-        
-        if (!response.ok) {
-            throw new Error('Failed to download logs');
-        }
-        
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `flowprint_logs_${new Date().toISOString().split('T')[0]}.txt`;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
-        
-        showToast('✓ Logs downloaded', 'success');
-    } catch (error) {
-        showToast('Error downloading logs', 'error');
-    }
+function downloadLogs() {
+    // Let the browser stream the download to disk instead of buffering it in a blob
+    const a = document.createElement('a');
+    a.href = '/api/logs/download';
+    a.download = `flowprint_logs_${new Date().toISOString().split('T')[0]}.txt`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    
+    showToast('Preparing logs...', 'info');
 }
 
 // ============================================
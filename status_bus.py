@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+status_bus.py - Versioned Status Broadcasting for FlowPrint
+
+Status changes only mark the bus dirty. A broadcaster thread then sends
+at most max_per_second "status_delta" events, each holding just the fields
+that changed since the previous version, so a burst of status, job and
+error updates costs a handful of small emits instead of one full stats
+dict per update.
+
+Every delta is numbered. A client that reconnects asks for the changes
+since the version it has and gets either the missing deltas merged into
+one, or the full status when they are no longer kept. The version also
+serves as the ETag of /api/status.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+class StatusBus:
+    """Coalesces status changes into numbered deltas."""
+
+    def __init__(self, source, emit, max_per_second=4, history=256):
+        """
+        Create the bus (the broadcaster thread starts on the first change).
+
+        Args:
+            source: Returns the current status as {"running", "status", "stats"}
+            emit: Called as emit(event, data) to broadcast to every client
+            max_per_second: Most deltas broadcast per second
+            history: Deltas kept for clients resuming after a reconnect
+        """
+        self.source = source
+        self.emit = emit
+        self.set_rate(max_per_second)
+        self.epoch = uuid.uuid4().hex[:8]  # Versions start over when FlowPrint restarts
+        self.version = 0
+        self.state = {"stats": {}}
+        self.sent = {}  # (field,) or ("stats", key) -> JSON last broadcast
+        self.history = deque(maxlen=max(1, int(history)))
+        self.lock = threading.Lock()
+        self.dirty = threading.Event()
+        self.thread = None
+        self.broadcasts = 0
+
+    def set_rate(self, max_per_second):
+        """Change the most deltas broadcast per second."""
+        self.min_interval = 1.0 / max(0.1, float(max_per_second))
+
+    def mark_dirty(self):
+        """Note that the status changed; it is broadcast within 1/max_per_second."""
+        self.dirty.set()
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="flowprint-status-bus", daemon=True)
+                    self.thread.start()
+
+    def _run(self):
+        while True:
+            self.dirty.wait()
+            self.dirty.clear()
+            try:
+                self.publish()
+            except RuntimeError:
+                # Stats changed size while being serialized; try again next tick
+                self.dirty.set()
+            except Exception:
+                pass
+            time.sleep(self.min_interval)
+
+    @staticmethod
+    def _fields(status):
+        fields = {}
+        for name, value in status.items():
+            if name == "stats":
+                for key, stat in list(value.items()):
+                    fields[("stats", key)] = json.dumps(stat, sort_keys=True, default=str)
+            else:
+                fields[(name,)] = json.dumps(value, sort_keys=True, default=str)
+        return fields
+
+    def publish(self):
+        """
+        Compare the current status with the last version and broadcast the difference.
+
+        Returns:
+            dict: The delta broadcast, or None if nothing changed
+        """
+        fields = self._fields(self.source())
+        with self.lock:
+            changes = {}
+            removed = []
+            for path, text in fields.items():
+                if self.sent.get(path) == text:
+                    continue
+                self.sent[path] = text
+                value = json.loads(text)
+                if len(path) == 1:
+                    changes[path[0]] = self.state[path[0]] = value
+                else:
+                    changes.setdefault("stats", {})[path[1]] = self.state["stats"][path[1]] = value
+            for path in [path for path in self.sent if path not in fields]:
+                del self.sent[path]
+                if len(path) == 1:
+                    self.state.pop(path[0], None)
+                    removed.append(path[0])
+                else:
+                    self.state["stats"].pop(path[1], None)
+                    removed.append(f"stats.{path[1]}")
+            if not changes and not removed:
+                return None
+
+            self.version += 1
+            delta = {
+                "epoch": self.epoch,
+                "version": self.version,
+                "base": self.version - 1,
+                "changes": changes,
+                "removed": removed,
+            }
+            self.history.append(delta)
+            # Sent under the lock so clients receive deltas in version order
+            self.emit("status_delta", delta)
+            self.broadcasts += 1
+        return delta
+
+    def snapshot(self):
+        """
+        Get the full, current status.
+
+        Returns:
+            tuple: (epoch, version, status)
+        """
+        self.publish()
+        with self.lock:
+            status = dict(self.state)
+            status["stats"] = dict(self.state["stats"])
+            return self.epoch, self.version, status
+
+    def etag(self, epoch=None, version=None):
+        """ETag for a status version (the current one by default)."""
+        if epoch is None:
+            epoch, version = self.epoch, self.version
+        return f"{epoch}-{version}"
+
+    def changes_since(self, epoch, version):
+        """
+        Merge the deltas a client missed into one.
+
+        Args:
+            epoch / version: Last status the client applied
+
+        Returns:
+            dict: A delta from version to the current version (empty changes
+                  when the client is current), or None when the client must
+                  load the full status
+        """
+        with self.lock:
+            if epoch != self.epoch or not isinstance(version, int) or version > self.version:
+                return None
+            missed = [delta for delta in self.history if delta["version"] > version]
+            if missed and missed[0]["base"] != version:
+                return None
+
+            changes = {}
+            removed = set()
+            for delta in missed:
+                for name, value in delta["changes"].items():
+                    if name == "stats":
+                        changes.setdefault("stats", {}).update(value)
+                        removed.difference_update(f"stats.{key}" for key in value)
+                    else:
+                        changes[name] = value
+                        removed.discard(name)
+                for name in delta["removed"]:
+                    removed.add(name)
+                    if name.startswith("stats."):
+                        changes.get("stats", {}).pop(name[len("stats."):], None)
+                    else:
+                        changes.pop(name, None)
+            return {
+                "epoch": self.epoch,
+                "version": self.version,
+                "base": version,
+                "changes": changes,
+                "removed": sorted(removed),
+            }
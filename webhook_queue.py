@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+webhook_queue.py - Durable Webhook Job Queue for FlowPrint
+
+Verified Shopify webhook payloads are written here before the HTTP response
+is sent, so Shopify gets its 200 immediately and rendering/printing happens
+on background workers. Jobs survive a restart: anything still marked as
+processing when FlowPrint starts is put back in the queue.
+
+Shopify delivers webhooks at least once, so each job also records its
+idempotency keys (webhook id, order id). A webhook whose key was seen within
+the TTL is answered with the original job id and never queued again.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+class WebhookQueue:
+    """SQLite-backed FIFO of webhook jobs with per-job status."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS webhook_jobs (
+            id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            order_name TEXT,
+            payload BLOB NOT NULL,
+            received_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            error TEXT,
+            temp_file TEXT,
+            timings TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_webhook_jobs_status_seq ON webhook_jobs (status, seq);
+        CREATE INDEX IF NOT EXISTS idx_webhook_jobs_finished_at ON webhook_jobs (finished_at);
+        CREATE TABLE IF NOT EXISTS webhook_keys (
+            key TEXT PRIMARY KEY,
+            job_id TEXT NOT NULL,
+            seen_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_webhook_keys_seen_at ON webhook_keys (seen_at);
+    """
+
+    def __init__(self, db_path="flowprint_webhooks.db", key_ttl_hours=72):
+        """
+        Open (or create) the queue.
+
+        Args:
+            db_path: SQLite database file
+            key_ttl_hours: How long an idempotency key blocks duplicates
+        """
+        self.db_path = db_path
+        self.key_ttl = key_ttl_hours * 3600
+        self.duplicate_hits = 0
+        self.duplicate_misses = 0
+        self.lock = threading.Lock()
+        self.available = threading.Event()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(webhook_jobs)")}
+        if "timings" not in columns:
+            self.conn.execute("ALTER TABLE webhook_jobs ADD COLUMN timings TEXT")
+
+        # Jobs interrupted by a shutdown or crash go back in the queue
+        self.conn.execute("UPDATE webhook_jobs SET status = 'queued', started_at = NULL WHERE status = 'processing'")
+        self.conn.commit()
+        row = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM webhook_jobs").fetchone()
+        self.seq = row[0]
+        if self.conn.execute("SELECT 1 FROM webhook_jobs WHERE status = 'queued' LIMIT 1").fetchone():
+            self.available.set()
+
+    def enqueue(self, payload, order_name, keys=(), timings=None):
+        """
+        Durably store a webhook payload unless it is a duplicate.
+
+        The duplicate check and the insert happen in one transaction, so
+        concurrent retries of the same webhook queue exactly one job.
+
+        Args:
+            payload: Raw webhook body
+            order_name: Order name shown in logs and job status
+            keys: Idempotency keys (e.g. "webhook:<id>", "order:<id>")
+            timings: Stage timings measured while receiving the webhook
+
+        Returns:
+            tuple: (job_id, duplicate) - for a duplicate, the id of the job
+                   that first used one of the keys
+        """
+        keys = [k for k in keys if k]
+        now = time.time()
+        with self.lock:
+            if keys:
+                placeholders = ",".join("?" * len(keys))
+                row = self.conn.execute(
+                    f"SELECT job_id FROM webhook_keys WHERE key IN ({placeholders}) AND seen_at >= ? LIMIT 1",
+                    (*keys, now - self.key_ttl)
+                ).fetchone()
+                if row is not None:
+                    self.duplicate_hits += 1
+                    return row[0], True
+
+            job_id = uuid.uuid4().hex
+            self.seq += 1
+            self.conn.execute(
+                "INSERT INTO webhook_jobs (id, seq, status, order_name, payload, received_at, timings) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, self.seq, order_name, payload, now, json.dumps(timings) if timings else None)
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO webhook_keys (key, job_id, seen_at) VALUES (?, ?, ?)",
+                [(key, job_id, now) for key in keys]
+            )
+            self.conn.commit()
+            self.duplicate_misses += 1
+        self.available.set()
+        return job_id, False
+
+    def claim(self, timeout=1.0):
+        """
+        Take the oldest queued job and mark it as processing.
+
+        Returns:
+            dict: The job (including its payload and the timings recorded at
+                  enqueue, as a dict), or None if the queue stayed empty
+        """
+        if not self.available.wait(timeout):
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM webhook_jobs WHERE status = 'queued' ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self.available.clear()
+                return None
+            self.conn.execute(
+                "UPDATE webhook_jobs SET status = 'processing', started_at = ? WHERE id = ?",
+                (time.time(), row["id"])
+            )
+            self.conn.commit()
+        job = dict(row)
+        job["timings"] = json.loads(job["timings"]) if job["timings"] else {}
+        return job
+
+    def requeue(self, job_id):
+        """Put a claimed job back at the front of the queue (it could not be handed on)."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE webhook_jobs SET status = 'queued', started_at = NULL WHERE id = ? AND status = 'processing'",
+                (job_id,)
+            )
+            self.conn.commit()
+        self.available.set()
+
+    def complete(self, job_id, temp_file=None):
+        self._finish(job_id, "printed", None, temp_file)
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error, None)
+
+    def _finish(self, job_id, status, error, temp_file):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE webhook_jobs SET status = ?, error = ?, temp_file = ?, finished_at = ? WHERE id = ?",
+                (status, error, temp_file, time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def get(self, job_id):
+        """Get a job's status (without its payload), or None if unknown."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, status, order_name, received_at, started_at, finished_at, error "
+                "FROM webhook_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def depth(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM webhook_jobs WHERE status IN ('queued', 'processing')"
+            ).fetchone()
+        return row[0]
+
+    def purge(self, max_age_hours):
+        """Delete finished jobs older than max_age_hours and expired idempotency keys."""
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM webhook_jobs WHERE status IN ('printed', 'failed') AND finished_at < ?",
+                (now - max_age_hours * 3600,)
+            )
+            self.conn.execute("DELETE FROM webhook_keys WHERE seen_at < ?", (now - self.key_ttl,))
+            self.conn.commit()
+        return cursor.rowcount